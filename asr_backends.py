@@ -0,0 +1,118 @@
+# asr_backends.py
+import os
+import numpy as np
+from typing import Callable
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Движок распознавания: whisper (openai-whisper, fp32) или faster-whisper (CTranslate2, int8 на CPU).
+# Промежуточный текст в статусе голосового нужен ASR_BACKEND=faster-whisper:
+# openai-whisper отдаёт текст целиком, и короткие голосовые (до TRANSCRIBE_CHUNK_MIN) идут без него
+ASR_BACKEND = os.getenv('ASR_BACKEND', 'whisper')
+# Тип вычислений CTranslate2: int8, int8_float32, float32…
+CT2_COMPUTE_TYPE = os.getenv('CT2_COMPUTE_TYPE', 'int8')
+# Потоков на один процесс-воркер (0 — решает CTranslate2)
+CT2_CPU_THREADS = int(os.getenv('CT2_CPU_THREADS', '0'))
+
+
+class ASRBackend:
+    """
+    Интерфейс движка распознавания.
+    Модель загружается один раз (см. whisper_registry), transcribe вызывается многократно.
+    """
+    name = ''
+    # Во сколько раз веса в памяти меньше fp32 — для бюджета памяти реестра
+    size_factor = 1.0
+
+    def load(self, model_name: str):
+        raise NotImplementedError
+
+    def model_size_mb(self, model) -> float | None:
+        """Фактический размер весов в памяти, если движок умеет его посчитать"""
+        return None
+
+    def transcribe(self, model, audio: np.ndarray, language: str,
+                   on_segment: Callable[[str], None] | None = None) -> str:
+        """
+        audio — 16 кГц mono float32, возвращает распознанный текст.
+        on_segment, если движок умеет, вызывается с текстом каждого готового сегмента.
+        """
+        raise NotImplementedError
+
+
+class WhisperBackend(ASRBackend):
+    """openai-whisper на PyTorch, fp32 на CPU"""
+    name = 'whisper'
+
+    def load(self, model_name: str):
+        import whisper
+        return whisper.load_model(model_name)
+
+    def model_size_mb(self, model) -> float | None:
+        return sum(p.numel() * p.element_size() for p in model.parameters()) / (1024 * 1024)
+
+    def transcribe(self, model, audio: np.ndarray, language: str,
+                   on_segment: Callable[[str], None] | None = None) -> str:
+        # openai-whisper не отдаёт сегменты по ходу декодирования, on_segment не вызывается
+        result = model.transcribe(
+            audio,
+            language=language,
+            fp16=False,
+            temperature=0,
+            no_speech_threshold=0.3,
+            logprob_threshold=-1.0
+        )
+        return result.get("text", "").strip()
+
+
+class FasterWhisperBackend(ASRBackend):
+    """faster-whisper (CTranslate2): квантованные int8-веса, заметно быстрее на CPU"""
+    name = 'faster-whisper'
+    size_factor = 0.25 if CT2_COMPUTE_TYPE.startswith('int8') else 1.0
+
+    def load(self, model_name: str):
+        from faster_whisper import WhisperModel
+        return WhisperModel(
+            model_name,
+            device='cpu',
+            compute_type=CT2_COMPUTE_TYPE,
+            cpu_threads=CT2_CPU_THREADS
+        )
+
+    def transcribe(self, model, audio: np.ndarray, language: str,
+                   on_segment: Callable[[str], None] | None = None) -> str:
+        # Жадный поиск и те же пороги, что у WhisperBackend, — результаты сравнимы
+        segments, _ = model.transcribe(
+            audio,
+            language=language,
+            beam_size=1,
+            temperature=0,
+            no_speech_threshold=0.3,
+            log_prob_threshold=-1.0
+        )
+        # segments — генератор: сегменты декодируются по мере чтения
+        texts = []
+        for segment in segments:
+            texts.append(segment.text.strip())
+            if on_segment:
+                on_segment(segment.text.strip())
+        return " ".join(texts).strip()
+
+
+BACKENDS = {
+    WhisperBackend.name: WhisperBackend,
+    FasterWhisperBackend.name: FasterWhisperBackend,
+}
+
+_instances: dict[str, ASRBackend] = {}
+
+
+def get_backend(name: str | None = None) -> ASRBackend:
+    """Возвращает движок по имени (по умолчанию ASR_BACKEND)"""
+    name = name or ASR_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Неизвестный ASR-движок: {name}")
+    if name not in _instances:
+        _instances[name] = BACKENDS[name]()
+    return _instances[name]
@@ -0,0 +1,102 @@
+# audio_chunks.py
+import os
+import re
+import numpy as np
+from dotenv import load_dotenv
+
+from vad import VAD_FRAME_MS, speech_mask
+
+load_dotenv()
+
+# Длинные голосовые режутся на куски примерно такой длины, с
+TRANSCRIBE_CHUNK_SECONDS = float(os.getenv('TRANSCRIBE_CHUNK_SECONDS', '20'))
+# Аудио короче этого не режется вовсе, с
+TRANSCRIBE_CHUNK_MIN = float(os.getenv('TRANSCRIBE_CHUNK_MIN', '30'))
+# Перекрытие кусков, если пришлось резать посреди речи, с
+TRANSCRIBE_CHUNK_OVERLAP = float(os.getenv('TRANSCRIBE_CHUNK_OVERLAP', '1.0'))
+
+# Сколько слов на стыке проверяется на дубль
+_MAX_OVERLAP_WORDS = 8
+
+
+def split_on_silence(audio: np.ndarray, sr: int,
+                     chunk_seconds: float = TRANSCRIBE_CHUNK_SECONDS,
+                     overlap_seconds: float = TRANSCRIBE_CHUNK_OVERLAP) -> list[tuple[int, int, bool]]:
+    """
+    Делит аудио на куски не длиннее chunk_seconds и возвращает их границы в отсчётах
+    вместе с флагом, перекрывается ли кусок с предыдущим: (начало, конец, перекрытие).
+    Разрез ставится в самую тихую паузу во второй половине окна; если пауз нет,
+    кусок режется по длине и соседние куски перекрываются на overlap_seconds,
+    чтобы слово на стыке целиком попало хотя бы в один из них.
+    """
+    frame = sr * VAD_FRAME_MS // 1000
+    chunk = int(chunk_seconds * sr)
+    overlap = int(overlap_seconds * sr)
+    if len(audio) <= chunk:
+        return [(0, len(audio), False)]
+
+    mask = speech_mask(audio, sr)
+    # Энергия кадров — из пауз выбираем самую тихую
+    n = len(audio) // frame
+    frames = audio[:n * frame].reshape(n, frame)
+    energy = np.mean(frames * frames, axis=1)
+
+    bounds = []
+    start = 0
+    overlapped = False
+    while len(audio) - start > chunk:
+        lo = (start + chunk // 2) // frame
+        hi = (start + chunk) // frame
+        silent = np.flatnonzero(~mask[lo:hi])
+        if len(silent):
+            cut_frame = lo + silent[np.argmin(energy[lo:hi][silent])]
+            cut = int(cut_frame) * frame + frame // 2
+            bounds.append((start, cut, overlapped))
+            start = cut
+            overlapped = False
+        else:
+            cut = start + chunk
+            bounds.append((start, min(len(audio), cut + overlap), overlapped))
+            start = cut - overlap
+            overlapped = True
+    bounds.append((start, len(audio), overlapped))
+    return bounds
+
+
+def merge_bounds(bounds: list[tuple[int, int, bool]], limit: int) -> list[tuple[int, int, bool]]:
+    """Сливает соседние куски из split_on_silence так, чтобы их было не больше limit"""
+    if len(bounds) <= limit:
+        return bounds
+    size = -(-len(bounds) // limit)
+    groups = [bounds[i:i + size] for i in range(0, len(bounds), size)]
+    return [(group[0][0], group[-1][1], group[0][2]) for group in groups]
+
+
+def _norm(word: str) -> str:
+    return re.sub(r'[^\w]', '', word.lower())
+
+
+def stitch(texts: list[str], overlaps: list[bool] | None = None) -> str:
+    """
+    Склеивает тексты кусков по порядку. overlaps[i] — кусок i перекрывается
+    с предыдущим (флаг из split_on_silence); только на таком стыке совпадение
+    конца предыдущего куска с началом следующего считается повтором и выбрасывается.
+    На стыке по паузе повтор — это сказанное дважды ("сто" + "сто рублей").
+    """
+    words: list[str] = []
+    last = None
+    for i, text in enumerate(texts):
+        new = text.split()
+        if not new:
+            continue
+        # Стык с перекрытием — только если предыдущий кусок уже распознан
+        overlapped = bool(overlaps and overlaps[i]) and last == i - 1
+        last = i
+        best = 0
+        if overlapped:
+            for k in range(min(_MAX_OVERLAP_WORDS, len(words), len(new)), 0, -1):
+                if [_norm(w) for w in words[-k:]] == [_norm(w) for w in new[:k]]:
+                    best = k
+                    break
+        words.extend(new[best:])
+    return " ".join(words)
@@ -0,0 +1,54 @@
+# audio_decode.py
+import os
+import asyncio
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+SAMPLE_RATE = 16000
+FFMPEG_BIN = os.getenv('FFMPEG_BIN', 'ffmpeg')
+# Ограничения на голосовое сообщение: длительность в секундах и размер файла в байтах
+VOICE_MAX_DURATION = float(os.getenv('VOICE_MAX_DURATION', '300'))
+VOICE_MAX_BYTES = int(os.getenv('VOICE_MAX_BYTES', str(5 * 1024 * 1024)))
+
+
+class AudioTooLongError(Exception):
+    """Голосовое сообщение превышает допустимую длительность или размер"""
+
+
+def check_voice_limits(duration: float | None, file_size: int | None) -> None:
+    """
+    Проверяет метаданные Telegram до скачивания файла.
+    Бросает AudioTooLongError, если сообщение слишком длинное или большое.
+    """
+    if duration and duration > VOICE_MAX_DURATION:
+        raise AudioTooLongError(
+            f"длительность {duration:.0f} с, максимум {VOICE_MAX_DURATION:.0f} с"
+        )
+    if file_size and file_size > VOICE_MAX_BYTES:
+        raise AudioTooLongError(
+            f"размер {file_size // 1024} КБ, максимум {VOICE_MAX_BYTES // 1024} КБ"
+        )
+
+
+async def decode_audio(data: bytes, max_duration: float = VOICE_MAX_DURATION) -> np.ndarray:
+    """
+    Декодирует OGG/Opus (и любой формат ffmpeg) из памяти за один проход
+    сразу в 16 кГц mono float32. Диск не используется, event loop не блокируется.
+    Всё, что длиннее max_duration, отбрасывается на стороне ffmpeg.
+    """
+    proc = await asyncio.create_subprocess_exec(
+        FFMPEG_BIN, '-nostdin', '-loglevel', 'error',
+        '-i', 'pipe:0',
+        '-t', str(max_duration),
+        '-f', 'f32le', '-ac', '1', '-ar', str(SAMPLE_RATE),
+        'pipe:1',
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    out, err = await proc.communicate(data)
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg: {err.decode(errors='ignore').strip()}")
+    return np.frombuffer(out, dtype=np.float32)
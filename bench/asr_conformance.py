@@ -0,0 +1,147 @@
+# asr_conformance.py
+"""
+Прогон всех ASR-движков на одних и тех же аудиофайлах.
+
+Каждый файл проходит весь путь transcribe_v (VAD, нормализация, декодирование).
+Для каждого файла выводит текст, задержку и real-time factor (время распознавания /
+длительность аудио) каждого движка рядом, а также WER относительно эталона
+(<файл>.txt рядом с аудио) или между движками, если эталона нет.
+Код возврата 1, если движок упал или WER выше --max-wer.
+
+Использование:
+    python bench/asr_conformance.py путь_к_папке_с_аудио [--model small] [--json out.json]
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import whisper_registry
+from asr_backends import BACKENDS
+from audio_decode import SAMPLE_RATE, decode_audio
+from transcribe_v import transcribe_v
+
+AUDIO_EXT = ('.ogg', '.oga', '.opus', '.wav', '.mp3', '.m4a', '.flac')
+
+
+def wer(reference: str, hypothesis: str) -> float:
+    """Word error rate: расстояние Левенштейна по словам / число слов эталона"""
+    ref = reference.lower().split()
+    hyp = hypothesis.lower().split()
+    if not ref:
+        return 0.0 if not hyp else 1.0
+    prev = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        cur = [i] + [0] * len(hyp)
+        for j, h in enumerate(hyp, 1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (r != h))
+        prev = cur
+    return prev[-1] / len(ref)
+
+
+def load_fixtures(folder: str) -> list[tuple[str, object, str | None]]:
+    """[(имя, аудио 16 кГц float32, эталон или None), ...]"""
+    fixtures = []
+    for fname in sorted(os.listdir(folder)):
+        if not fname.lower().endswith(AUDIO_EXT):
+            continue
+        path = os.path.join(folder, fname)
+        with open(path, 'rb') as f:
+            audio = asyncio.run(decode_audio(f.read()))
+        ref_path = os.path.splitext(path)[0] + '.txt'
+        reference = None
+        if os.path.exists(ref_path):
+            with open(ref_path, encoding='utf-8') as f:
+                reference = f.read().strip()
+        fixtures.append((fname, audio, reference))
+    return fixtures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение ASR-движков")
+    parser.add_argument('folder', help="папка с аудио (и необязательными .txt-эталонами)")
+    parser.add_argument('--model', default='small', help="размер модели Whisper")
+    parser.add_argument('--language', default='ru')
+    parser.add_argument('--backends', default=','.join(BACKENDS), help="движки через запятую")
+    parser.add_argument('--max-wer', type=float, default=None, help="порог WER для кода возврата")
+    parser.add_argument('--json', default=None, help="куда записать результаты в JSON")
+    args = parser.parse_args()
+
+    fixtures = load_fixtures(args.folder)
+    if not fixtures:
+        sys.exit(f"В {args.folder} нет аудиофайлов")
+
+    backends = [b.strip() for b in args.backends.split(',') if b.strip()]
+    results = []
+    failed = False
+
+    for name in backends:
+        t0 = time.perf_counter()
+        try:
+            whisper_registry.get_model(args.model, name)
+        except Exception as e:
+            print(f"[{name}] не удалось загрузить модель: {e}")
+            failed = True
+            continue
+        load_s = time.perf_counter() - t0
+
+        for fname, audio, reference in fixtures:
+            duration = len(audio) / SAMPLE_RATE
+            t0 = time.perf_counter()
+            try:
+                text = transcribe_v(audio, args.model, args.language, backend=name)
+            except Exception as e:
+                print(f"[{name}] {fname}: ошибка распознавания: {e}")
+                failed = True
+                continue
+            latency = time.perf_counter() - t0
+            results.append({
+                'backend': name,
+                'model': args.model,
+                'file': fname,
+                'duration_s': round(duration, 3),
+                'load_s': round(load_s, 3),
+                'latency_s': round(latency, 3),
+                'rtf': round(latency / duration, 4) if duration else None,
+                'text': text,
+                'wer': round(wer(reference, text), 4) if reference is not None else None,
+            })
+
+    # Без эталона сравниваем движки между собой: первый считается опорным
+    by_file = {}
+    for row in results:
+        by_file.setdefault(row['file'], []).append(row)
+    for rows in by_file.values():
+        for row in rows[1:]:
+            row['agreement_wer'] = round(wer(rows[0]['text'], row['text']), 4)
+
+    print(f"{'файл':<24} {'движок':<16} {'сек':>6} {'задержка':>9} {'RTF':>7} {'WER':>6}  текст")
+    for fname, rows in by_file.items():
+        for row in rows:
+            w = row['wer'] if row['wer'] is not None else row.get('agreement_wer')
+            w_disp = f"{w:.2f}" if w is not None else "-"
+            print(f"{fname[:24]:<24} {row['backend']:<16} {row['duration_s']:>6.1f} "
+                  f"{row['latency_s']:>9.3f} {row['rtf']:>7.3f} {w_disp:>6}  {row['text']}")
+            if args.max_wer is not None and w is not None and w > args.max_wer:
+                failed = True
+
+    for name in backends:
+        rows = [r for r in results if r['backend'] == name]
+        if rows:
+            total_audio = sum(r['duration_s'] for r in rows)
+            total_time = sum(r['latency_s'] for r in rows)
+            print(f"[{name}] файлов: {len(rows)}, суммарный RTF: {total_time / total_audio:.3f}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
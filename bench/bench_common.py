@@ -0,0 +1,52 @@
+# bench_common.py
+"""
+Общие помощники бенчмарков: перцентили, свободный порт для заглушки,
+ожидание запуска заглушки и её счётчики, замер задержки event loop.
+"""
+import time
+import socket
+import asyncio
+
+import aiohttp
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+async def wait_ready(base_url: str, timeout: float = 10) -> None:
+    deadline = time.monotonic() + timeout
+    async with aiohttp.ClientSession() as session:
+        while True:
+            try:
+                async with session.get(f"{base_url}/stats") as resp:
+                    if resp.status == 200:
+                        return
+            except aiohttp.ClientError:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Заглушка {base_url} не поднялась за {timeout} с")
+            await asyncio.sleep(0.1)
+
+
+async def stub_stats(base_url: str) -> dict:
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f"{base_url}/stats") as resp:
+            return await resp.json()
+
+
+async def monitor_loop_lag(samples: list[float], stop: asyncio.Event, interval: float = 0.01) -> None:
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        t0 = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, loop.time() - t0 - interval))
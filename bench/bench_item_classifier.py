@@ -0,0 +1,133 @@
+# bench_item_classifier.py
+"""
+Офлайн-оценка классификатора позиций чека (item_classifier).
+
+Корпус (название<TAB>категория) делится на обучающую и тестовую части несколько
+раз со случайным перемешиванием. Индекс строится во временной папке, как в боте:
+add() → save() → центроиды через mmap. Печатает:
+    точность на всех тестовых позициях;
+    покрытие и точность среди уверенных (≥ --threshold) — столько позиций
+    не уйдёт в LLM и столько из них будет верно;
+    скорость classify() на «чеке» из --batch позиций, позиций в секунду.
+
+Корпус можно выгрузить из БД:
+    SELECT s.name, c.name FROM subcategories s JOIN categories c ON c.id = s.category_id;
+
+Использование:
+    python bench/bench_item_classifier.py [--corpus путь.tsv] [--threshold 0.6] [--json out.json]
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import item_classifier
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'item_classifier_corpus.tsv')
+
+
+def load_corpus(path: str) -> list[tuple[str, str]]:
+    rows = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if not line or line.startswith('#'):
+                continue
+            name, category = line.split('\t')
+            rows.append((name, category.strip().lower()))
+    return rows
+
+
+def reset(folder: str) -> None:
+    """Пустой индекс в отдельной папке"""
+    item_classifier.ITEM_CLASSIFIER_PATH = folder
+    item_classifier._categories = []
+    item_classifier._counts = item_classifier.np.zeros(0, dtype=item_classifier.np.int64)
+    item_classifier._sums = None
+    item_classifier._centroids = None
+    item_classifier._last_id = 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Точность и скорость классификатора позиций чека")
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS)
+    parser.add_argument('--threshold', type=float, default=item_classifier.ITEM_CLASSIFIER_MIN_CONFIDENCE)
+    parser.add_argument('--test-frac', type=float, default=0.3, help="доля тестовой части")
+    parser.add_argument('--folds', type=int, default=5, help="число случайных разбиений")
+    parser.add_argument('--batch', type=int, default=60, help="позиций в одном вызове classify")
+    parser.add_argument('--repeat', type=int, default=50, help="повторов замера скорости")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', default=None, help="куда записать результаты в JSON")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    # На маленьком корпусе порог числа примеров мешает оценке
+    item_classifier.ITEM_CLASSIFIER_MIN_EXAMPLES = 1
+    rng = random.Random(args.seed)
+
+    total = correct = confident = confident_correct = 0
+    errors = []
+    with tempfile.TemporaryDirectory() as folder:
+        for _ in range(args.folds):
+            rows = corpus[:]
+            rng.shuffle(rows)
+            n_test = max(1, int(len(rows) * args.test_frac))
+            test, train = rows[:n_test], rows[n_test:]
+
+            reset(folder)
+            item_classifier.add([(c, n) for n, c in train], last_id=len(train))
+            item_classifier.save()
+            item_classifier.load()
+
+            predicted = item_classifier.classify([n for n, _ in test])
+            for (name, expected), (category, confidence) in zip(test, predicted):
+                total += 1
+                correct += category == expected
+                if confidence >= args.threshold:
+                    confident += 1
+                    confident_correct += category == expected
+                    if category != expected:
+                        errors.append((name, expected, category, confidence))
+
+        # Скорость: «чек» из --batch позиций корпуса
+        names = [n for n, _ in corpus]
+        batch = [names[i % len(names)] for i in range(args.batch)]
+        item_classifier.classify(batch)
+        t0 = time.perf_counter()
+        for _ in range(args.repeat):
+            item_classifier.classify(batch)
+        elapsed = time.perf_counter() - t0
+
+    items_per_s = args.batch * args.repeat / elapsed
+    report = {
+        'corpus': len(corpus),
+        'categories': len({c for _, c in corpus}),
+        'accuracy': round(correct / total, 4),
+        'threshold': args.threshold,
+        'coverage': round(confident / total, 4),
+        'confident_accuracy': round(confident_correct / confident, 4) if confident else None,
+        'batch': args.batch,
+        'batch_ms': round(elapsed / args.repeat * 1000, 3),
+        'items_per_s': round(items_per_s),
+    }
+
+    print(f"Корпус: {report['corpus']} позиций, {report['categories']} категорий, {args.folds} разбиений")
+    print(f"Точность (все): {report['accuracy']:.1%}")
+    print(f"Уверенных (≥ {args.threshold}): {report['coverage']:.1%}, "
+          f"из них верно: {report['confident_accuracy'] if confident else 0:.1%}")
+    print(f"Скорость: {report['batch_ms']} мс на чек из {args.batch} позиций, {report['items_per_s']} позиций/с")
+    for name, expected, category, confidence in errors[:20]:
+        print(f"  ОШИБКА: {name!r}: ожидалось {expected}, получено {category} ({confidence:.2f})")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
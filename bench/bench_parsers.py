@@ -0,0 +1,180 @@
+# bench_parsers.py
+"""
+Бенчмарк парсеров parse_expense_t / parse_expense_v / parse_expense_ph
+на локальной заглушке OpenRouter (bench/openrouter_stub.py), без сети и платных запросов.
+
+Запускает заглушку отдельным процессом (или использует уже запущенную, --base-url),
+гоняет каждый парсер --requests раз при --concurrency одновременных вызовах и печатает
+задержку p50/p95/p99, пропускную способность, долю успешных разборов и задержку
+event loop (насколько позже срабатывает таймер — показывает блокирующий код).
+
+Redis-уровни кэшей отключаются. С --llm-only отключаются и быстрый разбор,
+кэш разборов и классификатор позиций, чтобы каждый вызов доходил до LLM.
+
+Ввод: первая колонка bench/fast_parse_corpus.tsv для t/v и названия из
+bench/item_classifier_corpus.tsv для чеков (по --receipt-size позиций).
+
+Использование:
+    python bench/bench_parsers.py [--parsers t,v,ph] [--requests 200] [--concurrency 20]
+                                  [--latency-ms 800] [--error-rate 0.02] [--llm-only] [--json out.json]
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from bench_common import free_port, monitor_loop_lag, percentile, stub_stats, wait_ready
+
+
+def load_column(path: str, column: int) -> list[str]:
+    rows = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if line and not line.startswith('#'):
+                rows.append(line.split('\t')[column])
+    return rows
+
+
+async def run_parser(name: str, call, inputs: list, requests: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    ok = failed = 0
+
+    async def one(item):
+        nonlocal ok, failed
+        async with semaphore:
+            t0 = time.perf_counter()
+            try:
+                result = await call(item)
+            except Exception:
+                failed += 1
+                return
+            latencies.append(time.perf_counter() - t0)
+            if name == 'ph':
+                ok += all(category for category, _, _ in result)
+            else:
+                ok += bool(result[0])
+
+    lag: list[float] = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(monitor_loop_lag(lag, stop))
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(inputs[i % len(inputs)]) for i in range(requests)))
+    wall = time.perf_counter() - t0
+    stop.set()
+    await monitor
+
+    return {
+        'parser': name,
+        'requests': requests,
+        'concurrency': concurrency,
+        'ok': ok,
+        'exceptions': failed,
+        'wall_s': round(wall, 3),
+        'throughput_rps': round(requests / wall, 2),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+        'loop_lag_p99_ms': round(percentile(lag, 99) * 1000, 2),
+        'loop_lag_max_ms': round(max(lag, default=0.0) * 1000, 2),
+    }
+
+
+async def bench(args, base_url: str) -> list[dict]:
+    # Импорт после настройки окружения в main()
+    import llm_client
+    from parse_expense import parse_expense_t, parse_expense_v, parse_expense_ph
+
+    rng = random.Random(args.seed)
+    texts = load_column(os.path.join(BENCH_DIR, 'fast_parse_corpus.tsv'), 0)
+    items = load_column(os.path.join(BENCH_DIR, 'item_classifier_corpus.tsv'), 0)
+    receipts = [[(name, rng.randint(3000, 50000)) for name in rng.sample(items, min(args.receipt_size, len(items)))]
+                for _ in range(20)]
+
+    parsers = {
+        't': (parse_expense_t, texts),
+        'v': (parse_expense_v, texts),
+        'ph': (parse_expense_ph, receipts),
+    }
+    results = []
+    try:
+        for name in args.parsers.split(','):
+            call, inputs = parsers[name.strip()]
+            results.append(await run_parser(name.strip(), call, inputs, args.requests, args.concurrency))
+    finally:
+        await llm_client.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Задержка и пропускная способность парсеров на заглушке LLM")
+    parser.add_argument('--parsers', default='t,v,ph')
+    parser.add_argument('--requests', type=int, default=200, help="вызовов на парсер")
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--receipt-size', type=int, default=30, help="позиций в чеке для ph")
+    parser.add_argument('--llm-only', action='store_true', help="без быстрого разбора, кэшей и классификатора")
+    parser.add_argument('--base-url', default=None, help="уже запущенная заглушка; иначе поднимается своя")
+    parser.add_argument('--latency-ms', type=float, default=800)
+    parser.add_argument('--latency-dist', default='lognormal')
+    parser.add_argument('--jitter', type=float, default=0.5)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', default=None, help="куда записать результаты в JSON")
+    args = parser.parse_args()
+
+    stub = None
+    base_url = args.base_url
+    if base_url is None:
+        port = free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        stub = subprocess.Popen([
+            sys.executable, os.path.join(BENCH_DIR, 'openrouter_stub.py'), '--port', str(port),
+            '--latency-ms', str(args.latency_ms), '--latency-dist', args.latency_dist,
+            '--jitter', str(args.jitter), '--error-rate', str(args.error_rate),
+            '--rate-limit-rate', str(args.rate_limit_rate), '--seed', str(args.seed),
+        ])
+
+    os.environ['OPENROUTER_API_BASE'] = base_url
+    os.environ.setdefault('OPENROUTER_API_KEY', 'stub')
+    # handlers_common создаёт Bot при импорте — нужен токен правильного формата
+    os.environ.setdefault('API_TOKEN', '123456:stub')
+    os.environ['PARSE_CACHE_REDIS'] = '0'
+    os.environ['PRODUCT_CACHE_REDIS'] = '0'
+    if args.llm_only:
+        os.environ['FAST_PARSE_MIN_CONFIDENCE'] = '2'
+        os.environ['PARSE_CACHE_SIZE'] = '0'
+        os.environ['PRODUCT_CACHE_SIZE'] = '0'
+        os.environ['ITEM_CLASSIFIER_MIN_CONFIDENCE'] = '2'
+
+    try:
+        asyncio.run(wait_ready(base_url))
+        results = asyncio.run(bench(args, base_url))
+        stats = asyncio.run(stub_stats(base_url))
+    finally:
+        if stub is not None:
+            stub.terminate()
+            stub.wait()
+
+    print(f"{'парсер':<6} {'запросов':>8} {'успешно':>8} {'rps':>8} {'p50 мс':>9} {'p95 мс':>9} "
+          f"{'p99 мс':>9} {'лаг p99':>8} {'лаг max':>8}")
+    for r in results:
+        print(f"{r['parser']:<6} {r['requests']:>8} {r['ok']:>8} {r['throughput_rps']:>8.1f} {r['p50_ms']:>9.1f} "
+              f"{r['p95_ms']:>9.1f} {r['p99_ms']:>9.1f} {r['loop_lag_p99_ms']:>8.2f} {r['loop_lag_max_ms']:>8.2f}")
+    print(f"Заглушка: {stats}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'args': vars(args), 'stub': stats, 'results': results}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+# bench_receipt_ocr.py
+"""
+Бенчмарк OCR чеков (receipt_ocr): движки tesseract и easyocr на наборе фото чеков.
+
+Фикстуры — синтетические чеки (шрифт DejaVu Sans Mono) с известными позициями
+и итогом, в вариантах: чистый, поворот, размытие, шум, низкий контраст, уменьшенный.
+Свой набор: папка с фото (*.jpg/*.png) и рядом JSON с тем же именем
+{"items": [["название", сумма_в_копейках], ...], "total": копейки}.
+
+Для каждого движка поднимается настоящий пул receipt_ocr (читалка загружается
+один раз на воркер) и замеряются:
+    cold   — задержка на фото с пустым кэшем предобработки;
+    warm   — повторный прогон тех же фото (предобработка из кэша);
+    параллельный прогон — пропускная способность при --concurrency одновременных;
+    качество — полнота и точность позиций (сумма совпала, название похоже
+    не меньше --name-ratio) и доля верно найденных итогов.
+Движок, который не установлен, пропускается.
+
+Использование:
+    python bench/bench_receipt_ocr.py [--engines tesseract,easyocr] [--receipts 8]
+                                      [--workers 1] [--fixtures папка] [--save-fixtures папка]
+                                      [--json out.json]
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import tempfile
+import difflib
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+from bench_common import percentile
+
+FONT_PATHS = [
+    '/usr/share/fonts/truetype/dejavu/DejaVuSansMono.ttf',
+    '/Library/Fonts/DejaVuSansMono.ttf',
+    'C:/Windows/Fonts/consola.ttf',
+]
+
+_ITEMS = [
+    'Молоко 3,2% 1л', 'Хлеб Бородинский', 'Бананы весовые', 'Сыр Российский',
+    'Яйцо куриное С1', 'Кефир 1% 900мл', 'Гречка ядрица', 'Филе куриное',
+    'Пиво светлое 0,5л', 'Порошок стиральный', 'Шампунь 400мл', 'Корм для кошек',
+    'Яблоки Гала', 'Макароны спагетти', 'Чай черный', 'Салфетки бумажные',
+]
+
+VARIANTS = ('clean', 'rotate', 'blur', 'noise', 'contrast', 'small')
+
+
+def rub(kopecks: int) -> str:
+    return f"{kopecks // 100}.{kopecks % 100:02d}"
+
+
+def render_receipt(rng: random.Random, variant: str) -> tuple[bytes, dict]:
+    """Синтетический чек: фото JPEG и ожидаемые позиции"""
+    font_path = next((p for p in FONT_PATHS if os.path.exists(p)), None)
+    font = ImageFont.truetype(font_path, 28) if font_path else ImageFont.load_default()
+
+    items = [(name, rng.randint(30, 900) * 100 + rng.choice([0, 0, 50, 90, 99]))
+             for name in rng.sample(_ITEMS, rng.randint(4, 9))]
+    lines = ['ООО "Ромашка" ИНН 7701234567', 'Кассовый чек Приход', '']
+    for name, price in items:
+        if rng.random() < 0.3:
+            # Название и сумма на разных строках, как в части касс
+            lines += [name, f"1.000 x {rub(price)} ={rub(price)}"]
+        else:
+            lines.append(f"{name:<24}{rub(price):>10}")
+    total = sum(price for _, price in items)
+    lines += ['', f"{'ИТОГО':<24}{rub(total):>10}", f"{'НАЛИЧНЫМИ':<24}{rub(total):>10}"]
+
+    width, line_h = 640, 40
+    img = Image.new('L', (width, 40 + line_h * len(lines)), 255)
+    draw = ImageDraw.Draw(img)
+    for i, line in enumerate(lines):
+        draw.text((20, 20 + i * line_h), line, fill=0, font=font)
+
+    if variant == 'rotate':
+        img = img.rotate(rng.uniform(-3, 3), expand=True, fillcolor=255)
+    elif variant == 'blur':
+        img = img.filter(ImageFilter.GaussianBlur(1.2))
+    elif variant == 'noise':
+        a = np.asarray(img, dtype=np.int16) + np.random.default_rng(rng.randint(0, 2 ** 31)).normal(0, 25, img.size[::-1])
+        img = Image.fromarray(np.clip(a, 0, 255).astype(np.uint8))
+    elif variant == 'contrast':
+        img = Image.fromarray((np.asarray(img, dtype=np.float32) * 0.35 + 120).astype(np.uint8))
+    elif variant == 'small':
+        img = img.resize((img.width // 2, img.height // 2), Image.BILINEAR)
+
+    buffer = BytesIO()
+    img.convert('RGB').save(buffer, format='JPEG', quality=85)
+    return buffer.getvalue(), {'items': [list(it) for it in items], 'total': total, 'variant': variant}
+
+
+def load_fixtures(folder: str) -> list[tuple[str, bytes, dict]]:
+    fixtures = []
+    for name in sorted(os.listdir(folder)):
+        stem, ext = os.path.splitext(name)
+        if ext.lower() not in ('.jpg', '.jpeg', '.png') or not os.path.exists(os.path.join(folder, f"{stem}.json")):
+            continue
+        with open(os.path.join(folder, name), 'rb') as f:
+            data = f.read()
+        with open(os.path.join(folder, f"{stem}.json"), encoding='utf-8') as f:
+            fixtures.append((stem, data, json.load(f)))
+    return fixtures
+
+
+def score(expected: dict, items: list[tuple[str, int]], total: int | None, name_ratio: float) -> dict:
+    """Совпадение позиций: сумма равна и название похоже; каждая ожидаемая — не больше одного раза"""
+    remaining = [(name.lower(), price) for name, price in expected['items']]
+    matched = 0
+    for name, price in items:
+        for i, (exp_name, exp_price) in enumerate(remaining):
+            if price == exp_price and difflib.SequenceMatcher(None, name.lower(), exp_name).ratio() >= name_ratio:
+                matched += 1
+                del remaining[i]
+                break
+    return {'expected': len(expected['items']), 'extracted': len(items), 'matched': matched,
+            'total_ok': total == expected.get('total')}
+
+
+async def bench_engine(engine: str, fixtures, args, cache_dir: str) -> dict:
+    import receipt_ocr
+
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    t0 = time.perf_counter()
+    if not await receipt_ocr.start(args.workers, engine):
+        return {'engine': engine, 'available': False}
+    startup = time.perf_counter() - t0
+
+    try:
+        runs = {}
+        for run in ('cold', 'warm'):
+            latencies, scores = [], []
+            for _, data, expected in fixtures:
+                t0 = time.perf_counter()
+                items, total = await receipt_ocr.recognize(data, timeout=args.timeout)
+                latencies.append(time.perf_counter() - t0)
+                scores.append(score(expected, items, total, args.name_ratio))
+            runs[run] = (latencies, scores)
+
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def one(data: bytes):
+            async with semaphore:
+                await receipt_ocr.recognize(data, timeout=args.timeout)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one(data) for _, data, _ in fixtures))
+        parallel = time.perf_counter() - t0
+    finally:
+        receipt_ocr.shutdown()
+
+    cold, scores = runs['cold']
+    warm = runs['warm'][0]
+    expected = sum(s['expected'] for s in scores)
+    extracted = sum(s['extracted'] for s in scores)
+    matched = sum(s['matched'] for s in scores)
+    by_variant = {}
+    for (_, _, fixture), s in zip(fixtures, scores):
+        v = by_variant.setdefault(fixture.get('variant', 'custom'), [0, 0])
+        v[0] += s['matched']
+        v[1] += s['expected']
+    return {
+        'engine': engine,
+        'available': True,
+        'startup_s': round(startup, 2),
+        'cold_p50_ms': round(percentile(cold, 50) * 1000, 1),
+        'cold_p95_ms': round(percentile(cold, 95) * 1000, 1),
+        'warm_p50_ms': round(percentile(warm, 50) * 1000, 1),
+        'warm_p95_ms': round(percentile(warm, 95) * 1000, 1),
+        'parallel_per_s': round(len(fixtures) / parallel, 2),
+        'recall': round(matched / expected, 4) if expected else None,
+        'precision': round(matched / extracted, 4) if extracted else None,
+        'total_accuracy': round(sum(s['total_ok'] for s in scores) / len(scores), 4),
+        'recall_by_variant': {k: round(m / e, 4) if e else None for k, (m, e) in by_variant.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Задержка и качество OCR чеков по движкам")
+    parser.add_argument('--engines', default='tesseract,easyocr')
+    parser.add_argument('--receipts', type=int, default=8, help="синтетических чеков на вариант")
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--timeout', type=float, default=120)
+    parser.add_argument('--name-ratio', type=float, default=0.8, help="порог похожести названия")
+    parser.add_argument('--fixtures', default=None, help="папка со своими фото и JSON")
+    parser.add_argument('--save-fixtures', default=None, help="куда сохранить синтетические фикстуры")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', default=None, help="куда записать результаты в JSON")
+    args = parser.parse_args()
+
+    if args.fixtures:
+        fixtures = load_fixtures(args.fixtures)
+    else:
+        rng = random.Random(args.seed)
+        fixtures = [(f"{variant}-{i}", *render_receipt(rng, variant))
+                    for variant in VARIANTS for i in range(args.receipts)]
+    if args.save_fixtures:
+        os.makedirs(args.save_fixtures, exist_ok=True)
+        for stem, data, expected in fixtures:
+            with open(os.path.join(args.save_fixtures, f"{stem}.jpg"), 'wb') as f:
+                f.write(data)
+            with open(os.path.join(args.save_fixtures, f"{stem}.json"), 'w', encoding='utf-8') as f:
+                json.dump(expected, f, ensure_ascii=False)
+
+    results = []
+    with tempfile.TemporaryDirectory() as cache_dir:
+        # Воркеры читают настройки из окружения при импорте
+        os.environ['OCR_CACHE_DIR'] = cache_dir
+        for engine in args.engines.split(','):
+            results.append(asyncio.run(bench_engine(engine.strip(), fixtures, args, cache_dir)))
+
+    print(f"Фото: {len(fixtures)}, воркеров: {args.workers}")
+    print(f"{'движок':<10} {'старт с':>8} {'cold p50':>9} {'cold p95':>9} {'warm p50':>9} "
+          f"{'фото/с':>7} {'полнота':>8} {'точность':>9} {'итог':>6}")
+    for r in results:
+        if not r['available']:
+            print(f"{r['engine']:<10} не установлен")
+            continue
+        print(f"{r['engine']:<10} {r['startup_s']:>8.2f} {r['cold_p50_ms']:>9.1f} {r['cold_p95_ms']:>9.1f} "
+              f"{r['warm_p50_ms']:>9.1f} {r['parallel_per_s']:>7.2f} {r['recall'] or 0:>8.1%} "
+              f"{r['precision'] or 0:>9.1%} {r['total_accuracy']:>6.1%}")
+        print(f"{'':<10} полнота по вариантам: {r['recall_by_variant']}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'args': vars(args), 'results': results}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
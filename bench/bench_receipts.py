@@ -0,0 +1,204 @@
+# bench_receipts.py
+"""
+Проверка receipt_client и отложенной очереди чеков (receipt_queue) на локальной
+заглушке proverkacheka (bench/proverkacheka_stub.py).
+
+Два этапа:
+    online — --requests проверок при --concurrency одновременных через receipt_client.verify:
+             задержка p50/p95/p99, доля успешных и задержка event loop;
+    outage — заглушка отвечает 503 первые --down-for секунд; --receipts чеков кладутся
+             в очередь, фоновый проход доставляет их после восстановления сервиса.
+             Печатает, сколько доставлено, за сколько и сколько было попыток.
+
+Нужен запущенный Redis (как у бота): очередь и кэш чеков хранятся в нём. Очередь
+пишется под отдельным ключом (RECEIPT_QUEUE_KEY) и удаляется после прогона.
+
+Использование:
+    python bench/bench_receipts.py [--requests 200] [--concurrency 20] [--latency-ms 300]
+                                   [--error-rate 0.05] [--receipts 20] [--down-for 5] [--json out.json]
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from bench_common import free_port, monitor_loop_lag, percentile, stub_stats, wait_ready
+
+
+def start_stub(port: int, args, down_for: float) -> subprocess.Popen:
+    return subprocess.Popen([
+        sys.executable, os.path.join(BENCH_DIR, 'proverkacheka_stub.py'), '--port', str(port),
+        '--latency-ms', str(args.latency_ms), '--error-rate', str(args.error_rate),
+        '--pending-rate', str(args.pending_rate), '--down-for', str(down_for), '--seed', str(args.seed),
+    ])
+
+
+def make_qr(rng: random.Random) -> str:
+    return (f"t=20250101T{rng.randint(0, 2359):04d}&s={rng.randint(100, 9999)}.00"
+            f"&fn={rng.randint(10 ** 15, 10 ** 16 - 1)}&i={rng.randint(1, 99999)}"
+            f"&fp={rng.randint(10 ** 9, 10 ** 10 - 1)}&n=1")
+
+
+async def bench_online(args, rng: random.Random) -> dict:
+    import receipt_client
+    from receipt_client import ReceiptError
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies: list[float] = []
+    ok = failed = 0
+
+    async def one(qr_raw: str):
+        nonlocal ok, failed
+        async with semaphore:
+            t0 = time.perf_counter()
+            try:
+                result = await receipt_client.verify(qr_raw)
+            except ReceiptError:
+                failed += 1
+                return
+            latencies.append(time.perf_counter() - t0)
+            ok += result.get('code') == 1
+
+    lag: list[float] = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(monitor_loop_lag(lag, stop))
+    t0 = time.perf_counter()
+    try:
+        await asyncio.gather(*(one(make_qr(rng)) for _ in range(args.requests)))
+    finally:
+        await receipt_client.close()
+    wall = time.perf_counter() - t0
+    stop.set()
+    await monitor
+
+    return {
+        'requests': args.requests,
+        'concurrency': args.concurrency,
+        'ok': ok,
+        'failed': failed,
+        'throughput_rps': round(args.requests / wall, 2),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+        'loop_lag_max_ms': round(max(lag, default=0.0) * 1000, 2),
+    }
+
+
+class FakeBot:
+    """Вместо Telegram: запоминает отправленные сообщения"""
+
+    def __init__(self):
+        self.sent: list[tuple[int, str]] = []
+
+    async def send_message(self, chat_id: int, text: str, **kwargs):
+        self.sent.append((chat_id, text))
+
+
+async def bench_outage(args, rng: random.Random) -> dict:
+    import receipt_client
+    import receipt_queue
+    from handlers_common import r
+
+    delivered: dict[str, float] = {}
+
+    async def deliver(bot, chat_id, user_id, username, qr_raw, result):
+        if result.get('code') == 1:
+            delivered[qr_raw] = time.perf_counter()
+
+    bot = FakeBot()
+    receipts = [make_qr(rng) for _ in range(args.receipts)]
+    t0 = time.perf_counter()
+    for n, qr_raw in enumerate(receipts):
+        receipt_queue.enqueue(qr_raw, user_id=n, chat_id=n, username='bench')
+
+    passes = 0
+    deadline = t0 + args.timeout
+    try:
+        while len(delivered) + receipt_queue.stats['failed'] < len(receipts) and time.perf_counter() < deadline:
+            passes += 1
+            await receipt_queue.process_due(bot, deliver)
+            await asyncio.sleep(receipt_queue.RECEIPT_QUEUE_POLL)
+    finally:
+        await receipt_client.close()
+        r.delete(receipt_queue.RECEIPT_QUEUE_KEY, f"{receipt_queue.RECEIPT_QUEUE_KEY}:jobs")
+
+    waits = [delivered[q] - t0 for q in receipts if q in delivered]
+    return {
+        'receipts': len(receipts),
+        'down_for_s': args.down_for,
+        'delivered': len(delivered),
+        'failed': receipt_queue.stats['failed'],
+        'retried': receipt_queue.stats['retried'],
+        'passes': passes,
+        'deliver_p50_s': round(percentile(waits, 50), 2),
+        'deliver_max_s': round(max(waits, default=0.0), 2),
+        'failure_messages': len(bot.sent),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Клиент proverkacheka и отложенная очередь чеков на заглушке")
+    parser.add_argument('--requests', type=int, default=200, help="проверок на этапе online")
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--receipts', type=int, default=20, help="чеков в очереди на этапе outage")
+    parser.add_argument('--down-for', type=float, default=5, help="простой сервиса на этапе outage, с")
+    parser.add_argument('--timeout', type=float, default=60, help="сколько ждать доставки, с")
+    parser.add_argument('--latency-ms', type=float, default=300)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--pending-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', default=None, help="куда записать результаты в JSON")
+    args = parser.parse_args()
+
+    # handlers_common создаёт Bot при импорте — нужен токен правильного формата
+    os.environ.setdefault('API_TOKEN', '123456:stub')
+    os.environ.setdefault('FNS_TOKEN', 'stub')
+    os.environ['RECEIPT_QUEUE_KEY'] = f"bench:receipt:deferred:{uuid.uuid4().hex[:8]}"
+    os.environ['RECEIPT_QUEUE_DELAY'] = '0.5'
+    os.environ['RECEIPT_QUEUE_DELAY_MAX'] = '2'
+    os.environ['RECEIPT_QUEUE_POLL'] = '0.5'
+    os.environ['RECEIPT_CACHE_TTL'] = '60'
+
+    rng = random.Random(args.seed)
+    report = {}
+    for stage, down_for in (('online', 0.0), ('outage', args.down_for)):
+        port = free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        os.environ['PROVERKACHEKA_API_BASE'] = base_url
+        # Модули читают адрес при импорте
+        for name in ('receipt_client', 'receipt_store', 'receipt_queue'):
+            sys.modules.pop(name, None)
+        stub = start_stub(port, args, down_for)
+        try:
+            asyncio.run(wait_ready(base_url))
+            run = bench_online if stage == 'online' else bench_outage
+            report[stage] = asyncio.run(run(args, rng))
+            report[stage]['stub'] = asyncio.run(stub_stats(base_url))
+        finally:
+            stub.terminate()
+            stub.wait()
+
+    on, out = report['online'], report['outage']
+    print(f"online: {on['ok']}/{on['requests']} проверено, {on['throughput_rps']} rps, "
+          f"p50 {on['p50_ms']} мс, p95 {on['p95_ms']} мс, p99 {on['p99_ms']} мс, "
+          f"лаг loop max {on['loop_lag_max_ms']} мс")
+    print(f"outage: {out['delivered']}/{out['receipts']} доставлено после простоя {out['down_for_s']} с "
+          f"(p50 {out['deliver_p50_s']} с, max {out['deliver_max_s']} с), "
+          f"повторов {out['retried']}, отказов {out['failed']}, проходов {out['passes']}")
+    print(f"Заглушка: online {on['stub']}, outage {out['stub']}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'args': vars(args), **report}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
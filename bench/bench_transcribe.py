@@ -0,0 +1,298 @@
+# bench_transcribe.py
+"""
+Бенчмарк этапов распознавания голоса, работает офлайн на CPU.
+
+Генерирует синтетические фикстуры (похожий на речь сигнал и тишина) с разными
+частотой дискретизации, числом каналов и длиной, и по отдельности замеряет этапы:
+    read       — чтение WAV-файла
+    resample   — ресемплинг до 16 кГц
+    downmix    — сведение каналов в mono
+    normalize  — пиковая нормализация
+    dtype      — приведение к float32
+    ffmpeg     — текущий путь: декодирование ffmpeg за один проход (если ffmpeg есть)
+    vad        — обрезка тишины (vad.trim_silence)
+    decode     — распознавание моделью (только с --model, если веса уже скачаны)
+Для каждого этапа — время, real-time factor и пиковая память (tracemalloc).
+
+Результат — JSON (--out), его можно сравнить с прошлым прогоном через --compare.
+
+Использование:
+    python bench/bench_transcribe.py --out bench_output.json
+    python bench/bench_transcribe.py --model tiny --backend faster-whisper
+    python bench/bench_transcribe.py --compare old.json --out new.json
+"""
+import os
+import sys
+import json
+import time
+import wave
+import shutil
+import asyncio
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio_decode import SAMPLE_RATE, decode_audio
+from vad import trim_silence
+
+try:
+    import soundfile as sf
+except ImportError:
+    sf = None
+
+try:
+    import librosa
+except ImportError:
+    librosa = None
+
+
+# ---------- Фикстуры ----------
+
+def synth_speech(seconds: float, sr: int, rng: np.random.Generator) -> np.ndarray:
+    """Похожий на речь сигнал: «слоги» из гармоник основного тона с паузами и шумом"""
+    n = int(seconds * sr)
+    t = np.arange(n) / sr
+    out = np.zeros(n)
+    pos = int(0.3 * sr)
+    while pos < n:
+        syl = int(rng.uniform(0.12, 0.3) * sr)
+        f0 = rng.uniform(100, 220)
+        seg_t = t[:min(syl, n - pos)]
+        env = np.hanning(len(seg_t))
+        tone = sum(np.sin(2 * np.pi * f0 * k * seg_t) / k for k in range(1, 6))
+        out[pos:pos + len(seg_t)] += env * tone * rng.uniform(0.2, 0.5)
+        # Между словами паузы подлиннее
+        pos += len(seg_t) + int(rng.choice([0.05, 0.05, 0.4]) * sr)
+    out += rng.normal(0, 0.005, n)
+    return out
+
+
+def synth_silence(seconds: float, sr: int, rng: np.random.Generator) -> np.ndarray:
+    return rng.normal(0, 0.002, int(seconds * sr))
+
+
+def write_wav(path: str, data: np.ndarray, sr: int) -> None:
+    """data: (n,) или (n, channels), значения в [-1, 1]"""
+    channels = 1 if data.ndim == 1 else data.shape[1]
+    pcm = (np.clip(data, -1, 1) * 32767).astype('<i2')
+    with wave.open(path, 'wb') as w:
+        w.setnchannels(channels)
+        w.setsampwidth(2)
+        w.setframerate(sr)
+        w.writeframes(pcm.tobytes())
+
+
+def make_fixtures(folder: str, lengths, rates, channels, seed: int = 0) -> list[dict]:
+    rng = np.random.default_rng(seed)
+    fixtures = []
+    for kind, synth in (('speech', synth_speech), ('silence', synth_silence)):
+        for seconds in lengths:
+            for sr in rates:
+                for ch in channels:
+                    mono = synth(seconds, sr, rng)
+                    data = mono if ch == 1 else np.stack([mono] * ch, axis=1)
+                    name = f"{kind}_{seconds}s_{sr}hz_{ch}ch.wav"
+                    path = os.path.join(folder, name)
+                    write_wav(path, data, sr)
+                    fixtures.append({'name': name, 'path': path, 'kind': kind,
+                                     'seconds': seconds, 'sr': sr, 'channels': ch})
+    return fixtures
+
+
+# ---------- Этапы ----------
+
+def read_wav(path: str) -> tuple[np.ndarray, int]:
+    if sf is not None:
+        return sf.read(path)
+    with wave.open(path, 'rb') as w:
+        sr, ch = w.getframerate(), w.getnchannels()
+        pcm = np.frombuffer(w.readframes(w.getnframes()), dtype='<i2')
+    data = pcm.astype(np.float64) / 32768
+    return (data.reshape(-1, ch) if ch > 1 else data), sr
+
+
+def resample(data: np.ndarray, sr: int) -> np.ndarray:
+    if sr == SAMPLE_RATE:
+        return data
+    if librosa is not None:
+        return librosa.resample(data, orig_sr=sr, target_sr=SAMPLE_RATE, axis=0)
+    # Без librosa — линейная интерполяция (по каждому каналу)
+    n = int(len(data) * SAMPLE_RATE / sr)
+    x_new = np.linspace(0, len(data) - 1, n)
+    x_old = np.arange(len(data))
+    if data.ndim == 1:
+        return np.interp(x_new, x_old, data)
+    return np.stack([np.interp(x_new, x_old, data[:, c]) for c in range(data.shape[1])], axis=1)
+
+
+def downmix(data: np.ndarray) -> np.ndarray:
+    return np.mean(data, axis=1) if data.ndim > 1 else data
+
+
+def normalize(data: np.ndarray) -> np.ndarray:
+    max_amp = float(np.max(np.abs(data))) if len(data) else 0.0
+    return data / max_amp if max_amp > 0 else data
+
+
+def to_float32(data: np.ndarray) -> np.ndarray:
+    return data.astype(np.float32)
+
+
+def measure(fn, *args):
+    """Возвращает (результат, секунды, пик памяти в МБ) одного вызова"""
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    result = fn(*args)
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / (1024 * 1024)
+
+
+def run_fixture(fx: dict, repeat: int, model=None, engine=None) -> list[dict]:
+    rows = []
+
+    def record(stage, seconds_list, peak):
+        best = min(seconds_list)
+        rows.append({
+            'fixture': fx['name'], 'kind': fx['kind'], 'audio_s': fx['seconds'],
+            'sr': fx['sr'], 'channels': fx['channels'], 'stage': stage,
+            'seconds': round(best, 6),
+            'rtf': round(best / fx['seconds'], 6),
+            'peak_mb': round(peak, 3),
+        })
+
+    # Поэтапный путь: read → resample → downmix → normalize → float32
+    stages = [('read', read_wav), ('resample', resample), ('downmix', downmix),
+              ('normalize', normalize), ('dtype', to_float32)]
+    for stage, fn in stages:
+        times, peak = [], 0.0
+        for _ in range(repeat):
+            if stage == 'read':
+                (data, sr), t, p = measure(fn, fx['path'])
+            elif stage == 'resample':
+                out, t, p = measure(fn, data, sr)
+            else:
+                out, t, p = measure(fn, data)
+            times.append(t)
+            peak = max(peak, p)
+        if stage != 'read':
+            data = out
+        record(stage, times, peak)
+
+    # Текущий путь: ffmpeg из памяти сразу в 16 кГц mono float32
+    if shutil.which('ffmpeg'):
+        with open(fx['path'], 'rb') as f:
+            raw = f.read()
+        times, peak = [], 0.0
+        for _ in range(repeat):
+            pcm, t, p = measure(lambda b: asyncio.run(decode_audio(b)), raw)
+            times.append(t)
+            peak = max(peak, p)
+        record('ffmpeg', times, peak)
+        data = pcm
+
+    times, peak = [], 0.0
+    for _ in range(repeat):
+        (trimmed, ratio), t, p = measure(trim_silence, data, SAMPLE_RATE)
+        times.append(t)
+        peak = max(peak, p)
+    record('vad', times, peak)
+    rows[-1]['speech_ratio'] = round(ratio, 3)
+
+    if model is not None:
+        audio = normalize(trimmed).astype(np.float32)
+        text, t, p = measure(engine.transcribe, model, audio, 'ru')
+        record('decode', [t], p)
+        rows[-1]['text'] = text
+
+    return rows
+
+
+def compare(old_rows: list[dict], new_rows: list[dict], threshold: float) -> list[str]:
+    """Этапы, ставшие медленнее более чем на threshold (доля)"""
+    old = {(r['fixture'], r['stage']): r for r in old_rows}
+    regressions = []
+    for r in new_rows:
+        prev = old.get((r['fixture'], r['stage']))
+        if prev and prev['seconds'] > 0:
+            change = r['seconds'] / prev['seconds'] - 1
+            if change > threshold:
+                regressions.append(
+                    f"{r['fixture']} {r['stage']}: {prev['seconds']:.4f}s → {r['seconds']:.4f}s (+{change:.0%})"
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк этапов transcribe_v")
+    parser.add_argument('--lengths', default='2,10,60', help="длины фикстур, с")
+    parser.add_argument('--rates', default='16000,48000', help="частоты дискретизации")
+    parser.add_argument('--channels', default='1,2', help="число каналов")
+    parser.add_argument('--repeat', type=int, default=3, help="повторов на этап (берётся лучший)")
+    parser.add_argument('--model', default=None, help="модель для этапа decode (tiny, base…)")
+    parser.add_argument('--backend', default=None, help="ASR-движок для этапа decode")
+    parser.add_argument('--out', default=None, help="куда записать JSON")
+    parser.add_argument('--compare', default=None, help="прошлый JSON для сравнения")
+    parser.add_argument('--threshold', type=float, default=0.2, help="порог регрессии, доля")
+    args = parser.parse_args()
+
+    model = engine = None
+    if args.model:
+        import whisper_registry
+        from asr_backends import get_backend
+        engine = get_backend(args.backend)
+        try:
+            model = whisper_registry.get_model(args.model, engine.name)
+        except Exception as e:
+            print(f"Этап decode пропущен: модель {args.model} недоступна ({e})", file=sys.stderr)
+
+    with tempfile.TemporaryDirectory() as folder:
+        fixtures = make_fixtures(
+            folder,
+            [int(x) for x in args.lengths.split(',')],
+            [int(x) for x in args.rates.split(',')],
+            [int(x) for x in args.channels.split(',')]
+        )
+        rows = []
+        for fx in fixtures:
+            rows.extend(run_fixture(fx, args.repeat, model, engine))
+
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'cpu_count': os.cpu_count(),
+            'soundfile': sf is not None,
+            'librosa': librosa is not None,
+            'ffmpeg': bool(shutil.which('ffmpeg')),
+            'model': args.model if model is not None else None,
+            'backend': engine.name if model is not None else None,
+        },
+        'results': rows,
+    }
+
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print(f"{'фикстура':<30} {'этап':<10} {'сек':>10} {'RTF':>10} {'пик МБ':>8}")
+    for r in rows:
+        print(f"{r['fixture']:<30} {r['stage']:<10} {r['seconds']:>10.5f} {r['rtf']:>10.5f} {r['peak_mb']:>8.2f}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            old = json.load(f)
+        regressions = compare(old['results'], rows, args.threshold)
+        for line in regressions:
+            print(f"РЕГРЕССИЯ: {line}")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
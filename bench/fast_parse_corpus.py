@@ -0,0 +1,65 @@
+# fast_parse_corpus.py
+"""
+Прогон быстрого локального парсера по корпусу bench/fast_parse_corpus.tsv.
+
+Печатает долю ввода, разобранного без LLM (hit rate), и все расхождения.
+Ошибкой считается уверенный (≥ FAST_PARSE_MIN_CONFIDENCE) результат,
+не совпавший с ожиданием: такой ввод сохранится в БД неправильно.
+Код возврата 1 при наличии ошибок.
+
+Использование:
+    python bench/fast_parse_corpus.py [путь_к_корпусу.tsv]
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fast_parse import parse_fast, FAST_PARSE_MIN_CONFIDENCE
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fast_parse_corpus.tsv')
+
+
+def load_corpus(path: str) -> list[tuple[str, str]]:
+    rows = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if not line or line.startswith('#'):
+                continue
+            raw, expected = line.split('\t')
+            rows.append((raw, expected.strip()))
+    return rows
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_CORPUS
+    corpus = load_corpus(path)
+
+    hits = 0
+    errors = []
+    missed = []
+    for raw, expected in corpus:
+        category, subcategory, price, confidence = parse_fast(raw)
+        if confidence >= FAST_PARSE_MIN_CONFIDENCE:
+            hits += 1
+            got = f"{category}|{subcategory}|{price}"
+            if got != expected:
+                errors.append(f"{raw!r}: получено {got} ({confidence:.2f}), ожидалось {expected}")
+        elif expected != '-':
+            missed.append(f"{raw!r}: уверенность {confidence:.2f}, ожидалось {expected}")
+
+    expected_hits = sum(1 for _, e in corpus if e != '-')
+    print(f"Строк в корпусе: {len(corpus)}")
+    print(f"Разобрано локально (hit rate): {hits}/{len(corpus)} = {hits / len(corpus):.0%}")
+    print(f"Из ожидаемых локально: {hits - len(errors)}/{expected_hits}")
+    for line in missed:
+        print(f"УШЛО В LLM: {line}")
+    for line in errors:
+        print(f"ОШИБКА: {line}")
+
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+# openrouter_stub.py
+"""
+Локальная заглушка OpenAI-совместимого API (POST /chat/completions) вместо OpenRouter.
+
+Отвечает с заданной задержкой и долей ошибок, ответы строит по промпту:
+    разбор ввода (parse_expense_t/v)  → "прочее|<слова ввода>|<число из ввода>"
+    пачка вводов (LLM_BATCH_WINDOW_MS) → "N. прочее|...|..." на каждый номер
+    позиции чека (parse_expense_ph)   → "<название>|<категория>" по ключевым словам
+Свои ответы можно задать файлом JSON {"подстрока промпта": "ответ", ...} — первый
+совпавший ключ важнее встроенных правил.
+
+Бот направляется на заглушку переменной окружения:
+    OPENROUTER_API_BASE=http://127.0.0.1:8099
+
+Использование:
+    python bench/openrouter_stub.py [--port 8099] [--latency-ms 800] [--latency-dist lognormal]
+                                    [--jitter 0.5] [--error-rate 0.02] [--rate-limit-rate 0.05]
+                                    [--responses canned.json] [--seed 0]
+"""
+import re
+import json
+import random
+import asyncio
+import argparse
+from aiohttp import web
+
+# Ключевые слова для правдоподобных категорий позиций чека
+_ITEM_RULES = [
+    ('алкоголь', ('пиво', 'вино', 'водка', 'коньяк', 'сидр')),
+    ('быт', ('порошок', 'средство', 'пакет', 'бумага', 'салфетк', 'губк', 'гель для стирки')),
+    ('красота', ('шампунь', 'паста', 'мыло', 'дезодорант', 'крем', 'гель для душа')),
+    ('здоровье', ('таб', 'капли', 'пластырь', 'спрей', 'витамин')),
+    ('животные', ('корм', 'наполнитель', 'лакомство')),
+    ('дети', ('подгузник', 'пюре', 'смесь')),
+]
+
+
+class Stub:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.canned = {}
+        if args.responses:
+            with open(args.responses, encoding='utf-8') as f:
+                self.canned = json.load(f)
+        self.stats = {'requests': 0, 'errors': 0, 'rate_limited': 0}
+
+    def latency(self) -> float:
+        """Задержка ответа, с: fixed / uniform / exponential / lognormal вокруг --latency-ms"""
+        mean = self.args.latency_ms / 1000
+        dist = self.args.latency_dist
+        if dist == 'fixed' or mean <= 0:
+            return max(mean, 0.0)
+        if dist == 'uniform':
+            return self.rng.uniform(mean * (1 - self.args.jitter), mean * (1 + self.args.jitter))
+        if dist == 'exponential':
+            return self.rng.expovariate(1 / mean)
+        # lognormal: медиана = mean, длинный хвост задаётся --jitter (sigma)
+        return self.rng.lognormvariate(0, self.args.jitter) * mean
+
+    def answer(self, prompt: str) -> str:
+        for key, value in self.canned.items():
+            if key in prompt:
+                return value
+
+        if 'Список товаров:' in prompt:
+            lines = []
+            for name in re.findall(r'^- (.+)$', prompt, re.M):
+                low = name.lower()
+                category = next((c for c, words in _ITEM_RULES if any(w in low for w in words)), 'еда')
+                lines.append(f"{name}|{category}")
+            return "\n".join(lines)
+
+        task = prompt.split('Обработай', 1)[-1]
+        inputs = re.findall(r'^(?:(\d+)\. )?Ввод: "(.*)"$', task, re.M)
+        lines = []
+        for number, raw in inputs:
+            words = re.findall(r'[^\W\d_]+', raw.lower())
+            price = re.search(r'\d+', raw)
+            line = f"прочее|{' '.join(words) or 'разное'}|{price.group() if price else ''}"
+            lines.append(f"{number}. {line}" if number else line)
+        return "\n".join(lines) or "прочее|разное|"
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.stats['requests'] += 1
+        payload = await request.json()
+        await asyncio.sleep(self.latency())
+
+        roll = self.rng.random()
+        if roll < self.args.rate_limit_rate:
+            self.stats['rate_limited'] += 1
+            return web.json_response({'error': {'message': 'rate limited'}}, status=429,
+                                     headers={'Retry-After': '1'})
+        if roll < self.args.rate_limit_rate + self.args.error_rate:
+            self.stats['errors'] += 1
+            return web.json_response({'error': {'message': 'upstream error'}}, status=502)
+
+        prompt = payload['messages'][-1]['content']
+        content = self.answer(prompt)
+        return web.json_response({
+            'id': f"stub-{self.stats['requests']}",
+            'object': 'chat.completion',
+            'model': payload.get('model'),
+            'choices': [{'index': 0, 'finish_reason': 'stop',
+                         'message': {'role': 'assistant', 'content': content}}],
+            'usage': {'prompt_tokens': len(prompt) // 4, 'completion_tokens': len(content) // 4},
+        })
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats)
+
+
+def make_app(args) -> web.Application:
+    stub = Stub(args)
+    app = web.Application()
+    # Путь и с префиксом, и без: OPENROUTER_API_BASE может оканчиваться на /api/v1
+    app.router.add_post('/chat/completions', stub.handle)
+    app.router.add_post('/api/v1/chat/completions', stub.handle)
+    app.router.add_get('/stats', stub.handle_stats)
+    return app
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Заглушка OpenRouter для офлайн-бенчмарков")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--latency-ms', type=float, default=800, help="средняя (медианная) задержка, мс")
+    parser.add_argument('--latency-dist', default='lognormal',
+                        choices=('fixed', 'uniform', 'exponential', 'lognormal'))
+    parser.add_argument('--jitter', type=float, default=0.5,
+                        help="разброс: доля для uniform, sigma для lognormal")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="доля ответов 502")
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help="доля ответов 429")
+    parser.add_argument('--responses', default=None, help="JSON с готовыми ответами")
+    parser.add_argument('--seed', type=int, default=0)
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    web.run_app(make_app(args), host=args.host, port=args.port, print=None)
+
+
+if __name__ == '__main__':
+    main()
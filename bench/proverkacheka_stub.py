@@ -0,0 +1,113 @@
+# proverkacheka_stub.py
+"""
+Локальная заглушка API proverkacheka (POST /check/get) для проверки receipt_client
+и отложенной очереди чеков без сети и токена ФНС.
+
+Чек строится детерминированно по строке QR: одинаковый QR — одинаковые позиции.
+QR без полей fn/i/fp считается некорректным (code 0). Можно задать задержку,
+долю ответов 502, долю ответов «данные чека пока не получены» (code 2) и
+начальный простой (--down-for: первые N секунд все запросы получают 503).
+
+Бот направляется на заглушку переменной окружения:
+    PROVERKACHEKA_API_BASE=http://127.0.0.1:8098
+
+Использование:
+    python bench/proverkacheka_stub.py [--port 8098] [--latency-ms 300] [--jitter 0.5]
+                                       [--error-rate 0.05] [--pending-rate 0.1]
+                                       [--down-for 30] [--items 12] [--seed 0]
+"""
+import time
+import random
+import asyncio
+import argparse
+import hashlib
+from urllib.parse import parse_qs
+from aiohttp import web
+
+# Названия позиций для правдоподобных чеков
+_NAMES = [
+    'Молоко 3,2% 1л', 'Хлеб Бородинский 400г', 'Бананы весовые', 'Сыр Российский 200г',
+    'Яйцо С1 10шт', 'Кефир 1% 900мл', 'Гречка 900г', 'Курица филе охл.', 'Пиво светлое 0,5л',
+    'Порошок стиральный 3кг', 'Шампунь 400мл', 'Корм для кошек 85г', 'Яблоки Гала',
+    'Макароны спагетти 450г', 'Чай черный 100пак', 'Салфетки бумажные 100шт',
+]
+
+
+class Stub:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.started = time.monotonic()
+        self.stats = {'requests': 0, 'down': 0, 'errors': 0, 'pending': 0, 'invalid': 0, 'ok': 0}
+
+    def receipt(self, qr_raw: str) -> dict:
+        rng = random.Random(hashlib.sha256(qr_raw.encode('utf-8')).hexdigest())
+        items = []
+        for name in rng.sample(_NAMES, min(self.args.items, len(_NAMES))):
+            price = rng.randint(30, 900) * 100
+            quantity = rng.choice([1, 1, 1, 2])
+            items.append({'name': name, 'price': price, 'quantity': quantity, 'sum': price * quantity})
+        return {'items': items, 'totalSum': sum(it['sum'] for it in items)}
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.stats['requests'] += 1
+        form = await request.post()
+        await asyncio.sleep(max(0.0, self.rng.uniform(1 - self.args.jitter, 1 + self.args.jitter)
+                                * self.args.latency_ms / 1000))
+
+        if time.monotonic() - self.started < self.args.down_for:
+            self.stats['down'] += 1
+            return web.json_response({'error': 'service unavailable'}, status=503)
+        roll = self.rng.random()
+        if roll < self.args.error_rate:
+            self.stats['errors'] += 1
+            return web.json_response({'error': 'bad gateway'}, status=502)
+        if roll < self.args.error_rate + self.args.pending_rate:
+            self.stats['pending'] += 1
+            return web.json_response({'code': 2, 'first': 0, 'data': 'Данные чека пока не получены'})
+
+        qr_raw = form.get('qrraw', '')
+        fields = parse_qs(qr_raw)
+        if not all(fields.get(k) for k in ('fn', 'i', 'fp')):
+            self.stats['invalid'] += 1
+            return web.json_response({'code': 0, 'first': 0, 'data': 'Чек некорректен'})
+
+        self.stats['ok'] += 1
+        return web.json_response({'code': 1, 'first': 1, 'data': {'json': self.receipt(qr_raw)},
+                                  'request': {'qrraw': qr_raw}})
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats)
+
+
+def make_app(args) -> web.Application:
+    stub = Stub(args)
+    app = web.Application()
+    # Путь и с префиксом, и без: PROVERKACHEKA_API_BASE может оканчиваться на /api/v1
+    app.router.add_post('/check/get', stub.handle)
+    app.router.add_post('/api/v1/check/get', stub.handle)
+    app.router.add_get('/stats', stub.handle_stats)
+    return app
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Заглушка proverkacheka для офлайн-проверок")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8098)
+    parser.add_argument('--latency-ms', type=float, default=300, help="средняя задержка, мс")
+    parser.add_argument('--jitter', type=float, default=0.5, help="разброс задержки, доля")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="доля ответов 502")
+    parser.add_argument('--pending-rate', type=float, default=0.0, help="доля ответов code 2")
+    parser.add_argument('--down-for', type=float, default=0.0, help="первые N секунд отвечать 503")
+    parser.add_argument('--items', type=int, default=12, help="позиций в чеке")
+    parser.add_argument('--seed', type=int, default=0)
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    web.run_app(make_app(args), host=args.host, port=args.port, print=None)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+# category_index.py
+import os
+import re
+import asyncio
+import logging
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+from trigram_index import TrigramIndex
+from fast_parse import BUILTIN_CATEGORIES
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Сколько пользователей держать в памяти одновременно
+CATEGORY_INDEX_USERS = int(os.getenv('CATEGORY_INDEX_USERS', '10000'))
+# Нечёткое исправление ("малако" → "молоко") принимается без LLM от этой уверенности
+FUZZY_MIN_CONFIDENCE = float(os.getenv('FUZZY_MIN_CONFIDENCE', '0.8'))
+# Для коротких слов (до 4 букв) порог строже: одна замена гласной даёт
+# другое настоящее слово ("сак" → "сок", "кафе" → "кофе")
+FUZZY_SHORT_MIN_CONFIDENCE = float(os.getenv('FUZZY_SHORT_MIN_CONFIDENCE', '0.9'))
+_SHORT_WORD = 4
+
+# Окончания, которые срезаются для ключа без словоформы: "картошки" → "картошк"
+_ENDINGS_RE = re.compile(r'(ами|ями|ого|его|ому|ему|ой|ей|ом|ем|ам|ям|ах|ях|ов|ев|ы|и|а|я|у|ю|о|е|ь)$')
+
+# user_id -> {нормализованное название -> (категория, подкатегория)}
+_indexes: "OrderedDict[int, dict[str, tuple[str, str]]]" = OrderedDict()
+_locks: dict[int, asyncio.Lock] = {}
+# user_id -> (триграммы подкатегорий, триграммы категорий); строятся при первом нечётком поиске
+_fuzzy: dict[int, tuple[TrigramIndex, TrigramIndex]] = {}
+
+# Счётчики попаданий и промахов
+stats = {'hits': 0, 'misses': 0, 'loads': 0, 'fuzzy_hits': 0}
+
+
+def normalize(name: str) -> str:
+    """Нижний регистр, ё → е, без знаков, пробелы схлопнуты"""
+    text = name.lower().replace('ё', 'е')
+    return " ".join(re.sub(r'[^\w]+', ' ', text).split())
+
+
+def _stem(word: str) -> str:
+    stemmed = _ENDINGS_RE.sub('', word)
+    return stemmed if len(stemmed) >= 3 else word
+
+
+def _keys(name: str) -> list[str]:
+    """Ключи названия: нормализованная форма и форма без окончаний"""
+    norm = normalize(name)
+    if not norm:
+        return []
+    stemmed = " ".join(_stem(w) for w in norm.split())
+    return [norm] if stemmed == norm else [norm, '~' + stemmed]
+
+
+def _add(index: dict, category: str, subcategory: str) -> None:
+    for key in _keys(subcategory):
+        index[key] = (category, subcategory)
+
+
+async def _get_index(user_id: int) -> dict[str, tuple[str, str]]:
+    """Индекс пользователя; при первом обращении строится из subcategories"""
+    index = _indexes.get(user_id)
+    if index is not None:
+        _indexes.move_to_end(user_id)
+        return index
+
+    lock = _locks.setdefault(user_id, asyncio.Lock())
+    async with lock:
+        index = _indexes.get(user_id)
+        if index is None:
+            from db_handler import get_user_subcategories
+            index = {}
+            # Строки идут по id: при совпадении названий побеждает более свежая
+            for row in await get_user_subcategories(user_id):
+                _add(index, row['category'], row['name'])
+            _indexes[user_id] = index
+            stats['loads'] += 1
+            while len(_indexes) > CATEGORY_INDEX_USERS:
+                evicted, _ = _indexes.popitem(last=False)
+                _locks.pop(evicted, None)
+                _fuzzy.pop(evicted, None)
+    _locks.pop(user_id, None)
+    return index
+
+
+async def lookup(user_id: int | str, name: str) -> tuple[str, str] | None:
+    """
+    Возвращает (категория, подкатегория) для уже встречавшегося у пользователя
+    названия, иначе None. Ошибка БД считается промахом.
+    """
+    try:
+        index = await _get_index(int(user_id))
+    except Exception as e:
+        logger.warning(f"Category index unavailable for {user_id}: {e}")
+        return None
+    for key in _keys(name):
+        found = index.get(key)
+        if found is not None:
+            stats['hits'] += 1
+            return found
+    stats['misses'] += 1
+    return None
+
+
+def _get_fuzzy(user_id: int, index: dict) -> tuple[TrigramIndex, TrigramIndex]:
+    fuzzy = _fuzzy.get(user_id)
+    if fuzzy is None:
+        subs = TrigramIndex(key for key in index if not key.startswith('~'))
+        cats = TrigramIndex({normalize(category) for category, _ in index.values()})
+        fuzzy = _fuzzy[user_id] = (subs, cats)
+    return fuzzy
+
+
+def _match(trigrams: TrigramIndex, text: str) -> tuple[str | None, float]:
+    """
+    Нечёткий поиск, который не «исправляет» настоящие слова: встроенная категория
+    во вводе должна остаться в найденном названии как есть.
+    """
+    threshold = FUZZY_SHORT_MIN_CONFIDENCE if len(text) <= _SHORT_WORD else FUZZY_MIN_CONFIDENCE
+    name, confidence = trigrams.match(text, threshold)
+    if name is not None:
+        valid = [w for w in text.split() if w in BUILTIN_CATEGORIES]
+        if any(w not in name.split() for w in valid):
+            return None, 0.0
+    return name, confidence
+
+
+async def correct(user_id: int | str, words: list[str]) -> tuple[str, str, float] | None:
+    """
+    Нечёткое сопоставление слов ввода (без цены) со справочником пользователя:
+    "малако" → молоко, "прадукты малако" → продукты|молоко.
+    Возвращает (категория, подкатегория, уверенность) или None,
+    если уверенность ниже FUZZY_MIN_CONFIDENCE (FUZZY_SHORT_MIN_CONFIDENCE для коротких слов).
+    """
+    try:
+        uid = int(user_id)
+        index = await _get_index(uid)
+    except Exception as e:
+        logger.warning(f"Category index unavailable for {user_id}: {e}")
+        return None
+    subs, cats = _get_fuzzy(uid, index)
+
+    name, confidence = _match(subs, " ".join(words))
+    if name is None and len(words) > 1:
+        # "категория подкатегория": обе части должны найтись и совпасть со справочником
+        category, cat_conf = _match(cats, words[0])
+        name, confidence = _match(subs, " ".join(words[1:]))
+        if category is None or name is None or normalize(index[name][0]) != category:
+            return None
+        confidence = min(confidence, cat_conf)
+    if name is None:
+        return None
+    stats['fuzzy_hits'] += 1
+    return index[name][0], index[name][1], confidence
+
+
+def add(user_id: int | str, category: str, subcategory: str) -> None:
+    """Новая пара из save_expense; индекс ещё не загруженного пользователя не трогаем"""
+    uid = int(user_id)
+    index = _indexes.get(uid)
+    if index is not None and category and subcategory:
+        _add(index, category, subcategory)
+        fuzzy = _fuzzy.get(uid)
+        if fuzzy is not None:
+            fuzzy[0].add(normalize(subcategory))
+            fuzzy[1].add(normalize(category))
+
+
+def rename_category(user_id: int | str, old_name: str, new_name: str) -> None:
+    uid = int(user_id)
+    index = _indexes.get(uid)
+    if index is None:
+        return
+    for key, (category, subcategory) in index.items():
+        if category == old_name:
+            index[key] = (new_name, subcategory)
+    fuzzy = _fuzzy.get(uid)
+    if fuzzy is not None:
+        fuzzy[1].remove(normalize(old_name))
+        fuzzy[1].add(normalize(new_name))
+
+
+def rename_subcategory(user_id: int | str, category_name: str, old_name: str, new_name: str) -> None:
+    uid = int(user_id)
+    index = _indexes.get(uid)
+    if index is None:
+        return
+    for key in _keys(old_name):
+        if index.get(key) == (category_name, old_name):
+            del index[key]
+    _add(index, category_name, new_name)
+    fuzzy = _fuzzy.get(uid)
+    if fuzzy is not None:
+        if normalize(old_name) not in index:
+            fuzzy[0].remove(normalize(old_name))
+        fuzzy[0].add(normalize(new_name))
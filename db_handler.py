@@ -7,6 +7,8 @@ from datetime import datetime
 from dotenv import load_dotenv
 from typing import Optional, Dict, Any
 
+import category_index
+
 # Загружаем DATABASE_URL из .env
 load_dotenv()
 
@@ -78,6 +80,8 @@ async def save_expense(
             VALUES ($1, $2, $3, $4, $5);
         """, user_id, category, subcategory, price, ts)
 
+    category_index.add(user_id, category, subcategory)
+
 async def save_expenses_ph(
     user_id: int,
     chat_id: int,
@@ -97,7 +101,8 @@ async def save_expenses_ph(
     pool = await _get_pool()
     ts = datetime.now(pytz.timezone("Europe/Moscow")).replace(tzinfo=None, microsecond=0)
 
-    async with pool.acquire() as conn:
+    # Весь чек (или альбом чеков) — одна транзакция: либо все позиции, либо ни одной
+    async with pool.acquire() as conn, conn.transaction():
         # 1) Пользователь
         await conn.execute(
             """
@@ -149,6 +154,9 @@ async def save_expenses_ph(
                 user_id, category, name, price, ts
             )
 
+    for category, name, _ in items:
+        category_index.add(user_id, category, name)
+
 # старая процедура ниже (убрал с использования)
 async def update_last_field(
     user_id: int,
@@ -285,6 +293,41 @@ async def get_user_categories(user_id: int) -> list[asyncpg.Record]:
     return rows
 
 
+async def get_user_subcategories(user_id: int) -> list[asyncpg.Record]:
+    """
+    Возвращает все подкатегории пользователя с названием их категории.
+    Каждая запись содержит поля name и category, порядок — по id подкатегории.
+    """
+    pool = await _get_pool()
+    async with pool.acquire() as conn:
+        rows = await conn.fetch("""
+            SELECT s.name, c.name AS category
+            FROM subcategories s
+            JOIN categories c ON c.id = s.category_id
+            WHERE s.user_id = $1
+            ORDER BY s.id;
+        """, user_id)
+    return rows
+
+
+async def get_categorized_subcategories(after_id: int = 0) -> list[asyncpg.Record]:
+    """
+    Возвращает подкатегории всех пользователей с названием категории,
+    у которых id больше after_id (для дообучения классификатора позиций).
+    Каждая запись содержит поля id, name и category.
+    """
+    pool = await _get_pool()
+    async with pool.acquire() as conn:
+        rows = await conn.fetch("""
+            SELECT s.id, s.name, c.name AS category
+            FROM subcategories s
+            JOIN categories c ON c.id = s.category_id
+            WHERE s.id > $1
+            ORDER BY s.id;
+        """, after_id)
+    return rows
+
+
 # Получить доходы пользователя за последние N дней
 from datetime import timedelta
 
@@ -406,16 +449,22 @@ async def update_dictionary(
             return False
             
         if dict_type == 'category':
-            return await conn.fetchval(
+            ok = await conn.fetchval(
                 "SELECT update_category($1::bigint, $2::text, $3::text);",
                 user_id_int, old_name, new_name
             )
+            if ok:
+                category_index.rename_category(user_id_int, old_name, new_name)
+            return ok
         elif dict_type == 'subcategory':
             if not category_name:
                 raise ValueError("Для подкатегории требуется указать категорию")
-            return await conn.fetchval(
+            ok = await conn.fetchval(
                 "SELECT update_subcategory($1::bigint, $2::text, $3::text, $4::text);",
                 user_id_int, category_name, old_name, new_name
             )
+            if ok:
+                category_index.rename_subcategory(user_id_int, category_name, old_name, new_name)
+            return ok
         else:
             raise ValueError(f"Неподдерживаемый тип справочника: {dict_type}")
\ No newline at end of file
@@ -0,0 +1,245 @@
+# fast_parse.py
+import os
+import re
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Ниже этого порога результат быстрого разбора не используется и ввод уходит в LLM
+FAST_PARSE_MIN_CONFIDENCE = float(os.getenv('FAST_PARSE_MIN_CONFIDENCE', '0.8'))
+
+# Категории, которые можно принять без проверки LLM
+BUILTIN_CATEGORIES = {
+    'еда', 'продукты', 'транспорт', 'развлечения', 'быт', 'одежда', 'обувь',
+    'здоровье', 'аптека', 'лекарства', 'связь', 'интернет', 'дом', 'ремонт',
+    'кафе', 'ресторан', 'рестораны', 'подарки', 'образование', 'спорт',
+    'красота', 'дети', 'животные', 'путешествия', 'услуги', 'техника',
+    'коммуналка', 'жкх', 'налоги', 'авто', 'машина', 'бензин', 'такси',
+    'хобби', 'книги', 'подписки', 'кредит', 'разное', 'прочее',
+}
+
+# ---------- Числительные ----------
+
+_UNITS = {
+    'ноль': 0, 'один': 1, 'одна': 1, 'одну': 1, 'два': 2, 'две': 2, 'три': 3,
+    'четыре': 4, 'пять': 5, 'шесть': 6, 'семь': 7, 'восемь': 8, 'девять': 9,
+    'десять': 10, 'одиннадцать': 11, 'двенадцать': 12, 'тринадцать': 13,
+    'четырнадцать': 14, 'пятнадцать': 15, 'шестнадцать': 16, 'семнадцать': 17,
+    'восемнадцать': 18, 'девятнадцать': 19,
+    'двадцать': 20, 'тридцать': 30, 'сорок': 40, 'пятьдесят': 50,
+    'шестьдесят': 60, 'семьдесят': 70, 'восемьдесят': 80, 'девяносто': 90,
+    'сто': 100, 'двести': 200, 'триста': 300, 'четыреста': 400, 'пятьсот': 500,
+    'шестьсот': 600, 'семьсот': 700, 'восемьсот': 800, 'девятьсот': 900,
+    'полтора': 1.5, 'полторы': 1.5,
+    # Разговорные
+    'полтинник': 50, 'сотка': 100, 'сотку': 100, 'сотня': 100, 'сотню': 100,
+    'стольник': 100, 'пятихатка': 500, 'пятихатку': 500,
+}
+_THOUSANDS = {
+    'тысяча', 'тысячи', 'тысяч', 'тысячу', 'тыща', 'тыщи', 'тыщ', 'тыщу', 'тыс',
+    'штука', 'штуку', 'штуки', 'штук', 'косарь', 'косаря', 'косарей', 'к', 'k',
+}
+# "штуки" — и тысячи рублей ("две штуки"), и количество ("хлеб 2 штуки"): такую цену
+# подтверждает LLM
+_AMBIGUOUS_THOUSANDS = {'штука', 'штуку', 'штуки', 'штук'}
+_CURRENCY = {'р', 'руб', 'рубль', 'рубля', 'рублей', 'рубли', '₽', 'rub'}
+
+_NUMERAL_WORDS = sorted(set(_UNITS) | (_THOUSANDS - {'к', 'k'}), key=len, reverse=True)
+
+# 80, 1.5, 1,5, 80р, 80руб, 1500₽, 2к, 1.5к, 3тыс
+_DIGITS_RE = re.compile(
+    r'^(\d+(?:[.,]\d+)?)(к|k|тыс|тысяч[аи]?|тыщ[аи]?)?(р|руб|рубл[ейяи]+|₽)?$'
+)
+
+
+def _split_glued(token: str) -> list[str] | None:
+    """
+    Разбивает слитное числительное ("тыщапятьсот", "двестипятьдесят") на слова.
+    Возвращает None, если токен целиком не состоит из числительных.
+    """
+    best: list[list[str] | None] = [None] * (len(token) + 1)
+    best[0] = []
+    for i in range(len(token)):
+        if best[i] is None:
+            continue
+        for word in _NUMERAL_WORDS:
+            if token.startswith(word, i) and best[i + len(word)] is None:
+                best[i + len(word)] = best[i] + [word]
+    return best[-1]
+
+
+def _numeral_value(words: list[str]) -> float | None:
+    """Значение последовательности числительных: "полторы тысячи" → 1500"""
+    total = 0.0
+    current = 0.0
+    for w in words:
+        if w in _THOUSANDS:
+            total += (current or 1) * 1000
+            current = 0
+        elif w in _UNITS:
+            current += _UNITS[w]
+        else:
+            return None
+    return total + current
+
+
+def _tokenize(raw: str) -> list[str]:
+    text = raw.lower().replace('ё', 'е')
+    # Знаки убираем, но оставляем десятичный разделитель между цифрами и ₽
+    text = re.sub(r'(?<=\d)[.,](?=\d)', '.', text)
+    text = re.sub(r'[^\w.₽]+', ' ', text)
+    text = re.sub(r'(?<!\d)\.|\.(?!\d)', ' ', text)
+    return text.split()
+
+
+def _price_token(token: str) -> tuple[str, float | None] | None:
+    """
+    Классифицирует токен цены.
+    Возвращает ('num', значение), ('word', значение или None для множителя),
+    либо None, если это не часть цены.
+    """
+    m = _DIGITS_RE.match(token)
+    if m:
+        value = float(m.group(1).replace(',', '.'))
+        if m.group(2):
+            value *= 1000
+        return 'num', value
+    if token in _THOUSANDS and token not in ('к', 'k'):
+        return 'word', None
+    if token in _UNITS:
+        return 'word', _UNITS[token]
+    return None
+
+
+def _format_price(value: float) -> str:
+    return str(int(value)) if value == int(value) else f"{value:.2f}".rstrip('0').rstrip('.')
+
+
+def _split(raw_input: str) -> tuple[list[str], list[list[tuple[str, float | None, str]]]]:
+    """Делит ввод на слова и группы подряд идущих токенов цены"""
+    tokens = _tokenize(raw_input)
+
+    # Раскрываем слитные числительные
+    expanded = []
+    for tok in tokens:
+        if _price_token(tok) is None and len(tok) > 5:
+            parts = _split_glued(tok)
+            if parts and len(parts) > 1:
+                expanded.extend(parts)
+                continue
+        expanded.append(tok)
+
+    words: list[str] = []
+    runs: list[list[tuple[str, float | None, str]]] = []
+    prev_is_price = False
+    for tok in expanded:
+        if tok in _CURRENCY:
+            prev_is_price = False
+            continue
+        kind = _price_token(tok)
+        # "к" само по себе — множитель только сразу после числа
+        if kind is None and tok in ('к', 'k') and prev_is_price:
+            kind = ('word', None)
+        if kind is None:
+            words.append(tok)
+            prev_is_price = False
+            continue
+        if not prev_is_price:
+            runs.append([])
+        runs[-1].append((kind[0], kind[1], tok))
+        prev_is_price = True
+    return words, runs
+
+
+def split_price(raw_input: str) -> tuple[list[str], str | None]:
+    """
+    Возвращает нормализованные слова ввода (без цены и валюты) и цену,
+    если она в вводе ровно одна, иначе (слова, None).
+    """
+    words, runs = _split(raw_input)
+    if len(runs) != 1 or _ambiguous(runs[0]):
+        return words, None
+    price = _run_value(runs[0])
+    if price is None or price <= 0:
+        return words, None
+    return words, _format_price(price)
+
+
+def parse_fast(raw_input: str, categories: set[str] | None = None) -> tuple:
+    """
+    Локальный разбор ввода "категория подкатегория цена" без обращения к LLM.
+    Понимает цену цифрами ("80", "80 р", "1.5к") и словами ("восемьдесят",
+    "полторы тысячи", "тыщапятьсот").
+
+    Параметры:
+        raw_input (str): Сырая строка
+        categories (set): Дополнительные известные категории (например, из справочника пользователя)
+
+    Возвращает:
+        tuple: (категория, подкатегория, цена, уверенность 0..1);
+               при неудаче (None, None, None, 0.0)
+    """
+    known = BUILTIN_CATEGORIES | (categories or set())
+    words, runs = _split(raw_input)
+
+    if not runs or not words:
+        return None, None, None, 0.0
+
+    price = _run_value(runs[0])
+    if price is None or price <= 0:
+        return None, None, None, 0.0
+
+    # Две отдельные цены — неоднозначно
+    confidence = 0.3 if len(runs) > 1 else 1.0
+    if _ambiguous(runs[0]):
+        confidence *= 0.5
+
+    if len(words) == 2 and words[0] in known:
+        confidence *= 0.95
+        category, subcategory = words
+    elif len(words) > 2 and words[0] in known:
+        # Многословную подкатегорию LLM приводит к нормальной форме лучше
+        confidence *= 0.7
+        category, subcategory = words[0], " ".join(words[1:])
+    elif len(words) == 2 and words[1] in known:
+        confidence *= 0.5
+        subcategory, category = words
+    else:
+        confidence *= 0.3
+        category, subcategory = (words[0], " ".join(words[1:])) if len(words) > 1 else (None, words[0])
+
+    return category, subcategory, _format_price(price), confidence
+
+
+def _ambiguous(run: list[tuple[str, float | None, str]]) -> bool:
+    """
+    Цена, которую подтверждает LLM: "штуки" или число из групп через пробел —
+    "1 500" может быть и тысячами, и количеством с ценой ("яйца 10 120")
+    """
+    return (any(tok in _AMBIGUOUS_THOUSANDS for _, _, tok in run)
+            or any(a[0] == 'num' and b[0] == 'num' for a, b in zip(run, run[1:])))
+
+
+def _run_value(run: list[tuple[str, float | None, str]]) -> float | None:
+    """Значение цены из подряд идущих токенов: "1 500", "2 тысячи", "полторы тысячи" """
+    if all(kind == 'word' for kind, _, _ in run):
+        return _numeral_value([tok for _, _, tok in run])
+
+    value = 0.0
+    for i, (kind, v, tok) in enumerate(run):
+        if kind == 'num':
+            # "1 500": тысячи, записанные через пробел; перед группой — целое из 1–3 цифр
+            # ("0.5 120" — объём и цена, а не 620)
+            prev = run[i - 1][2] if i > 0 else ''
+            if (i > 0 and run[i - 1][0] == 'num' and prev.isdigit() and len(prev) <= 3
+                    and not prev.startswith('0') and len(tok) == 3 and tok.isdigit()):
+                value = value * 1000 + v
+            elif i == 0:
+                value = v
+            else:
+                return None
+        elif v is None:  # множитель "тысяч", "к"
+            value *= 1000
+        else:
+            return None
+    return value
@@ -85,6 +85,10 @@ async def handle_correction(field: str, new_val: str, message: Message):
             ok = await update_last_purchase_field(user_id_str, field, new_val)
         
         if ok:
+            if field in ('category', 'subcategory'):
+                # Дальше такой же ввод разбирается для пользователя с исправлением
+                from parse_cache import remember_correction
+                remember_correction(user_id_str, field, new_val, last_purchase)
             await message.answer("✅ Поле обновлено.")
         else:
             await message.answer("⚠️ Нет предыдущей записи для обновления.")
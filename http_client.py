@@ -0,0 +1,92 @@
+# http_client.py
+import random
+import asyncio
+import logging
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+
+class RequestError(Exception):
+    """Ошибка HTTP-запроса к внешнему сервису; retryable=True — имеет смысл повторить"""
+
+    def __init__(self, message: str, retryable: bool = False, retry_after: str | None = None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+class RetryingClient:
+    """
+    Общая сессия aiohttp с keep-alive пулом соединений, ограничение одновременных
+    запросов и повторы с экспоненциальной паузой. Ошибки выбрасываются классом
+    error (наследник RequestError), чтобы вызывающие ловили ошибку своего сервиса.
+    """
+
+    def __init__(self, error: type[RequestError], max_concurrency: int,
+                 backoff_base: float, backoff_max: float, headers: dict | None = None):
+        self.error = error
+        self.max_concurrency = max_concurrency
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.headers = headers
+        self._session: aiohttp.ClientSession | None = None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    def session(self) -> aiohttp.ClientSession:
+        """Сессия создаётся при первом запросе"""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_concurrency, keepalive_timeout=60),
+                headers=self.headers
+            )
+        return self._session
+
+    async def close(self) -> None:
+        """Закрывает пул соединений (при остановке бота)"""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def backoff(self, attempt: int, retry_after: str | None = None) -> float:
+        """Экспоненциальная пауза с полным джиттером; Retry-After сервиса важнее"""
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    async def post_json(self, url: str, timeout: float, **kwargs):
+        """
+        POST и разобранный JSON ответа. 429/5xx и сетевые ошибки — retryable,
+        прочие 4xx — нет.
+        """
+        async with self._semaphore:
+            try:
+                async with self.session().post(
+                    url, timeout=aiohttp.ClientTimeout(total=timeout), **kwargs
+                ) as resp:
+                    if resp.status == 429 or resp.status >= 500:
+                        raise self.error(f"HTTP {resp.status}", retryable=True,
+                                         retry_after=resp.headers.get('Retry-After'))
+                    if resp.status >= 400:
+                        raise self.error(f"HTTP {resp.status}: {await resp.text()}")
+                    return await resp.json(content_type=None)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                raise self.error(f"{type(e).__name__}: {e}", retryable=True) from e
+
+    async def retry(self, call, max_retries: int, label: str):
+        """
+        Вызывает call() и повторяет при retryable-ошибке не больше max_retries раз.
+        Последняя ошибка выбрасывается дальше.
+        """
+        for attempt in range(max_retries + 1):
+            try:
+                return await call()
+            except RequestError as e:
+                if not e.retryable or attempt == max_retries:
+                    raise
+                delay = self.backoff(attempt, e.retry_after)
+                logger.warning(f"{label} attempt {attempt + 1} failed: {e}; retry in {delay:.1f}s")
+                await asyncio.sleep(delay)
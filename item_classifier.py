@@ -0,0 +1,192 @@
+# item_classifier.py
+import os
+import json
+import zlib
+import asyncio
+import logging
+import numpy as np
+from dotenv import load_dotenv
+
+from item_names import normalize
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Папка с файлами индекса (центроиды читаются через mmap и общие для всех процессов)
+ITEM_CLASSIFIER_PATH = os.getenv('ITEM_CLASSIFIER_PATH', 'data/item_classifier')
+# Размерность хешированного пространства n-грамм
+ITEM_CLASSIFIER_DIM = int(os.getenv('ITEM_CLASSIFIER_DIM', str(2 ** 14)))
+# Ниже этой уверенности позиция уходит в LLM
+ITEM_CLASSIFIER_MIN_CONFIDENCE = float(os.getenv('ITEM_CLASSIFIER_MIN_CONFIDENCE', '0.7'))
+# Категории с меньшим числом примеров не предсказываются
+ITEM_CLASSIFIER_MIN_EXAMPLES = int(os.getenv('ITEM_CLASSIFIER_MIN_EXAMPLES', '3'))
+# Как часто дочитывать новые подкатегории из БД, с
+ITEM_CLASSIFIER_REFRESH = int(os.getenv('ITEM_CLASSIFIER_REFRESH', '3600'))
+
+_NGRAMS = (3, 4)
+# Температура softmax по косинусам: чем меньше, тем резче уверенность
+_TEMPERATURE = 0.05
+# Строк за один шаг дообучения
+_ADD_BATCH = 1000
+
+# Состояние индекса: суммы векторов по категориям (для дообучения),
+# нормированные центроиды (mmap) и отметка последнего учтённого subcategories.id
+_categories: list[str] = []
+_counts: np.ndarray = np.zeros(0, dtype=np.int64)
+_sums: np.ndarray | None = None
+_centroids: np.ndarray | None = None
+_last_id = 0
+
+
+def _features(name: str) -> tuple[list[int], list[float]]:
+    """Хешированные символьные n-граммы названия: индексы и знаки"""
+    text = f" {normalize(name)} "
+    idx, signs = [], []
+    for n in _NGRAMS:
+        for i in range(len(text) - n + 1):
+            h = zlib.crc32(text[i:i + n].encode('utf-8'))
+            idx.append(h % ITEM_CLASSIFIER_DIM)
+            signs.append(1.0 if h & 0x80000000 else -1.0)
+    return idx, signs
+
+
+def vectorize(names: list[str]) -> np.ndarray:
+    """Матрица (len(names), DIM) L2-нормированных векторов"""
+    rows, cols, vals = [], [], []
+    for row, name in enumerate(names):
+        idx, signs = _features(name)
+        rows.extend([row] * len(idx))
+        cols.extend(idx)
+        vals.extend(signs)
+    X = np.zeros((len(names), ITEM_CLASSIFIER_DIM), dtype=np.float32)
+    np.add.at(X, (np.array(rows, dtype=np.intp), np.array(cols, dtype=np.intp)), np.array(vals, dtype=np.float32))
+    norms = np.linalg.norm(X, axis=1, keepdims=True)
+    np.divide(X, norms, out=X, where=norms > 0)
+    return X
+
+
+def _paths() -> dict[str, str]:
+    return {
+        'meta': os.path.join(ITEM_CLASSIFIER_PATH, 'meta.json'),
+        'sums': os.path.join(ITEM_CLASSIFIER_PATH, 'sums.npy'),
+        'centroids': os.path.join(ITEM_CLASSIFIER_PATH, 'centroids.npy'),
+    }
+
+
+def load() -> bool:
+    """Подхватывает индекс с диска; центроиды отображаются в память только для чтения"""
+    global _categories, _counts, _sums, _centroids, _last_id
+    paths = _paths()
+    if not os.path.exists(paths['meta']):
+        return False
+    with open(paths['meta'], encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta['dim'] != ITEM_CLASSIFIER_DIM:
+        logger.warning(f"Item classifier dim changed ({meta['dim']} → {ITEM_CLASSIFIER_DIM}), rebuilding")
+        return False
+    _categories = meta['categories']
+    _counts = np.array(meta['counts'], dtype=np.int64)
+    _last_id = meta['last_id']
+    _sums = None  # суммы нужны только при дообучении, читаются лениво
+    _centroids = np.load(paths['centroids'], mmap_mode='r')
+    return True
+
+
+def add(rows: list[tuple[str, str]], last_id: int | None = None) -> None:
+    """Дообучение: добавляет пары (категория, название) к суммам категорий"""
+    global _categories, _counts, _sums, _last_id
+    if _sums is None:
+        path = _paths()['sums']
+        _sums = (np.load(path) if _categories and os.path.exists(path)
+                 else np.zeros((len(_categories), ITEM_CLASSIFIER_DIM), dtype=np.float32))
+    rows = [(c.strip().lower(), n) for c, n in rows if c and n and c.strip().lower() not in {'none', '-'}]
+    positions = {c: i for i, c in enumerate(_categories)}
+    new = [c for c in dict.fromkeys(c for c, _ in rows) if c not in positions]
+    if new:
+        _categories = _categories + new
+        base = len(positions)
+        positions.update((c, base + i) for i, c in enumerate(new))
+        _counts = np.concatenate([_counts, np.zeros(len(new), dtype=np.int64)])
+        _sums = np.vstack([_sums, np.zeros((len(new), ITEM_CLASSIFIER_DIM), dtype=np.float32)])
+    # Порциями: плотная матрица на всю выгрузку из БД не поместится в память
+    for start in range(0, len(rows), _ADD_BATCH):
+        part = rows[start:start + _ADD_BATCH]
+        X = vectorize([n for _, n in part])
+        cat_idx = np.array([positions[c] for c, _ in part])
+        np.add.at(_sums, cat_idx, X)
+        np.add.at(_counts, cat_idx, 1)
+    if last_id is not None:
+        _last_id = max(_last_id, last_id)
+
+
+def save() -> None:
+    """Пишет индекс на диск атомарно и переоткрывает центроиды через mmap"""
+    global _centroids
+    if _sums is None:
+        return
+    paths = _paths()
+    os.makedirs(ITEM_CLASSIFIER_PATH, exist_ok=True)
+    norms = np.linalg.norm(_sums, axis=1, keepdims=True)
+    centroids = np.divide(_sums, norms, out=np.zeros_like(_sums), where=norms > 0)
+    # Редкие категории не участвуют в предсказании
+    centroids[_counts < ITEM_CLASSIFIER_MIN_EXAMPLES] = 0
+
+    for key, array in (('sums', _sums), ('centroids', centroids)):
+        tmp = paths[key] + '.tmp.npy'
+        np.save(tmp, array)
+        os.replace(tmp, paths[key])
+    tmp = paths['meta'] + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({'dim': ITEM_CLASSIFIER_DIM, 'categories': _categories,
+                   'counts': _counts.tolist(), 'last_id': _last_id}, f, ensure_ascii=False)
+    os.replace(tmp, paths['meta'])
+    _centroids = np.load(paths['centroids'], mmap_mode='r')
+
+
+def classify(names: list[str]) -> list[tuple[str | None, float]]:
+    """
+    Категория и уверенность 0..1 для каждого названия.
+    Все названия сравниваются со всеми центроидами одним умножением матриц.
+    """
+    if _centroids is None or not len(_categories) or not names:
+        return [(None, 0.0)] * len(names)
+    scores = vectorize(names) @ np.asarray(_centroids).T
+    # softmax по косинусам — доля «голосов» лучшей категории
+    z = (scores - scores.max(axis=1, keepdims=True)) / _TEMPERATURE
+    probs = np.exp(z)
+    probs /= probs.sum(axis=1, keepdims=True)
+    best = probs.argmax(axis=1)
+    return [
+        (_categories[b], float(probs[i, b])) if scores[i, b] > 0 else (None, 0.0)
+        for i, b in enumerate(best)
+    ]
+
+
+def _rebuild(rows: list) -> None:
+    add([(row['category'], row['name']) for row in rows], max(row['id'] for row in rows))
+    save()
+
+
+async def refresh() -> None:
+    """
+    Загружает индекс с диска и дочитывает из БД подкатегории, добавленные после него.
+    Векторизация и запись идут в потоке: на выгрузке из БД это секунды работы numpy,
+    а classify в это время читает прежние центроиды.
+    """
+    from db_handler import get_categorized_subcategories
+    if _centroids is None and not await asyncio.to_thread(load):
+        logger.info("Item classifier index not found, building from subcategories")
+    rows = await get_categorized_subcategories(_last_id)
+    if rows:
+        await asyncio.to_thread(_rebuild, rows)
+        logger.info(f"Item classifier: +{len(rows)} items, {len(_categories)} categories")
+
+
+async def refresh_forever() -> None:
+    """Фоновое дообучение раз в ITEM_CLASSIFIER_REFRESH секунд"""
+    while True:
+        try:
+            await refresh()
+        except Exception as e:
+            logger.warning(f"Item classifier refresh failed: {e}")
+        await asyncio.sleep(ITEM_CLASSIFIER_REFRESH)
@@ -0,0 +1,21 @@
+# item_names.py
+import re
+
+# Объёмы, веса, проценты, штуки: "930мл", "3,2%", "1.5 кг", "10шт"
+_UNITS_RE = re.compile(
+    r'\d+(?:[.,]\d+)?\s*(?:мл|л|лит|гр|г|кг|мг|шт|уп|пак|м|см|мм|%|ml|l|g|kg|pcs)?(?![а-яa-z])'
+)
+# Артикулы и коды: "арт.12345", "#4607001", "sku123", "a12b"
+_SKU_RE = re.compile(r'(?:арт|art|sku|код)\.?\s*\S+|#\S+|\b\w*\d\w*\b')
+
+
+def normalize(name: str) -> str:
+    """
+    Название товара без объёмов, процентов, артикулов и знаков:
+    "Молоко ПРОСТОКВАШИНО 3,2% 930мл" → "молоко простоквашино"
+    """
+    text = name.lower().replace('ё', 'е')
+    text = _UNITS_RE.sub(' ', text)
+    text = _SKU_RE.sub(' ', text)
+    text = re.sub(r'[^\w]+|_', ' ', text)
+    return " ".join(w for w in text.split() if len(w) > 1)
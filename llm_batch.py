@@ -0,0 +1,87 @@
+# llm_batch.py
+import os
+import asyncio
+import logging
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Окно сбора запросов в пачку, мс (0 — без пачек, каждый запрос отдельно)
+LLM_BATCH_WINDOW_MS = float(os.getenv('LLM_BATCH_WINDOW_MS', '0'))
+# Максимум запросов в одной пачке
+LLM_BATCH_MAX = int(os.getenv('LLM_BATCH_MAX', '8'))
+
+
+class MicroBatcher:
+    """
+    Собирает независимые запросы за короткое окно и отправляет их одним вызовом.
+
+    run_single(item) — обработка одного запроса;
+    run_batch(items) — обработка пачки, возвращает список результатов по порядку,
+    где None означает, что ответ для этого элемента не разобрался: такой элемент
+    повторяется через run_single.
+    """
+
+    def __init__(self, run_single, run_batch,
+                 window_ms: float = LLM_BATCH_WINDOW_MS, max_size: int = LLM_BATCH_MAX):
+        self.run_single = run_single
+        self.run_batch = run_batch
+        self.window = window_ms / 1000
+        self.max_size = max_size
+        self._pending: list[tuple[object, asyncio.Future]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    async def submit(self, item):
+        """Ставит запрос в текущую пачку и ждёт его результат"""
+        if self.window <= 0 or self.max_size <= 1:
+            return await self.run_single(item)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: list[tuple[object, asyncio.Future]]) -> None:
+        items = [item for item, _ in batch]
+        results = [None] * len(items)
+        if len(items) > 1:
+            try:
+                results = list(await self.run_batch(items))
+                if len(results) != len(items):
+                    raise ValueError(f"{len(results)} results for {len(items)} items")
+            except Exception as e:
+                logger.warning(f"LLM batch of {len(items)} failed, falling back to single calls: {e}")
+                results = [None] * len(items)
+            else:
+                failed = sum(r is None for r in results)
+                if failed:
+                    logger.info(f"LLM batch of {len(items)}: {failed} items retried one by one")
+
+        async def settle(i: int):
+            item, future = batch[i]
+            try:
+                result = results[i] if results[i] is not None else await self.run_single(item)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+                return
+            if not future.done():
+                future.set_result(result)
+
+        await asyncio.gather(*(settle(i) for i in range(len(batch))))
@@ -0,0 +1,95 @@
+# llm_client.py
+import os
+import logging
+from dotenv import load_dotenv
+
+from http_client import RequestError, RetryingClient
+
+# Настройки OpenRouter
+load_dotenv()
+OPENROUTER_API_KEY = os.getenv('OPENROUTER_API_KEY')
+# Можно направить на локальную заглушку (bench/openrouter_stub.py)
+OPENROUTER_API_BASE = os.getenv('OPENROUTER_API_BASE', 'https://openrouter.ai/api/v1')
+LLM_MODEL = 'deepseek/deepseek-chat-v3-0324:free'
+# Запасные модели (через запятую): пробуются по порядку, если основная недоступна
+LLM_FALLBACK_MODELS = [m.strip() for m in os.getenv('LLM_FALLBACK_MODELS', '').split(',') if m.strip()]
+
+# Таймаут одного запроса, с
+LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', '20'))
+# Одновременных запросов к провайдеру (и размер пула соединений)
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '16'))
+# Повторов на модель при 429/5xx/сетевых ошибках
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '3'))
+# Базовая и максимальная пауза между повторами, с
+LLM_BACKOFF_BASE = float(os.getenv('LLM_BACKOFF_BASE', '0.5'))
+LLM_BACKOFF_MAX = float(os.getenv('LLM_BACKOFF_MAX', '8'))
+
+logger = logging.getLogger(__name__)
+
+
+class LLMError(RequestError):
+    """Ошибка запроса к LLM; retryable=True — имеет смысл повторить"""
+
+
+_client = RetryingClient(
+    LLMError, LLM_MAX_CONCURRENCY, LLM_BACKOFF_BASE, LLM_BACKOFF_MAX,
+    headers={
+        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
+        "HTTP-Referer": "https://ai5.space",
+        "X-Title": "Counter"
+    }
+)
+
+
+async def close() -> None:
+    """Закрывает пул соединений (при остановке бота)"""
+    await _client.close()
+
+
+async def _request(model: str, messages: list[dict], max_tokens: int,
+                   temperature: float, timeout: float) -> str:
+    payload = {
+        "model": model,
+        "messages": messages,
+        "max_tokens": max_tokens,
+        "temperature": temperature,
+    }
+    data = await _client.post_json(f"{OPENROUTER_API_BASE}/chat/completions", timeout, json=payload)
+
+    # OpenRouter иногда отвечает 200 с ошибкой внутри
+    if 'error' in data:
+        raise LLMError(f"Ошибка провайдера: {data['error']}", retryable=True)
+    try:
+        return data['choices'][0]['message']['content'].strip()
+    except (KeyError, IndexError, TypeError):
+        raise LLMError(f"Неожиданный ответ: {data}", retryable=True)
+
+
+async def chat_completion(
+    prompt: str,
+    max_tokens: int = 50,
+    temperature: float = 0.1,
+    timeout: float | None = None
+) -> str:
+    """
+    Отправляет промпт в LLM и возвращает текст ответа.
+    При 429/5xx/таймауте повторяет запрос с паузой, затем переходит
+    к следующей модели из LLM_FALLBACK_MODELS.
+
+    Исключения:
+        LLMError: ни одна модель не ответила
+    """
+    messages = [{"role": "user", "content": prompt}]
+    last_error = LLMError("Нет доступных моделей")
+
+    for model in [LLM_MODEL] + LLM_FALLBACK_MODELS:
+        try:
+            return await _client.retry(
+                lambda: _request(model, messages, max_tokens, temperature, timeout or LLM_TIMEOUT),
+                LLM_MAX_RETRIES, f"LLM {model}"
+            )
+        except LLMError as e:
+            last_error = e
+        logger.warning(f"LLM {model} unavailable: {last_error}")
+
+    raise last_error
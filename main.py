@@ -5,20 +5,26 @@ from aiogram.exceptions import TelegramForbiddenError
 import asyncio
 import logging
 import os
+from logging.handlers import TimedRotatingFileHandler
 from dotenv import load_dotenv
 
 from text_handlers import handle_text_message
 from voice_handlers import handle_voice_message
-from photo_handlers import handle_photo_message
+from photo_handlers import handle_photo_message, deliver_receipt
 from start_handlers import on_start
+import transcribe_pool
+import llm_client
+import receipt_client
+import receipt_queue
+import receipt_ocr
+import item_classifier
 
 load_dotenv()
 API_TOKEN = os.getenv('API_TOKEN')
 
-bot = Bot(token=API_TOKEN)
-dp = Dispatcher()
+# Бот, диспетчер и логи создаются только в основном процессе: воркеры пулов
+# (spawn) импортируют этот модуль заново как __mp_main__
 
-@dp.message(CommandStart())
 async def start_handler(message):
     try:
         await on_start(message)
@@ -54,41 +60,56 @@ async def safe_photo_handler(message):
     except Exception as e:
         logging.error(f"Ошибка обработки фото: {e}")
 
-dp.message.register(safe_text_handler, F.text & ~F.voice & ~F.photo)
-dp.message.register(safe_voice_handler, F.voice)
-dp.message.register(safe_photo_handler, F.photo)
+def create_dispatcher() -> Dispatcher:
+    dp = Dispatcher()
+    dp.message.register(start_handler, CommandStart())
+    dp.message.register(safe_text_handler, F.text & ~F.voice & ~F.photo)
+    dp.message.register(safe_voice_handler, F.voice)
+    dp.message.register(safe_photo_handler, F.photo)
+    return dp
 
-from logging.handlers import TimedRotatingFileHandler
 
-# Убедиться, что папка logs существует
-os.makedirs("logs", exist_ok=True)
+def setup_logging() -> None:
+    # Убедиться, что папка logs существует
+    os.makedirs("logs", exist_ok=True)
 
-# Создаём логгер
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+    # Создаём логгер
+    logger = logging.getLogger()
+    logger.setLevel(logging.INFO)
 
-# Формат логов
-formatter = logging.Formatter("%(asctime)s [%(levelname)s] %(message)s")
+    # Формат логов
+    formatter = logging.Formatter("%(asctime)s [%(levelname)s] %(message)s")
 
-# Хендлер для файла в папке logs
-file_handler = TimedRotatingFileHandler(
-    "logs/bot.log",       # путь к лог-файлу
-    when="midnight",
-    interval=1,
-    backupCount=7,
-    encoding="utf-8"
-)
-file_handler.setFormatter(formatter)
+    # Хендлер для файла в папке logs
+    file_handler = TimedRotatingFileHandler(
+        "logs/bot.log",       # путь к лог-файлу
+        when="midnight",
+        interval=1,
+        backupCount=7,
+        encoding="utf-8"
+    )
+    file_handler.setFormatter(formatter)
 
-# Хендлер для консоли
-console_handler = logging.StreamHandler()
-console_handler.setFormatter(formatter)
+    # Хендлер для консоли
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(formatter)
 
-# Добавляем хендлеры к логгеру
-logger.addHandler(file_handler)
-logger.addHandler(console_handler)
+    # Добавляем хендлеры к логгеру
+    logger.addHandler(file_handler)
+    logger.addHandler(console_handler)
 
 async def main():
+    bot = Bot(token=API_TOKEN)
+    dp = create_dispatcher()
+    # Пул распознавания: воркеры загружают модели Whisper до начала приёма сообщений
+    logging.info("Запуск пула распознавания…")
+    await transcribe_pool.start()
+    # OCR чеков без QR: если движок не установлен, бот работает без него
+    await receipt_ocr.start()
+    # Классификатор позиций чека: индекс с диска + дообучение по новым подкатегориям
+    refresh_task = asyncio.create_task(item_classifier.refresh_forever())
+    # Отложенные проверки чеков (сервис проверки не ответил сразу)
+    receipt_task = asyncio.create_task(receipt_queue.run_forever(bot, deliver_receipt))
     logging.info("Запуск polling…")
     try:
         await dp.start_polling(bot)
@@ -96,8 +117,16 @@ async def main():
         logging.error(f"Бот заблокирован пользователем: {e}")
     except Exception as e:
         logging.exception("Критическая ошибка в polling")
+    finally:
+        refresh_task.cancel()
+        receipt_task.cancel()
+        transcribe_pool.shutdown()
+        receipt_ocr.shutdown()
+        await llm_client.close()
+        await receipt_client.close()
 
 if __name__ == "__main__":
+    setup_logging()
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
@@ -0,0 +1,60 @@
+# media_group.py
+import os
+import asyncio
+import logging
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Сколько ждать следующего фото альбома после последнего полученного, мс
+MEDIA_GROUP_WAIT_MS = float(os.getenv('MEDIA_GROUP_WAIT_MS', '1000'))
+# Больше фото в одном альбоме Telegram не бывает
+MEDIA_GROUP_MAX = int(os.getenv('MEDIA_GROUP_MAX', '10'))
+
+
+class MediaGroupCollector:
+    """
+    Собирает сообщения одного альбома (media_group_id), которые Telegram
+    присылает отдельными апдейтами, и передаёт их в process(messages) одним списком.
+    Альбом считается полным, когда новые фото не приходили MEDIA_GROUP_WAIT_MS
+    или набралось MEDIA_GROUP_MAX.
+    """
+
+    def __init__(self, process, wait_ms: float = MEDIA_GROUP_WAIT_MS, max_size: int = MEDIA_GROUP_MAX):
+        self.process = process
+        self.wait = wait_ms / 1000
+        self.max_size = max_size
+        self._groups: dict[str, list] = {}
+        self._timers: dict[str, asyncio.TimerHandle] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    def add(self, message) -> None:
+        """Добавляет фото в его альбом; обработчик апдейта сразу освобождается"""
+        key = f"{message.chat.id}:{message.media_group_id}"
+        group = self._groups.setdefault(key, [])
+        group.append(message)
+
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        if len(group) >= self.max_size:
+            self._flush(key)
+        else:
+            self._timers[key] = asyncio.get_running_loop().call_later(self.wait, self._flush, key)
+
+    def _flush(self, key: str) -> None:
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        messages = sorted(self._groups.pop(key, []), key=lambda m: m.message_id)
+        if messages:
+            task = asyncio.create_task(self._run(messages))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, messages: list) -> None:
+        try:
+            await self.process(messages)
+        except Exception as e:
+            logger.exception(f"Media group of {len(messages)} from user {messages[0].from_user.id} failed: {e}")
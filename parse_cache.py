@@ -0,0 +1,170 @@
+# parse_cache.py
+import os
+import json
+import time
+import logging
+from collections import OrderedDict
+import redis
+from dotenv import load_dotenv
+
+from fast_parse import split_price
+from handlers_common import r
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Размер in-memory LRU (записей) и TTL обоих уровней, с
+PARSE_CACHE_SIZE = int(os.getenv('PARSE_CACHE_SIZE', '4096'))
+PARSE_CACHE_TTL = int(os.getenv('PARSE_CACHE_TTL', str(30 * 24 * 3600)))
+# Второй уровень в Redis (общий для всех процессов бота)
+PARSE_CACHE_REDIS = os.getenv('PARSE_CACHE_REDIS', '1') == '1'
+# Сколько помнить промах Redis, чтобы повторный ввод не ходил туда снова, с
+PARSE_CACHE_MISS_TTL = int(os.getenv('PARSE_CACHE_MISS_TTL', '60'))
+
+# key -> (момент истечения, (категория, подкатегория) или None для промаха)
+_lru: "OrderedDict[str, tuple[float, tuple[str, str] | None]]" = OrderedDict()
+
+# user_id -> (ключ шаблона, категория, подкатегория) последнего разбора:
+# исправление записи привязывается к вводу, из которого эта запись получилась
+_last_keys: dict[str, tuple[str, str, str]] = {}
+
+# Счётчики попаданий и промахов
+stats = {'memory_hits': 0, 'redis_hits': 0, 'user_hits': 0, 'misses': 0}
+
+
+def make_key(kind: str, raw_input: str) -> tuple[str | None, str | None]:
+    """
+    Ключ шаблона ввода и цена из него.
+    Ввод приводится к нижнему регистру, знаки и валюта убираются, цена вырезается:
+    "Кофе, 250 р." и "кофе 180" дают один ключ. Без единственной цены — (None, None).
+    kind — вид ввода ('t' — текст, 'v' — голос): промпты у них разные.
+    """
+    words, price = split_price(raw_input)
+    if price is None or not words:
+        return None, None
+    return f"{kind}:{' '.join(words)}", price
+
+
+def _redis_key(key: str, user_id: str | None = None) -> str:
+    return f"parse:user:{user_id}:{key}" if user_id else f"parse:{key}"
+
+
+def _remember(key: str, value: tuple[str, str] | None, ttl: int = PARSE_CACHE_TTL) -> None:
+    _lru[key] = (time.monotonic() + ttl, value)
+    _lru.move_to_end(key)
+    while len(_lru) > PARSE_CACHE_SIZE:
+        _lru.popitem(last=False)
+
+
+def _lookup(key: str) -> tuple[tuple[str, str] | None, str | None]:
+    """Ищет значение в памяти, затем в Redis; возвращает (значение, уровень)"""
+    entry = _lru.get(key)
+    if entry is not None:
+        expires_at, value = entry
+        if expires_at > time.monotonic():
+            _lru.move_to_end(key)
+            return value, 'memory'
+        del _lru[key]
+
+    if PARSE_CACHE_REDIS:
+        try:
+            raw = r.get(key)
+        except redis.RedisError as e:
+            logger.warning(f"Redis parse cache unavailable: {e}")
+            raw = None
+        if raw is not None:
+            data = json.loads(raw)
+            value = (data['c'], data['s'])
+            _remember(key, value)
+            return value, 'redis'
+        _remember(key, None, PARSE_CACHE_MISS_TTL)
+
+    return None, None
+
+
+def _store(key: str, value: tuple[str, str]) -> None:
+    _remember(key, value)
+    if PARSE_CACHE_REDIS:
+        try:
+            r.setex(key, PARSE_CACHE_TTL, json.dumps({'c': value[0], 's': value[1]}, ensure_ascii=False))
+        except redis.RedisError as e:
+            logger.warning(f"Redis parse cache unavailable: {e}")
+
+
+def get(kind: str, raw_input: str, user_id: str | None = None) -> tuple | None:
+    """
+    Возвращает (категория, подкатегория, цена) для ввода, если такой шаблон
+    уже разбирался. Сначала ищется запись пользователя (его исправления),
+    затем общая; цена всегда берётся из текущего ввода.
+    """
+    key, price = make_key(kind, raw_input)
+    if key is None:
+        return None
+
+    if user_id:
+        value, _ = _lookup(_redis_key(key, user_id))
+        if value is not None:
+            stats['user_hits'] += 1
+            return value[0], value[1], price
+
+    value, level = _lookup(_redis_key(key))
+    if value is not None:
+        stats[f'{level}_hits'] += 1
+        return value[0], value[1], price
+
+    stats['misses'] += 1
+    return None
+
+
+def put(kind: str, raw_input: str, result: tuple) -> None:
+    """
+    Сохраняет разбор LLM в общий кэш. Пропускается, если LLM прочитала цену
+    не так, как локальный разбор: тогда цена влияет на смысл и шаблон ненадёжен.
+    """
+    category, subcategory, price = result
+    if not category or not subcategory:
+        return
+    key, local_price = make_key(kind, raw_input)
+    if key is None or price != local_price:
+        return
+    _store(_redis_key(key), (category, subcategory))
+
+
+def note_parse(kind: str, raw_input: str, user_id: str | None, result: tuple) -> None:
+    """
+    Запоминает, из какого ввода получен последний разбор пользователя.
+    Вызывается на каждом пути разбора (справочник, кэш, локальный разбор, LLM).
+    """
+    if not user_id:
+        return
+    key, _ = make_key(kind, raw_input)
+    if key is None or not result[0] or not result[1]:
+        _last_keys.pop(user_id, None)
+        return
+    _last_keys[user_id] = (key, result[0].lower(), result[1].lower())
+
+
+def forget(user_id: str | None) -> None:
+    """Последняя запись пользователя получена не из текстового ввода (например, из чека)"""
+    if user_id:
+        _last_keys.pop(str(user_id), None)
+
+
+def remember_correction(user_id: str, field: str, new_val: str, last_purchase: dict) -> None:
+    """
+    Пользователь исправил категорию или подкатегорию последней записи:
+    дальше шаблон ввода, из которого она получилась, разбирается для него с исправлением.
+    Если последняя запись — не результат последнего разбора, ничего не запоминается.
+    """
+    entry = _last_keys.get(user_id)
+    if entry is None or field not in ('category', 'subcategory'):
+        return
+    key, parsed_category, parsed_subcategory = entry
+    if (last_purchase['category'].lower(), last_purchase['subcategory'].lower()) != \
+            (parsed_category, parsed_subcategory):
+        return
+    category = new_val.lower() if field == 'category' else parsed_category
+    subcategory = new_val.lower() if field == 'subcategory' else parsed_subcategory
+    _store(_redis_key(key, user_id), (category, subcategory))
+    # Следующее исправление той же записи сравнивается уже с исправленными значениями
+    _last_keys[user_id] = (key, category, subcategory)
@@ -1,28 +1,23 @@
-import openai
 import os
 import re
-from dotenv import load_dotenv
+import asyncio
+from functools import partial
+import parse_cache
+import category_index
+import product_cache
+import item_classifier
+from fast_parse import parse_fast, split_price, FAST_PARSE_MIN_CONFIDENCE
+from llm_client import chat_completion
+from llm_batch import MicroBatcher
 
-# Настройки OpenRouter
-load_dotenv()
-OPENROUTER_API_KEY = os.getenv('OPENROUTER_API_KEY')
-OPENROUTER_API_BASE = 'https://openrouter.ai/api/v1'
-LLM_MODEL = 'deepseek/deepseek-chat-v3-0324:free'
+# Позиций чека в одном запросе к LLM и повторов для неудачной части
+PH_CHUNK_SIZE = int(os.getenv('PH_CHUNK_SIZE', '15'))
+PH_CHUNK_RETRIES = int(os.getenv('PH_CHUNK_RETRIES', '1'))
 
-def parse_expense_t(raw_input: str) -> tuple:
-    """
-    Извлекает структурированные данные из текстового ввода
-    Возвращает кортеж: (категория, подкатегория, цена)
-    
-    Параметры:
-        raw_input (str): Сырая строка формата "категория подкатегория цена"
-    
-    Возвращает:
-        tuple: (категория, подкатегория, цена) или (None, None, None) при ошибке
-    """
-    # Формируем промпт с инструкциями и примерами
-    prompt = f"""<｜begin▁of▁task｜>
-Извлеки из текста три элемента: категорию, подкатегорию (товар/услуга) и цену. 
+
+# Инструкции и примеры для LLM: 't' — текстовый ввод, 'v' — распознанный голос
+_RULES = {
+    't': """Извлеки из текста три элемента: категорию, подкатегорию (товар/услуга) и цену. 
 Исправь опечатки, приведи слова к нормальной форме. Цену выведи цифрами.
 Если было 3 слова и ты не знаешь что исправлять, то оставь как есть.
 Cлова не подменяй. Знаки убирай из слов.
@@ -35,68 +30,178 @@ Cлова не подменяй. Знаки убирай из слов.
 2. Ввод: "транспорт такси до аэропорта 1500 руб" → транспорт|такси|1500
 3. Ввод: "развлечния кинотеатр 300 рубли" → развлечения|кинотеатр|300
 4. Ввод: "быт хоз мыло 75 р" → быт|мыло|75
-5. Ввод: "эдл малако 80" → еда|молоко|80
+5. Ввод: "эдл малако 80" → еда|молоко|80""",
+    'v': """Тебе придет два или три значения.
+Три значения в таком порядке: категория, подкатегория (товар/услуга) и цена. 
+Если два слова, то порядок такой: подкатегория цена
+Исправь опечатки, приведи слова к нормальной форме. Цену выведи цифрами.
+
+Если не определил категорию или подкатегорию, то найди созвучное слово для категории товара/услуги или подкатегории - самого товара/услуги.
+Если нашлась категория, то можешь понять по смыслу и созвучию подкатегорию и наоборот, но только если слово непонятно.
+Правильные слова не подменяй.
+Если нет цифры с ценой, то не выдумывай и не пиши цену.
+Если есть только два значения: слово и цифра, значит это подкатегория и цена. Категорию придумай сам.
+
+Формат вывода СТРОГО: категория|подкатегория|цена
+
+Примеры:
+1. Ввод: "еда ведро картошки 500 рублей" → еда|картошка|500
+2. Ввод: "транспорт такси до аэропорта 1500 руб" → транспорт|такси|1500
+3. Ввод: "развлечния кинотеатр 300 рубли" → развлечения|кинотеатр|300
+4. Ввод: "быт хоз мыло 75 р" → быт|мыло|75
+5. Ввод: "эдл малако 80" → еда|молоко|80""",
+}
+
+
+def _prompt(kind: str, raw_input: str) -> str:
+    return f"""<｜begin▁of▁task｜>
+{_RULES[kind]}
 
 Обработай:
 Ввод: "{raw_input}"
 <｜end▁of▁task｜>
 Вывод:"""
 
+
+def _batch_prompt(kind: str, inputs: list[str]) -> str:
+    numbered = "\n".join(f'{i}. Ввод: "{raw}"' for i, raw in enumerate(inputs, 1))
+    return f"""<｜begin▁of▁task｜>
+{_RULES[kind]}
+
+Обработай каждый ввод отдельно. Для каждого выведи одну строку: номер. категория|подкатегория|цена
+{numbered}
+<｜end▁of▁task｜>
+Вывод:"""
+
+
+def _parse_answer(ai_output: str) -> tuple | None:
+    """Разбирает строку "категория|подкатегория|цена"; None, если формат не тот"""
+    if "|" in ai_output:
+        parts = ai_output.split("|")
+        if len(parts) >= 3:
+            # Извлекаем только цифры из цены (на случай если ИИ добавил текст)
+            price_value = re.search(r'\d+', parts[2])
+            price = price_value.group() if price_value else None
+
+            return (
+                parts[0].strip().lower(),
+                parts[1].strip().lower(),
+                price
+            )
+    return None
+
+
+async def _llm_parse(kind: str, raw_input: str) -> tuple:
+    """Один ввод — один запрос к LLM; (None, None, None) при ошибке"""
     try:
         # Отправка запроса к ИИ
-        response = openai.ChatCompletion.create(
-            model=LLM_MODEL,
-            messages=[{"role": "user", "content": prompt}],
-            api_base=OPENROUTER_API_BASE,
-            headers={
-                "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-                "HTTP-Referer": "https://ai5.space",  # Замените на реальные данные
-                "X-Title": "Counter"
-            },
-            api_key=OPENROUTER_API_KEY,
-            max_tokens=50,
-            temperature=0.1
-        )
-        
-        # Извлекаем ответ
-        ai_output = response['choices'][0]['message']['content'].strip()
-        
-        # Парсим результат
-        if "|" in ai_output:
-            parts = ai_output.split("|")
-            if len(parts) >= 3:
-                # Извлекаем только цифры из цены (на случай если ИИ добавил текст)
-                price_value = re.search(r'\d+', parts[2])
-                price = price_value.group() if price_value else None
-                
-                return (
-                    parts[0].strip().lower(),
-                    parts[1].strip().lower(),
-                    price
-                )
-        
+        ai_output = await chat_completion(_prompt(kind, raw_input), max_tokens=50, temperature=0.1)
+
+        result = _parse_answer(ai_output)
+        if result is not None:
+            return result
+
         # Если формат не совпадает - вернуть ошибку
         print(f"Неверный формат ответа ИИ: {ai_output}")
         return None, None, None
-        
+
     except Exception as e:
         print(f"Ошибка при обработке: {str(e)}")
         return None, None, None
 
 
-def parse_expense_ph(items_with_price):
+async def _llm_parse_batch(kind: str, inputs: list[str]) -> list[tuple | None]:
     """
-    Принимает список товаров с ценами и возвращает список кортежей:
-    (категория, название_товара, цена)
+    Несколько вводов одним запросом с нумерованным списком.
+    Для строк, которых нет в ответе или которые не разобрались, — None.
+    """
+    ai_output = await chat_completion(_batch_prompt(kind, inputs), max_tokens=50 * len(inputs), temperature=0.1)
+    results: list[tuple | None] = [None] * len(inputs)
+    for line in ai_output.splitlines():
+        m = re.match(r'\s*(\d+)[.)]\s*(.+)', line)
+        if m and 1 <= int(m.group(1)) <= len(inputs):
+            results[int(m.group(1)) - 1] = _parse_answer(m.group(2))
+    return results
 
-    Параметры:
-        items_with_price (list of tuples): [(name, price), ...]
 
+_batchers = {
+    kind: MicroBatcher(partial(_llm_parse, kind), partial(_llm_parse_batch, kind))
+    for kind in _RULES
+}
+
+
+async def _from_index(raw_input: str, user_id: str | None) -> tuple | None:
+    """
+    Разбор по справочнику пользователя: "кофе 250" или "еда кофе 250",
+    если "кофе" у него уже записан, а также с опечатками ("малако 80").
+    Иначе None.
+    """
+    if not user_id:
+        return None
+    words, price = split_price(raw_input)
+    if price is None or not words:
+        return None
+    known = await category_index.lookup(user_id, " ".join(words))
+    if known is None and len(words) > 1:
+        # Категория указана явно — она должна совпасть со справочником
+        known = await category_index.lookup(user_id, " ".join(words[1:]))
+        if known is not None and category_index.normalize(known[0]) != words[0]:
+            known = None
+    if known is None:
+        # Опечатки и ошибки распознавания исправляем по тому же справочнику
+        known = await category_index.correct(user_id, words)
+    if known is None:
+        return None
+    return known[0], known[1], price
+
+async def _parse(kind: str, raw_input: str, user_id: str | None) -> tuple:
+    """Общий путь разбора для parse_expense_t/v: справочник, кэш, локальный разбор, LLM"""
+    # Название уже есть в справочнике пользователя
+    known = await _from_index(raw_input, user_id)
+    if known is not None:
+        return known
+
+    # Тот же ввод уже разбирался — ответ из кэша
+    cached = parse_cache.get(kind, raw_input, user_id)
+    if cached is not None:
+        return cached
+
+    # Структурированный ввод разбираем локально, без запроса к LLM
+    category, subcategory, price, confidence = parse_fast(raw_input)
+    if confidence >= FAST_PARSE_MIN_CONFIDENCE:
+        return category, subcategory, price
+
+    # Запрос к LLM (при включённом LLM_BATCH_WINDOW_MS — в пачке с другими)
+    result = await _batchers[kind].submit(raw_input)
+    if result[0]:
+        parse_cache.put(kind, raw_input, result)
+    return result
+
+
+async def parse_expense_t(raw_input: str, user_id: str | None = None) -> tuple:
+    """
+    Извлекает структурированные данные из текстового ввода
+    Возвращает кортеж: (категория, подкатегория, цена)
+    
+    Параметры:
+        raw_input (str): Сырая строка формата "категория подкатегория цена"
+        user_id (str): Telegram ID, для справочника и исправлений пользователя
+    
     Возвращает:
-        list of tuples: [(category, name, price), ...]
+        tuple: (категория, подкатегория, цена) или (None, None, None) при ошибке
     """
-    names = [name for name, price in items_with_price]
+    result = await _parse('t', raw_input, user_id)
+    # Исправление этой записи пользователем привязывается к этому вводу
+    parse_cache.note_parse('t', raw_input, user_id, result)
+    return result
+
 
+async def _categorize_chunk(names: list[str]) -> dict:
+    """
+    Категории для части позиций чека: {название: категория}.
+    Если ответ не пришёл или в нём нет ни одного из названий, запрос
+    повторяется до PH_CHUNK_RETRIES раз; при неудаче — пустой словарь.
+    """
     prompt = """
 У тебя есть список покупок с названиями товаров. Для каждого названия нужно определить категорию товара.
 Категория должна быть одним словом (например: еда, быт, развлечения, ремонт и так далее).
@@ -112,31 +217,28 @@ def parse_expense_ph(items_with_price):
         prompt += f"- {name}\n"
     prompt += "\nДай ответ строго в указанном формате без лишних пояснений."
 
-    try:
-        response = openai.ChatCompletion.create(
-            model=LLM_MODEL,
-            api_base=OPENROUTER_API_BASE,
-            api_key=OPENROUTER_API_KEY,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.1,
-            max_tokens=len(names) * 20
-        )
-        ai_output = response['choices'][0]['message']['content'].strip()
-    except Exception as e:
-        print(f"Ошибка при получении категорий товаров: {e}")
-        return [(None, name, price) for name, price in items_with_price]
+    wanted = set(names)
+    for attempt in range(PH_CHUNK_RETRIES + 1):
+        try:
+            ai_output = await chat_completion(prompt, max_tokens=len(names) * 20, temperature=0.1)
+        except Exception as e:
+            print(f"Ошибка при получении категорий товаров: {e}")
+            continue
 
-    # Разбираем вывод
-    mapping = {}
-    for line in ai_output.splitlines():
-        if '|' in line:
-            name, cat = line.split('|', 1)
-            mapping[name.strip()] = cat.strip().lower() or None
+        # Разбираем вывод
+        mapping = {}
+        for line in ai_output.splitlines():
+            if '|' in line:
+                name, cat = line.split('|', 1)
+                mapping[name.strip().lstrip('- ').strip()] = cat.strip().lower() or None
+        if wanted & mapping.keys():
+            return mapping
+        print(f"Неверный формат ответа ИИ: {ai_output}")
+    return {}
 
-    # Создаём исходный список с возможными None
-    result = [(mapping.get(name, None), name, price) for name, price in items_with_price]
 
-    # Проходим и заполняем None от соседей
+def _fill_from_neighbours(result: list) -> None:
+    """Позиции без категории берут её у ближайшего соседа (сначала вперёд, потом назад)"""
     for i in range(len(result)):
         category, name, price = result[i]
         if not category or category in {"-", "неизвестно", "none"}:
@@ -152,85 +254,80 @@ def parse_expense_ph(items_with_price):
                         result[i] = (result[j][0], name, price)
                         break
 
+
+async def parse_expense_ph(items_with_price, user_id=None, groups=None):
+    """
+    Принимает список товаров с ценами и возвращает список кортежей:
+    (категория, название_товара, цена)
+
+    Параметры:
+        items_with_price (list of tuples): [(name, price), ...]
+        user_id (int): Telegram ID; товары из его справочника, общего кэша
+            и уверенно распознанные классификатором в LLM не отправляются
+        groups (list of int): размеры чеков, если позиции нескольких чеков идут
+            подряд; категорию от соседа позиция берёт только внутри своего чека
+
+    Возвращает:
+        list of tuples: [(category, name, price), ...]
+    """
+    # Последними записями станут позиции чека — прошлый ввод к ним не относится
+    parse_cache.forget(user_id)
+    mapping = {}
+    if user_id:
+        for name, price in items_with_price:
+            known = await category_index.lookup(user_id, name)
+            if known is not None:
+                mapping[name] = known[0]
+    # Общий кэш названий товаров (одинаковые позиции сетевых магазинов)
+    mapping.update(product_cache.get_many([name for name, price in items_with_price if name not in mapping]))
+    names = list(dict.fromkeys(name for name, price in items_with_price if name not in mapping))
+    # Локальный классификатор; в LLM уходят только неуверенные позиции
+    for name, (category, confidence) in zip(names, item_classifier.classify(names)):
+        if category and confidence >= item_classifier.ITEM_CLASSIFIER_MIN_CONFIDENCE:
+            mapping[name] = category
+    names = [name for name in names if name not in mapping]
+    if not names:
+        return [(mapping[name], name, price) for name, price in items_with_price]
+
+    # Большой чек — несколько небольших запросов параллельно
+    chunks = [names[i:i + PH_CHUNK_SIZE] for i in range(0, len(names), PH_CHUNK_SIZE)]
+    for chunk_mapping in await asyncio.gather(*(_categorize_chunk(chunk) for chunk in chunks)):
+        mapping.update(chunk_mapping)
+
+    # Ответы LLM по запрошенным названиям — в общий кэш
+    product_cache.put_many({
+        name: mapping[name] for name in names
+        if mapping.get(name) and mapping[name] not in {"-", "неизвестно", "none"}
+    })
+
+    # Создаём исходный список с возможными None
+    result = [(mapping.get(name, None), name, price) for name, price in items_with_price]
+
+    # Проходим и заполняем None от соседей — в пределах каждого чека
+    start = 0
+    for size in groups or [len(result)]:
+        part = result[start:start + size]
+        _fill_from_neighbours(part)
+        result[start:start + size] = part
+        start += size
+
     return result
 
 
 
-def parse_expense_v(raw_input: str) -> tuple:
+async def parse_expense_v(raw_input: str, user_id: str | None = None) -> tuple:
     """
     Извлекает структурированные данные из голосового ввода
     Возвращает кортеж: (категория, подкатегория, цена)
     
     Параметры:
         raw_input (str): Распознанный текст из аудио
+        user_id (str): Telegram ID, для справочника и исправлений пользователя
     
     Возвращает:
         tuple: (категория, подкатегория, цена) или (None, None, None) при ошибке
     """
-    # Формируем промпт с инструкциями и примерами
-    prompt = f"""<｜begin▁of▁task｜>
-Тебе придет два или три значения.
-Три значения в таком порядке: категория, подкатегория (товар/услуга) и цена. 
-Если два слова, то порядок такой: подкатегория цена
-Исправь опечатки, приведи слова к нормальной форме. Цену выведи цифрами.
-
-Если не определил категорию или подкатегорию, то найди созвучное слово для категории товара/услуги или подкатегории - самого товара/услуги.
-Если нашлась категория, то можешь понять по смыслу и созвучию подкатегорию и наоборот, но только если слово непонятно.
-Правильные слова не подменяй.
-Если нет цифры с ценой, то не выдумывай и не пиши цену.
-Если есть только два значения: слово и цифра, значит это подкатегория и цена. Категорию придумай сам.
-
-Формат вывода СТРОГО: категория|подкатегория|цена
-
-Примеры:
-1. Ввод: "еда ведро картошки 500 рублей" → еда|картошка|500
-2. Ввод: "транспорт такси до аэропорта 1500 руб" → транспорт|такси|1500
-3. Ввод: "развлечния кинотеатр 300 рубли" → развлечения|кинотеатр|300
-4. Ввод: "быт хоз мыло 75 р" → быт|мыло|75
-5. Ввод: "эдл малако 80" → еда|молоко|80
-
-Обработай:
-Ввод: "{raw_input}"
-<｜end▁of▁task｜>
-Вывод:"""
-
-    try:
-        # Отправка запроса к ИИ
-        response = openai.ChatCompletion.create(
-            model=LLM_MODEL,
-            messages=[{"role": "user", "content": prompt}],
-            api_base=OPENROUTER_API_BASE,
-            headers={
-                "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-                "HTTP-Referer": "https://ai5.space",  # Замените на реальные данные
-                "X-Title": "Counter"
-            },
-            api_key=OPENROUTER_API_KEY,
-            max_tokens=50,
-            temperature=0.1
-        )
-        
-        # Извлекаем ответ
-        ai_output = response['choices'][0]['message']['content'].strip()
-        
-        # Парсим результат
-        if "|" in ai_output:
-            parts = ai_output.split("|")
-            if len(parts) >= 3:
-                # Извлекаем только цифры из цены (на случай если ИИ добавил текст)
-                price_value = re.search(r'\d+', parts[2])
-                price = price_value.group() if price_value else None
-                
-                return (
-                    parts[0].strip().lower(),
-                    parts[1].strip().lower(),
-                    price
-                )
-        
-        # Если формат не совпадает - вернуть ошибку
-        print(f"Неверный формат ответа ИИ: {ai_output}")
-        return None, None, None
-        
-    except Exception as e:
-        print(f"Ошибка при обработке: {str(e)}")
-        return None, None, None
\ No newline at end of file
+    result = await _parse('v', raw_input, user_id)
+    # Исправление этой записи пользователем привязывается к этому вводу
+    parse_cache.note_parse('v', raw_input, user_id, result)
+    return result
\ No newline at end of file
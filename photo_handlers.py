@@ -1,97 +1,321 @@
 import os
 import math
-import requests
+import asyncio
+import hashlib
 from io import BytesIO
 from aiogram.types import Message
-from pyzbar.pyzbar import decode
-from PIL import Image
+
+from qr_decode import decode_qr_async, QR_MIN_PHOTO_SIDE
+import receipt_store
+import receipt_client
+import receipt_queue
+from receipt_client import ReceiptError
+import receipt_ocr
+from media_group import MediaGroupCollector
 
 from parse_expense import parse_expense_ph  # распределение категорий
 from db_handler import save_expenses_ph   # функция сохранения списка в БД
 
-FNS_TOKEN = os.getenv('FNS_TOKEN')
+# Сколько ждать проверки чека, прежде чем отложить её в фоновую очередь, с
+RECEIPT_WAIT = float(os.getenv('RECEIPT_WAIT', '8'))
+# Длина одного сообщения Telegram с запасом до лимита 4096
+_MESSAGE_LIMIT = 4000
+
+
+async def find_qr(message: Message) -> tuple[str | None, bytes]:
+    """
+    Ищет QR, начиная с меньших размеров фото: крупные скачиваются,
+    только если на меньших код не прочитался.
+
+    Возвращает:
+        tuple: (текст QR или None, последнее скачанное — самое крупное — фото)
+    """
+    sizes = [p for p in message.photo if max(p.width, p.height) >= QR_MIN_PHOTO_SIDE] or message.photo[-1:]
+    data = b''
+    for photo in sizes:
+        file = await message.bot.get_file(photo.file_id)
+        buffer = BytesIO()
+        await message.bot.download_file(file.file_path, buffer)
+        data = buffer.getvalue()
+        qr_raw = await decode_qr_async(data)
+        if qr_raw:
+            return qr_raw, data
+    return None, data
+
+
+async def recognize_text(message: Message, data: bytes):
+    """Фото без читаемого QR: позиции распознаются по тексту чека (receipt_ocr)"""
+    await message.answer("🔎 QR-код не найден, распознаю текст чека…")
+    try:
+        items_with_price, total = await receipt_ocr.recognize(data)
+    except receipt_ocr.QueueFullError:
+        return await message.answer("⏳ Сейчас много чеков в обработке, попробуйте через минуту.")
+    except asyncio.TimeoutError:
+        return await message.answer("❌ Распознавание чека заняло слишком много времени.")
+    except Exception as e:
+        return await message.answer(f"❌ Не удалось распознать текст чека: {e}")
+
+    if not items_with_price:
+        return await message.answer("❌ QR-код не найден, и позиции по тексту распознать не удалось.")
+    if total is not None and sum(price for _, price in items_with_price) != total:
+        await message.answer("⚠️ Сумма позиций не сходится с итогом чека — проверьте распознанное.")
+    # Повторно присланное то же фото не сохраняется второй раз
+    await deliver_items(message.bot, message.chat.id, message.from_user.id, message.from_user.username or "",
+                        f"ocr:{hashlib.sha256(data).hexdigest()}", items_with_price)
 
 
 async def handle_photo_message(message: Message):
     """
     Обработчик фото: декодирует QR, проверяет чек на proverkacheka,
     распределяет категории, выводит позиции и сохраняет их в БД.
+    Фото без читаемого QR распознаётся по тексту, если OCR запущен.
+    Фото альбома собираются вместе и обрабатываются в handle_photo_album.
     """
-    await message.answer("📷 Получил фото, распознаю QR-код…")
+    if message.media_group_id:
+        return _albums.add(message)
 
-    # Скачать картинку в память
-    photo = message.photo[-1]
-    file = await message.bot.get_file(photo.file_id)
-    buffer = BytesIO()
-    await message.bot.download_file(file.file_path, buffer)
-    buffer.seek(0)
+    await message.answer("📷 Получил фото, распознаю QR-код…")
 
-    # Открыть и декодировать QR
     try:
-        img = Image.open(buffer)
+        qr_raw, data = await find_qr(message)
     except Exception as e:
         return await message.answer(f"❌ Не удалось открыть изображение: {e}")
 
-    decoded = decode(img)
-    if not decoded:
+    if not qr_raw:
+        if receipt_ocr.is_ready():
+            return await recognize_text(message, data)
         return await message.answer("❌ QR-код не найден на фото.")
-
-    qr_raw = decoded[0].data.decode('utf-8')
     # await message.answer(f"🔍 RAW QR: <code>{qr_raw}</code>", parse_mode="HTML")
 
-    # Проверка чека на proverkacheka
-    url = 'https://proverkacheka.com/api/v1/check/get'
-    payload = {'token': FNS_TOKEN, 'qrraw': qr_raw}
+    # Проверка чека на proverkacheka (повторный скан — из кэша).
+    # Если сервис тормозит или лежит — чек уходит в фоновую очередь
     try:
-        resp = requests.post(url, data=payload, timeout=10)
-        resp.raise_for_status()
-    except Exception as e:
-        return await message.answer(f"❌ Ошибка при проверке чека: {e}")
+        result, from_cache = await asyncio.wait_for(
+            receipt_store.get_or_verify(qr_raw, receipt_client.verify), RECEIPT_WAIT)
+    except (asyncio.TimeoutError, ReceiptError) as e:
+        if isinstance(e, ReceiptError) and not e.retryable:
+            return await message.answer(f"❌ Ошибка при проверке чека: {e}")
+        if receipt_queue.enqueue(qr_raw, message.from_user.id, message.chat.id,
+                                 message.from_user.username or ""):
+            return await message.answer(
+                "⏳ Сервис проверки чеков сейчас не отвечает. Чек принят — "
+                "пришлю позиции, когда он будет проверен.")
+        return await message.answer(f"❌ Ошибка при проверке чека: {str(e) or 'таймаут'}")
+
+    if from_cache:
+        await message.answer("📄 Этот чек уже проверялся, беру данные из кэша.")
+    await deliver_receipt(message.bot, message.chat.id, message.from_user.id,
+                          message.from_user.username or "", qr_raw, result)
 
-    result = resp.json()
+
+async def deliver_receipt(bot, chat_id: int, user_id: int, username: str, qr_raw: str, result: dict):
+    """
+    Проверенный чек: распределяет категории, выводит позиции и сохраняет их в БД.
+    Вызывается из обработчика фото и из фоновой очереди (receipt_queue).
+    """
     if result.get('code') != 1:
-        return await message.answer(f"❌ API вернул ошибку: {result}")
+        return await bot.send_message(chat_id, f"❌ API вернул ошибку: {result}")
+
+    items_with_price = _receipt_items(result)
+    if not items_with_price:
+        return await bot.send_message(chat_id, "⚠️ В ответе нет позиций товаров.")
+    await deliver_items(bot, chat_id, user_id, username, qr_raw, items_with_price)
+
+
+async def deliver_items(bot, chat_id: int, user_id: int, username: str, receipt_id: str,
+                        items_with_price: list[tuple[str, int]]):
+    """
+    Позиции чека (название, сумма_в_копейках): категории, вывод в чат и сохранение в БД.
+    receipt_id — строка QR или отпечаток фото, по нему отсекаются повторные сохранения.
+    """
+    # Повторный скан того же чека не категоризуется и не сохраняется второй раз.
+    # Отметка снимается в finally, если до сохранения в БД дело не дошло
+    if not receipt_store.mark_saved(user_id, receipt_id):
+        return await bot.send_message(chat_id, "⚠️ Этот чек уже сохранён, повторно не записываю.")
+    saved = False
+    try:
+        await bot.send_message(chat_id, "🤖 ИИ проставляет категории …")
+        # Получаем категории
+        categorized = await parse_expense_ph(items_with_price, user_id)
+
+        # 1) Выводим в чат
+        await _send_lines(bot, chat_id, ["📋 Позиции чека с категориями:"] + _item_lines(categorized))
 
-    raw_items = result['data']['json'].get('items', [])
-    if not raw_items:
-        return await message.answer("⚠️ В ответе нет позиций товаров.")
+        # 2) Готовим список для сохранения: (category, name, price_float)
+        items_to_save = _items_to_save(categorized)
+
+        # 3) Сохраняем в БД
+        if not items_to_save:
+            return await bot.send_message(chat_id, "⚠️ Нет корректных позиций для сохранения.")
+        try:
+            await save_expenses_ph(
+                user_id=user_id,
+                chat_id=chat_id,
+                username=username,
+                items=items_to_save
+            )
+        except Exception as e:
+            return await bot.send_message(chat_id, f"❌ Ошибка при сохранении в БД: {e}")
+        saved = True
+        await bot.send_message(chat_id, f"✅ Сохранено в БД: {len(items_to_save)} позиций.")
+    finally:
+        if not saved:
+            receipt_store.unmark_saved(user_id, receipt_id)
 
-    # Составляем список кортежей (название, сумма_в_копейках)
-    items_with_price = [
+
+def _receipt_items(result: dict) -> list[tuple[str, int]]:
+    """Позиции проверенного чека: (название, сумма_в_копейках)"""
+    return [
         (it.get('name', '').strip(), it.get('sum', 0))
-        for it in raw_items
+        for it in result['data']['json'].get('items', [])
     ]
-    await message.answer("🤖 ИИ проставляет категории …")
-    # Получаем категории
-    categorized = parse_expense_ph(items_with_price)
 
-    # 1) Выводим в чат
-    lines = ["📋 Позиции чека с категориями:"]
+
+def _item_lines(categorized: list[tuple]) -> list[str]:
+    lines = []
     for cat, name, sum_kopek in categorized:
         rub = math.ceil(sum_kopek / 100)
         cat_disp = cat or "(не определено)"
         lines.append(f"• {cat_disp} — {name} — {rub} ₽")
-    await message.answer("\n".join(lines))
+    return lines
 
-    # 2) Готовим список для сохранения: (category, name, price_float)
+
+def _items_to_save(categorized: list[tuple]) -> list[tuple[str, str, float]]:
     items_to_save = []
     for cat, name, sum_kopek in categorized:
         if not (cat and name and isinstance(sum_kopek, (int, float))):
             continue
         price_rub = math.ceil(sum_kopek / 100)
         items_to_save.append((cat, name, float(price_rub)))
+    return items_to_save
+
+
+async def _send_lines(bot, chat_id: int, lines: list[str]):
+    """Отправляет строки, деля на сообщения не длиннее лимита Telegram"""
+    chunk = []
+    size = 0
+    for line in lines:
+        if chunk and size + len(line) + 1 > _MESSAGE_LIMIT:
+            await bot.send_message(chat_id, "\n".join(chunk))
+            chunk, size = [], 0
+        chunk.append(line)
+        size += len(line) + 1
+    if chunk:
+        await bot.send_message(chat_id, "\n".join(chunk))
+
+
+async def _read_receipt(message: Message) -> dict:
+    """
+    Одно фото альбома без сообщений в чат: QR и проверка чека, без QR — OCR.
 
-    # 3) Сохраняем в БД
-    if items_to_save:
+    Возвращает:
+        dict: {'id': строка QR или отпечаток фото, 'items': [(название, копейки), ...],
+               'note': пояснение для сводки}; без 'items' — чек не прочитан
+    """
+    try:
+        qr_raw, data = await find_qr(message)
+    except Exception as e:
+        return {'note': f"не удалось открыть изображение: {e}"}
+
+    if not qr_raw:
+        if not receipt_ocr.is_ready():
+            return {'note': "QR-код не найден"}
         try:
-            await save_expenses_ph(
-                user_id=message.from_user.id,
-                chat_id=message.chat.id,
-                username=message.from_user.username or "",
-                items=items_to_save
-            )
-            await message.answer(f"✅ Сохранено в БД: {len(items_to_save)} позиций.")
+            items_with_price, total = await receipt_ocr.recognize(data)
         except Exception as e:
-            await message.answer(f"❌ Ошибка при сохранении в БД: {e}")
-    else:
-        await message.answer("⚠️ Нет корректных позиций для сохранения.")
+            return {'note': f"текст чека не распознан: {str(e) or 'таймаут'}"}
+        if not items_with_price:
+            return {'note': "QR-код не найден, позиции по тексту не распознаны"}
+        note = "распознан по тексту"
+        if total is not None and sum(price for _, price in items_with_price) != total:
+            note += ", сумма позиций не сходится с итогом"
+        return {'id': f"ocr:{hashlib.sha256(data).hexdigest()}", 'items': items_with_price, 'note': note}
+
+    try:
+        result, _ = await asyncio.wait_for(
+            receipt_store.get_or_verify(qr_raw, receipt_client.verify), RECEIPT_WAIT)
+    except (asyncio.TimeoutError, ReceiptError) as e:
+        retryable = not isinstance(e, ReceiptError) or e.retryable
+        if retryable and receipt_queue.enqueue(qr_raw, message.from_user.id, message.chat.id,
+                                               message.from_user.username or ""):
+            return {'note': "сервис проверки не отвечает, пришлю позиции позже"}
+        return {'note': f"ошибка при проверке чека: {str(e) or 'таймаут'}"}
+
+    if result.get('code') != 1:
+        return {'note': f"API вернул ошибку: {result.get('data')}"}
+    items_with_price = _receipt_items(result)
+    if not items_with_price:
+        return {'note': "в ответе нет позиций товаров"}
+    return {'id': qr_raw, 'items': items_with_price, 'note': ''}
+
+
+async def handle_photo_album(messages: list[Message]):
+    """
+    Альбом фото чеков: все фото читаются и проверяются одновременно, категории
+    проставляются одним проходом по позициям всех чеков, сохранение — одним
+    вызовом, в чат — одна сводка.
+    """
+    first = messages[0]
+    bot, chat_id = first.bot, first.chat.id
+    user_id, username = first.from_user.id, first.from_user.username or ""
+    await bot.send_message(chat_id, f"📷 Получил {len(messages)} фото, распознаю чеки…")
+
+    receipts = await asyncio.gather(*(_read_receipt(m) for m in messages))
+
+    # Повторно присланные чеки (в том числе дважды в одном альбоме) не сохраняются.
+    # Отметка снимается в finally, если до сохранения в БД дело не дошло
+    marked = []
+    saved = False
+    try:
+        for receipt in receipts:
+            if not receipt.get('items'):
+                continue
+            if receipt_store.mark_saved(user_id, receipt['id']):
+                marked.append(receipt['id'])
+            else:
+                receipt['items'] = None
+                receipt['note'] = "этот чек уже сохранён"
+
+        sizes = [len(receipt.get('items') or []) for receipt in receipts]
+        all_items = [item for receipt in receipts for item in receipt.get('items') or []]
+        categorized = []
+        if all_items:
+            await bot.send_message(chat_id, f"🤖 ИИ проставляет категории для {len(all_items)} позиций …")
+            categorized = await parse_expense_ph(all_items, user_id, groups=sizes)
+
+        lines = ["📋 Позиции чеков с категориями:"]
+        pos = 0
+        for n, (receipt, size) in enumerate(zip(receipts, sizes), 1):
+            part = categorized[pos:pos + size]
+            pos += size
+            note = f" ({receipt['note']})" if receipt.get('note') else ""
+            if part:
+                total = sum(math.ceil(sum_kopek / 100) for _, _, sum_kopek in part)
+                lines.append(f"\n🧾 Фото {n}: {len(part)} позиций, {total} ₽{note}")
+                lines += _item_lines(part)
+            else:
+                lines.append(f"\n⚠️ Фото {n}: {receipt.get('note') or 'позиций нет'}")
+
+        items_to_save = _items_to_save(categorized)
+        if items_to_save:
+            try:
+                await save_expenses_ph(
+                    user_id=user_id,
+                    chat_id=chat_id,
+                    username=username,
+                    items=items_to_save
+                )
+                saved = True
+                lines.append(f"\n✅ Сохранено в БД: {len(items_to_save)} позиций из {len(marked)} чеков.")
+            except Exception as e:
+                lines.append(f"\n❌ Ошибка при сохранении в БД: {e}")
+        else:
+            lines.append("\n⚠️ Нет корректных позиций для сохранения.")
+    finally:
+        if not saved:
+            for receipt_id in marked:
+                receipt_store.unmark_saved(user_id, receipt_id)
+    await _send_lines(bot, chat_id, lines)
+
+
+_albums = MediaGroupCollector(handle_photo_album)
@@ -0,0 +1,98 @@
+# process_pool.py
+import os
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Очередь пула заполнена — новую задачу не принимаем"""
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+class BoundedPool:
+    """
+    Пул процессов spawn с ограниченной очередью: в работе и в ожидании не больше
+    queue_size задач, сверх этого submit сразу отвечает QueueFullError.
+    Воркеры загружают модели в initializer один раз на всё время жизни.
+    """
+
+    def __init__(self, name: str, queue_size: int):
+        self.name = name
+        self.queue_size = queue_size
+        # spawn: torch и fork плохо уживаются
+        self.ctx = multiprocessing.get_context('spawn')
+        self.workers = 0
+        self.pending = 0
+        self.ready = False
+        self._executor: ProcessPoolExecutor | None = None
+
+    @property
+    def started(self) -> bool:
+        return self._executor is not None
+
+    async def start(self, workers: int, initializer, initargs: tuple = ()) -> list[int]:
+        """
+        Запускает воркеры и дожидается их инициализации; возвращает pid воркеров.
+        Если инициализация упала, пул останавливается и ошибка выбрасывается дальше.
+        """
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=self.ctx,
+            initializer=initializer,
+            initargs=initargs
+        )
+        self.workers = workers
+
+        # Каждая задача без свободного воркера поднимает новый процесс,
+        # поэтому workers пингов прогревают весь пул
+        loop = asyncio.get_running_loop()
+        try:
+            pids = await asyncio.gather(*(loop.run_in_executor(self._executor, _ping) for _ in range(workers)))
+        except Exception:
+            self.shutdown()
+            raise
+        self.ready = True
+        return sorted(set(pids))
+
+    def shutdown(self) -> None:
+        """Останавливает пул, отменяя задачи, которые ещё не начались"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self.workers = 0
+        self.ready = False
+
+    def _release(self) -> None:
+        self.pending -= 1
+
+    async def submit(self, timeout: float, fn, *args):
+        """
+        Выполняет fn(*args) в воркере и ждёт результат, не блокируя event loop.
+
+        Исключения:
+            QueueFullError: очередь заполнена
+            asyncio.TimeoutError: не уложились в timeout; задача снимается
+                с очереди, если ещё не начата
+        """
+        if self._executor is None:
+            raise RuntimeError(f"Пул {self.name} не запущен")
+        if self.pending >= self.queue_size:
+            raise QueueFullError(f"В очереди {self.pending} задач")
+
+        loop = asyncio.get_running_loop()
+        self.pending += 1
+        future = self._executor.submit(fn, *args)
+        # Место в очереди освобождается, только когда воркер реально закончил (или задачу отменили)
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._release))
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            future.cancel()
+            raise
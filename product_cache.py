@@ -0,0 +1,101 @@
+# product_cache.py
+import os
+import logging
+from collections import OrderedDict
+import redis
+from dotenv import load_dotenv
+
+from handlers_common import r
+from item_names import normalize
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Размер in-memory LRU (названий)
+PRODUCT_CACHE_SIZE = int(os.getenv('PRODUCT_CACHE_SIZE', '20000'))
+# Срок жизни записи в Redis, с; продлевается при каждом попадании,
+# так что редкие названия со временем вытесняются
+PRODUCT_CACHE_TTL = int(os.getenv('PRODUCT_CACHE_TTL', str(90 * 24 * 3600)))
+# Второй уровень в Redis (общий для всех процессов бота)
+PRODUCT_CACHE_REDIS = os.getenv('PRODUCT_CACHE_REDIS', '1') == '1'
+
+# нормализованное название -> категория
+_lru: "OrderedDict[str, str]" = OrderedDict()
+
+# Счётчики попаданий и промахов
+stats = {'memory_hits': 0, 'redis_hits': 0, 'misses': 0}
+
+
+def _key(norm: str) -> str:
+    return f"product:{norm}"
+
+
+def _remember(norm: str, category: str) -> None:
+    _lru[norm] = category
+    _lru.move_to_end(norm)
+    while len(_lru) > PRODUCT_CACHE_SIZE:
+        _lru.popitem(last=False)
+
+
+def get_many(names: list[str]) -> dict[str, str]:
+    """
+    Категории для известных названий: {исходное название: категория}.
+    Промахи памяти проверяются в Redis одним запросом.
+    """
+    found: dict[str, str] = {}
+    missing: dict[str, list[str]] = {}
+    for name in names:
+        norm = normalize(name)
+        if not norm:
+            continue
+        category = _lru.get(norm)
+        if category is not None:
+            _lru.move_to_end(norm)
+            found[name] = category
+            stats['memory_hits'] += 1
+        else:
+            missing.setdefault(norm, []).append(name)
+
+    if missing and not PRODUCT_CACHE_REDIS:
+        stats['misses'] += sum(len(v) for v in missing.values())
+    elif missing:
+        norms = list(missing)
+        try:
+            values = r.mget([_key(n) for n in norms])
+            pipe = r.pipeline()
+            for norm, category in zip(norms, values):
+                if category is not None:
+                    pipe.expire(_key(norm), PRODUCT_CACHE_TTL)
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Redis product cache unavailable: {e}")
+            values = [None] * len(norms)
+        for norm, category in zip(norms, values):
+            if category is None:
+                stats['misses'] += len(missing[norm])
+                continue
+            _remember(norm, category)
+            for name in missing[norm]:
+                found[name] = category
+            stats['redis_hits'] += len(missing[norm])
+
+    return found
+
+
+def put_many(categories: dict[str, str]) -> None:
+    """Сохраняет подтверждённые категории {название: категория} на обоих уровнях"""
+    items = {}
+    for name, category in categories.items():
+        norm = normalize(name)
+        if norm and category:
+            items[norm] = category
+            _remember(norm, category)
+    if not items or not PRODUCT_CACHE_REDIS:
+        return
+    try:
+        pipe = r.pipeline()
+        for norm, category in items.items():
+            pipe.setex(_key(norm), PRODUCT_CACHE_TTL, category)
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"Redis product cache unavailable: {e}")
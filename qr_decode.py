@@ -0,0 +1,104 @@
+# qr_decode.py
+import os
+import asyncio
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PIL import Image, ImageOps
+from pyzbar.pyzbar import decode, ZBarSymbol
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Потоков для распознавания QR (zbar отпускает GIL на время разбора)
+QR_WORKERS = int(os.getenv('QR_WORKERS', '2'))
+# Длинные стороны уменьшенных копий, на которых QR ищется до полного размера
+QR_PYRAMID = [int(x) for x in os.getenv('QR_PYRAMID', '640,1024').split(',') if x.strip()]
+# Telegram-размеры фото меньше этого (по длинной стороне) не скачиваются
+QR_MIN_PHOTO_SIDE = int(os.getenv('QR_MIN_PHOTO_SIDE', '800'))
+# Сколько областей-кандидатов вырезать из полного изображения
+QR_ROI_CANDIDATES = int(os.getenv('QR_ROI_CANDIDATES', '3'))
+
+# Размер карты для поиска области с QR, px по длинной стороне
+_LOCATE_SIDE = 256
+
+_executor = ThreadPoolExecutor(max_workers=QR_WORKERS, thread_name_prefix='qr')
+
+
+def _zbar(img: Image.Image) -> str | None:
+    for symbol in decode(img, symbols=[ZBarSymbol.QRCODE]):
+        return symbol.data.decode('utf-8')
+    return None
+
+
+def _scaled(img: Image.Image, side: int) -> Image.Image:
+    scale = side / max(img.size)
+    return img.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))), Image.BILINEAR)
+
+
+def locate(img: Image.Image, candidates: int = QR_ROI_CANDIDATES) -> list[tuple[int, int, int, int]]:
+    """
+    Области, похожие на QR: плотные резкие перепады яркости в обе стороны.
+    Ищутся на уменьшенной копии, возвращаются в координатах img (left, top, right, bottom).
+    """
+    small = _scaled(img, _LOCATE_SIDE) if max(img.size) > _LOCATE_SIDE else img
+    a = np.asarray(small, dtype=np.float32)
+    # QR — это перепады и по горизонтали, и по вертикали; текст чека — в основном по горизонтали
+    gx = np.abs(np.diff(a, axis=1))[:-1, :]
+    gy = np.abs(np.diff(a, axis=0))[:, :-1]
+    edges = np.minimum(gx, gy) > 40
+
+    # Сумма по окну через интегральное изображение; окно — треть короткой стороны
+    win = max(8, min(edges.shape) // 3)
+    integral = np.pad(edges.cumsum(0).cumsum(1), ((1, 0), (1, 0)))
+    density = (integral[win:, win:] - integral[:-win, win:]
+               - integral[win:, :-win] + integral[:-win, :-win])
+    if density.size == 0:
+        return []
+
+    sx, sy = img.width / small.width, img.height / small.height
+    boxes = []
+    for _ in range(candidates):
+        y, x = np.unravel_index(int(density.argmax()), density.shape)
+        if density[y, x] <= 0:
+            break
+        # Вырез с запасом в пол-окна: QR может выходить за окно
+        pad = win // 2
+        boxes.append((
+            max(0, int((x - pad) * sx)), max(0, int((y - pad) * sy)),
+            min(img.width, int((x + win + pad) * sx)), min(img.height, int((y + win + pad) * sy)),
+        ))
+        # Гасим найденное, чтобы следующий кандидат был в другом месте
+        density[max(0, y - win):y + win, max(0, x - win):x + win] = 0
+    return boxes
+
+
+def decode_qr(data: bytes) -> str | None:
+    """
+    Текст QR-кода на фото или None. Сначала уменьшенные серые копии (дёшево),
+    затем области-кандидаты в полном разрешении, в конце — всё фото целиком.
+
+    Исключения:
+        PIL.UnidentifiedImageError: данные не являются изображением
+    """
+    img = ImageOps.exif_transpose(Image.open(BytesIO(data))).convert('L')
+
+    for side in QR_PYRAMID:
+        if side < max(img.size):
+            text = _zbar(_scaled(img, side))
+            if text:
+                return text
+
+    for box in locate(img):
+        crop = img.crop(box)
+        text = _zbar(crop) or _zbar(ImageOps.autocontrast(crop, cutoff=2))
+        if text:
+            return text
+
+    return _zbar(img)
+
+
+async def decode_qr_async(data: bytes) -> str | None:
+    """decode_qr в пуле потоков, не блокируя event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, decode_qr, data)
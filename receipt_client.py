@@ -0,0 +1,61 @@
+# receipt_client.py
+import os
+from dotenv import load_dotenv
+
+from http_client import RequestError, RetryingClient
+
+load_dotenv()
+FNS_TOKEN = os.getenv('FNS_TOKEN')
+# Можно направить на локальную заглушку (bench/proverkacheka_stub.py)
+PROVERKACHEKA_API_BASE = os.getenv('PROVERKACHEKA_API_BASE', 'https://proverkacheka.com/api/v1')
+
+# Таймаут одного запроса, с
+RECEIPT_TIMEOUT = float(os.getenv('RECEIPT_TIMEOUT', '10'))
+# Одновременных запросов к сервису (и размер пула соединений)
+RECEIPT_MAX_CONCURRENCY = int(os.getenv('RECEIPT_MAX_CONCURRENCY', '8'))
+# Повторов при 429/5xx/сетевых ошибках и «данные пока не получены»
+RECEIPT_MAX_RETRIES = int(os.getenv('RECEIPT_MAX_RETRIES', '2'))
+# Базовая и максимальная пауза между повторами, с
+RECEIPT_BACKOFF_BASE = float(os.getenv('RECEIPT_BACKOFF_BASE', '0.5'))
+RECEIPT_BACKOFF_MAX = float(os.getenv('RECEIPT_BACKOFF_MAX', '4'))
+
+# Коды ответа proverkacheka, при которых чек стоит проверить позже:
+# 2 — данные чека пока не получены, 3 — превышено число запросов,
+# 4 — ожидание перед повторным запросом, 5 — прочее
+_RETRY_CODES = {2, 3, 4, 5}
+
+
+class ReceiptError(RequestError):
+    """Ошибка проверки чека; retryable=True — имеет смысл повторить позже"""
+
+
+_client = RetryingClient(ReceiptError, RECEIPT_MAX_CONCURRENCY, RECEIPT_BACKOFF_BASE, RECEIPT_BACKOFF_MAX)
+
+
+async def close() -> None:
+    """Закрывает пул соединений (при остановке бота)"""
+    await _client.close()
+
+
+async def _request(qr_raw: str, timeout: float) -> dict:
+    data = await _client.post_json(f"{PROVERKACHEKA_API_BASE}/check/get", timeout,
+                                   data={'token': FNS_TOKEN, 'qrraw': qr_raw})
+
+    if not isinstance(data, dict):
+        raise ReceiptError(f"Неожиданный ответ: {data}", retryable=True)
+    if data.get('code') in _RETRY_CODES:
+        raise ReceiptError(f"Чек пока не проверен (code {data.get('code')}): {data.get('data')}", retryable=True)
+    return data
+
+
+async def verify(qr_raw: str, timeout: float | None = None) -> dict:
+    """
+    Проверяет чек на proverkacheka и возвращает ответ API
+    (code == 1 — чек проверен, иначе — чек некорректен).
+    При 429/5xx/таймауте и временных кодах повторяет запрос с паузой.
+
+    Исключения:
+        ReceiptError: сервис не ответил; retryable=True — чек можно проверить позже
+    """
+    return await _client.retry(lambda: _request(qr_raw, timeout or RECEIPT_TIMEOUT),
+                               RECEIPT_MAX_RETRIES, "Receipt check")
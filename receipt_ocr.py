@@ -0,0 +1,339 @@
+# receipt_ocr.py
+import os
+import re
+import time
+import asyncio
+import hashlib
+import logging
+from io import BytesIO
+import numpy as np
+from PIL import Image, ImageOps
+from dotenv import load_dotenv
+
+from process_pool import BoundedPool, QueueFullError
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Движок распознавания текста чека: tesseract или easyocr; пусто — OCR выключен
+OCR_ENGINE = os.getenv('OCR_ENGINE', 'tesseract')
+# Количество процессов-воркеров (в каждом свой экземпляр движка)
+OCR_WORKERS = int(os.getenv('OCR_WORKERS', '1'))
+# Максимум задач в работе и в очереди одновременно
+OCR_QUEUE_SIZE = int(os.getenv('OCR_QUEUE_SIZE', str(OCR_WORKERS * 4)))
+# Сколько секунд пользователь готов ждать распознавания чека
+OCR_TIMEOUT = float(os.getenv('OCR_TIMEOUT', '60'))
+# Длинная сторона фото перед предобработкой, px (больше — только дольше)
+OCR_MAX_SIDE = int(os.getenv('OCR_MAX_SIDE', '2400'))
+# Папка кэша предобработанных изображений (общая для воркеров) и его размер, файлов
+OCR_CACHE_DIR = os.getenv('OCR_CACHE_DIR', 'data/ocr_cache')
+OCR_CACHE_FILES = int(os.getenv('OCR_CACHE_FILES', '256'))
+# Язык tesseract
+OCR_TESSERACT_LANG = os.getenv('OCR_TESSERACT_LANG', 'rus')
+
+# Кириллица, цифры и знаки, которые встречаются в строках позиций
+_TESSERACT_CONFIG = (
+    r'--oem 1 --psm 6 '
+    r'-c tessedit_char_whitelist='
+    r'абвгдеёжзийклмнопрстуфхцчшщъыьэюя'
+    r'АБВГДЕЁЖЗИЙКЛМНОПРСТУФХЦЧШЩЪЫЬЭЮЯ'
+    r'0123456789.,*=%xх'
+)
+
+# Цена: 89.99, 89,99, 1 234.50; «1.000» (количество) ценой не считается
+PRICE_RE = re.compile(r'(?<![\d.,])(\d{1,3}(?:[ \u00a0]\d{3})+|\d+)[.,](\d{2})(?!\d)')
+TOTAL_RE = re.compile(r'\b(?:итого?|total|к оплате)', re.IGNORECASE)
+# Служебные строки чека, которые не являются позициями
+_SERVICE_RE = re.compile(
+    r'\b(?:ндс|скидк|наличн|безналичн|сдача|картой|карта|получено|кассир|смена|'
+    r'инн|фн|фд|фп|ккт|приход|оплат|всего|сумма)',
+    re.IGNORECASE
+)
+# Количество и знаки перед суммой: «2 x 59.90 =», «1.000 *»
+_QTY_RE = re.compile(r'\d+(?:[.,]\d+)?\s*[xх*]\s*|=')
+_LEADING_NUMBER_RE = re.compile(r'^\d+[.)]?\s+')
+# Цифры внутри слова — типичные ошибки OCR вместо букв
+_TYPO_RE = re.compile(r'(?<=[А-Яа-яЁё])[0368](?=[А-Яа-яЁё])')
+_TYPOS = {'0': 'о', '3': 'з', '6': 'б', '8': 'в'}
+
+
+class OCREngine:
+    """
+    Интерфейс движка OCR.
+    Читалка загружается один раз на процесс (load), read вызывается многократно.
+    """
+    name = ''
+
+    def load(self):
+        raise NotImplementedError
+
+    def preprocess(self, gray: np.ndarray) -> np.ndarray:
+        """Подготовка серого изображения под движок"""
+        return gray
+
+    def read(self, reader, image: np.ndarray) -> list[str]:
+        """Строки текста сверху вниз"""
+        raise NotImplementedError
+
+
+class TesseractEngine(OCREngine):
+    """pytesseract + бинаризация OpenCV (из db/parse_receipt_tesseract.py)"""
+    name = 'tesseract'
+
+    def load(self):
+        import pytesseract
+        # Нет бинарника tesseract — ошибка сразу при запуске, а не на первом чеке
+        pytesseract.get_tesseract_version()
+        return pytesseract
+
+    def preprocess(self, gray: np.ndarray) -> np.ndarray:
+        import cv2
+        gray = cv2.equalizeHist(gray)
+        # Мелкий шрифт tesseract читает лучше после увеличения
+        if max(gray.shape) < OCR_MAX_SIDE * 2 // 3:
+            gray = cv2.resize(gray, None, fx=2, fy=2, interpolation=cv2.INTER_LINEAR)
+        bin_img = cv2.adaptiveThreshold(
+            gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+            cv2.THRESH_BINARY, blockSize=15, C=8
+        )
+        # Закрытие убирает мелкие тёмные точки; текст остаётся чёрным на белом
+        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (2, 2))
+        return cv2.morphologyEx(bin_img, cv2.MORPH_CLOSE, kernel)
+
+    def read(self, reader, image: np.ndarray) -> list[str]:
+        raw = reader.image_to_string(Image.fromarray(image), lang=OCR_TESSERACT_LANG, config=_TESSERACT_CONFIG)
+        return [line.strip() for line in raw.splitlines() if line.strip()]
+
+
+class EasyOCREngine(OCREngine):
+    """easyocr (PyTorch, CPU); фрагменты собираются в строки по координатам"""
+    name = 'easyocr'
+
+    def load(self):
+        import easyocr
+        return easyocr.Reader(['ru', 'en'], gpu=False, verbose=False)
+
+    def read(self, reader, image: np.ndarray) -> list[str]:
+        fragments = []
+        for box, text, _ in reader.readtext(image, detail=1, paragraph=False):
+            ys = [p[1] for p in box]
+            fragments.append(((min(ys) + max(ys)) / 2, max(ys) - min(ys), min(p[0] for p in box), text))
+        if not fragments:
+            return []
+
+        # Фрагменты, чьи центры ближе половины высоты строки, — одна строка чека
+        tolerance = float(np.median([h for _, h, _, _ in fragments])) / 2
+        fragments.sort()
+        lines, current = [], [fragments[0]]
+        for fragment in fragments[1:]:
+            if fragment[0] - current[-1][0] <= tolerance:
+                current.append(fragment)
+            else:
+                lines.append(current)
+                current = [fragment]
+        lines.append(current)
+        return [" ".join(f[3] for f in sorted(line, key=lambda f: f[2])) for line in lines]
+
+
+ENGINES = {
+    TesseractEngine.name: TesseractEngine,
+    EasyOCREngine.name: EasyOCREngine,
+}
+
+# Движки и читалки текущего процесса (в воркере живут всё время его работы)
+_engines: dict[str, OCREngine] = {}
+_readers: dict[str, object] = {}
+
+# Счётчики текущего процесса
+stats = {'cache_hits': 0, 'cache_misses': 0}
+
+
+def get_engine(name: str | None = None) -> OCREngine:
+    """Возвращает движок по имени (по умолчанию OCR_ENGINE)"""
+    name = name or OCR_ENGINE
+    if name not in ENGINES:
+        raise ValueError(f"Неизвестный OCR-движок: {name}")
+    if name not in _engines:
+        _engines[name] = ENGINES[name]()
+    return _engines[name]
+
+
+def _reader(engine: OCREngine):
+    if engine.name not in _readers:
+        _readers[engine.name] = engine.load()
+    return _readers[engine.name]
+
+
+def _load_gray(data: bytes) -> np.ndarray:
+    img = ImageOps.exif_transpose(Image.open(BytesIO(data))).convert('L')
+    if max(img.size) > OCR_MAX_SIDE:
+        scale = OCR_MAX_SIDE / max(img.size)
+        img = img.resize((round(img.width * scale), round(img.height * scale)), Image.LANCZOS)
+    return np.asarray(img)
+
+
+def _prune_cache() -> None:
+    entries = sorted(os.scandir(OCR_CACHE_DIR), key=lambda e: e.stat().st_mtime)
+    for entry in entries[:max(0, len(entries) - OCR_CACHE_FILES)]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+
+
+def preprocessed(engine: OCREngine, data: bytes) -> np.ndarray:
+    """
+    Предобработанное под движок изображение. Результат кэшируется на диске по хешу
+    содержимого фото: повторно присланное фото и другой воркер не делают работу заново.
+    """
+    if OCR_CACHE_FILES <= 0:
+        return engine.preprocess(_load_gray(data))
+
+    path = os.path.join(OCR_CACHE_DIR, f"{engine.name}-{hashlib.sha256(data).hexdigest()}.npy")
+    try:
+        image = np.load(path)
+        stats['cache_hits'] += 1
+        return image
+    except (OSError, ValueError):
+        pass
+
+    stats['cache_misses'] += 1
+    image = engine.preprocess(_load_gray(data))
+    try:
+        os.makedirs(OCR_CACHE_DIR, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            np.save(f, image)
+        os.replace(tmp, path)
+        _prune_cache()
+    except OSError as e:
+        logger.warning(f"OCR cache write failed: {e}")
+    return image
+
+
+def _fix_typos(name: str) -> str:
+    return _TYPO_RE.sub(lambda m: _TYPOS[m.group()], name)
+
+
+def _kopecks(match: re.Match) -> int:
+    return int(re.sub(r'\D', '', match.group(1))) * 100 + int(match.group(2))
+
+
+def parse_lines(lines: list[str]) -> tuple[list[tuple[str, int]], int | None]:
+    """
+    Позиции чека из строк OCR.
+    Название без суммы запоминается и достаётся следующей строке, где есть только
+    количество и сумма («1.000 x 89.99 =89.99»).
+
+    Возвращает:
+        tuple: ([(название, сумма_в_копейках), ...], итог в копейках или None)
+    """
+    items = []
+    total = None
+    pending_name = None
+    for line in lines:
+        prices = list(PRICE_RE.finditer(line))
+        if TOTAL_RE.search(line):
+            if prices:
+                total = _kopecks(prices[-1])
+            pending_name = None
+            continue
+        if _SERVICE_RE.search(line):
+            pending_name = None
+            continue
+
+        name = _QTY_RE.sub(' ', PRICE_RE.sub(' ', line))
+        name = _LEADING_NUMBER_RE.sub('', " ".join(name.split())).strip(' .:-*')
+        letters = sum(ch.isalpha() for ch in name)
+        if not prices:
+            if letters >= 3:
+                pending_name = name if pending_name is None else f"{pending_name} {name}"
+            continue
+
+        if letters < 3:
+            if pending_name is None:
+                continue
+            name = pending_name
+        items.append((_fix_typos(name), _kopecks(prices[-1])))
+        pending_name = None
+
+    return items, total
+
+
+def ocr_bytes(data: bytes, engine_name: str | None = None) -> tuple[list[tuple[str, int]], int | None]:
+    """Распознаёт фото чека в текущем процессе; выполняется в воркере"""
+    engine = get_engine(engine_name)
+    reader = _reader(engine)
+    return parse_lines(engine.read(reader, preprocessed(engine, data)))
+
+
+def ocr_timed(data: bytes, engine_name: str | None = None) -> dict:
+    """ocr_bytes с временем этапов, с — для бенчмарка"""
+    engine = get_engine(engine_name)
+    reader = _reader(engine)
+    t0 = time.perf_counter()
+    image = preprocessed(engine, data)
+    t1 = time.perf_counter()
+    lines = engine.read(reader, image)
+    t2 = time.perf_counter()
+    items, total = parse_lines(lines)
+    return {'items': items, 'total': total, 'lines': lines,
+            'preprocess_s': t1 - t0, 'read_s': t2 - t1, 'parse_s': time.perf_counter() - t2}
+
+
+_pool = BoundedPool('OCR', OCR_QUEUE_SIZE)
+_engine_name: str | None = None
+
+
+def _init_worker(engine_name: str) -> None:
+    """Инициализатор процесса: загружает читалку один раз на всё время жизни воркера"""
+    _reader(get_engine(engine_name))
+
+
+async def start(workers: int | None = None, engine_name: str | None = None) -> bool:
+    """
+    Запускает пул OCR и дожидается загрузки движка в воркерах.
+    Если движок не установлен, OCR остаётся выключенным (False).
+    Вызывается из main.main до начала polling.
+    """
+    global _engine_name
+    if _pool.started:
+        return _pool.ready
+    engine_name = engine_name if engine_name is not None else OCR_ENGINE
+    if not engine_name:
+        return False
+
+    workers = workers or OCR_WORKERS
+    _engine_name = engine_name
+    try:
+        pids = await _pool.start(workers, _init_worker, (engine_name,))
+    except Exception as e:
+        logger.warning(f"OCR engine {engine_name} unavailable, OCR disabled: {e}")
+        return False
+    logger.info(f"OCR pool ready: {engine_name}, {workers} workers, pids={pids}")
+    return True
+
+
+def shutdown() -> None:
+    """Останавливает пул, отменяя задачи, которые ещё не начались"""
+    _pool.shutdown()
+
+
+def is_ready() -> bool:
+    return _pool.ready
+
+
+async def recognize(data: bytes, timeout: float | None = None) -> tuple[list[tuple[str, int]], int | None]:
+    """
+    Распознаёт фото чека в пуле процессов, не блокируя event loop.
+    Позиции — в том же виде, что parse_expense_ph: (название, сумма_в_копейках).
+
+    Исключения:
+        QueueFullError: очередь заполнена, нужно попросить пользователя повторить позже
+        asyncio.TimeoutError: распознавание не уложилось в timeout
+    """
+    try:
+        return await _pool.submit(timeout or OCR_TIMEOUT, ocr_bytes, data, _engine_name)
+    except asyncio.TimeoutError:
+        logger.warning("Receipt OCR timed out")
+        raise
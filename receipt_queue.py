@@ -0,0 +1,131 @@
+# receipt_queue.py
+import os
+import json
+import time
+import asyncio
+import logging
+import redis
+from dotenv import load_dotenv
+
+from handlers_common import r
+import receipt_store
+import receipt_client
+from receipt_client import ReceiptError
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Префикс ключей очереди в Redis (sorted set по времени следующей попытки + hash с заданиями)
+RECEIPT_QUEUE_KEY = os.getenv('RECEIPT_QUEUE_KEY', 'receipt:deferred')
+# Как часто проверять очередь, с
+RECEIPT_QUEUE_POLL = float(os.getenv('RECEIPT_QUEUE_POLL', '5'))
+# Сколько заданий брать за один проход
+RECEIPT_QUEUE_BATCH = int(os.getenv('RECEIPT_QUEUE_BATCH', '10'))
+# Задание, взятое в работу, снова видно в очереди через столько секунд (если бот упал)
+RECEIPT_QUEUE_LEASE = int(os.getenv('RECEIPT_QUEUE_LEASE', '120'))
+# Попыток проверки до отказа и пауза между ними (растёт вдвое, не больше максимума), с
+RECEIPT_QUEUE_MAX_ATTEMPTS = int(os.getenv('RECEIPT_QUEUE_MAX_ATTEMPTS', '12'))
+RECEIPT_QUEUE_DELAY = float(os.getenv('RECEIPT_QUEUE_DELAY', '30'))
+RECEIPT_QUEUE_DELAY_MAX = float(os.getenv('RECEIPT_QUEUE_DELAY_MAX', '1800'))
+
+# Счётчики
+stats = {'enqueued': 0, 'delivered': 0, 'retried': 0, 'failed': 0}
+
+
+def _job_id(user_id: int, qr_raw: str) -> str:
+    # Один и тот же чек одного пользователя в очереди только один раз
+    return f"{user_id}:{receipt_store.receipt_key(qr_raw)}"
+
+
+def enqueue(qr_raw: str, user_id: int, chat_id: int, username: str) -> bool:
+    """
+    Откладывает проверку чека. Задание хранится в Redis и переживает перезапуск бота.
+    False — Redis недоступен, чек отложить не удалось.
+    """
+    job_id = _job_id(user_id, qr_raw)
+    job = {'qr': qr_raw, 'user_id': user_id, 'chat_id': chat_id,
+           'username': username, 'attempts': 0, 'created': time.time()}
+    try:
+        pipe = r.pipeline()
+        pipe.hsetnx(f"{RECEIPT_QUEUE_KEY}:jobs", job_id, json.dumps(job, ensure_ascii=False))
+        pipe.zadd(RECEIPT_QUEUE_KEY, {job_id: time.time() + RECEIPT_QUEUE_DELAY}, nx=True)
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"Redis receipt queue unavailable: {e}")
+        return False
+    stats['enqueued'] += 1
+    return True
+
+
+def _finish(job_id: str) -> None:
+    pipe = r.pipeline()
+    pipe.zrem(RECEIPT_QUEUE_KEY, job_id)
+    pipe.hdel(f"{RECEIPT_QUEUE_KEY}:jobs", job_id)
+    pipe.execute()
+
+
+def _reschedule(job_id: str, job: dict) -> None:
+    delay = min(RECEIPT_QUEUE_DELAY_MAX, RECEIPT_QUEUE_DELAY * 2 ** (job['attempts'] - 1))
+    pipe = r.pipeline()
+    pipe.hset(f"{RECEIPT_QUEUE_KEY}:jobs", job_id, json.dumps(job, ensure_ascii=False))
+    pipe.zadd(RECEIPT_QUEUE_KEY, {job_id: time.time() + delay})
+    pipe.execute()
+
+
+async def _process(bot, deliver, job_id: str) -> None:
+    raw = r.hget(f"{RECEIPT_QUEUE_KEY}:jobs", job_id)
+    if raw is None:
+        r.zrem(RECEIPT_QUEUE_KEY, job_id)
+        return
+    job = json.loads(raw)
+    job['attempts'] += 1
+
+    try:
+        result, _ = await receipt_store.get_or_verify(job['qr'], receipt_client.verify)
+    except ReceiptError as e:
+        if e.retryable and job['attempts'] < RECEIPT_QUEUE_MAX_ATTEMPTS:
+            stats['retried'] += 1
+            logger.info(f"Deferred receipt {job_id} attempt {job['attempts']} failed: {e}")
+            _reschedule(job_id, job)
+            return
+        stats['failed'] += 1
+        logger.warning(f"Deferred receipt {job_id} dropped: {e}")
+        _finish(job_id)
+        await bot.send_message(job['chat_id'], f"❌ Не удалось проверить чек: {e}")
+        return
+
+    # Удаляем до доставки: повторная доставка хуже потерянного сообщения об ошибке
+    _finish(job_id)
+    stats['delivered'] += 1
+    await deliver(bot, job['chat_id'], job['user_id'], job['username'], job['qr'], result)
+
+
+async def process_due(bot, deliver) -> int:
+    """
+    Один проход по очереди: задания, у которых подошло время, проверяются заново.
+    Проверенный чек передаётся в deliver(bot, chat_id, user_id, username, qr_raw, result).
+    Возвращает число взятых заданий.
+    """
+    now = time.time()
+    job_ids = r.zrangebyscore(RECEIPT_QUEUE_KEY, 0, now, start=0, num=RECEIPT_QUEUE_BATCH)
+    for job_id in job_ids:
+        # Аренда: если бот упадёт посреди проверки, задание вернётся в очередь
+        r.zadd(RECEIPT_QUEUE_KEY, {job_id: now + RECEIPT_QUEUE_LEASE}, xx=True)
+    results = await asyncio.gather(*(_process(bot, deliver, job_id) for job_id in job_ids),
+                                   return_exceptions=True)
+    for job_id, result in zip(job_ids, results):
+        if isinstance(result, Exception):
+            logger.error(f"Deferred receipt {job_id} failed: {result}")
+    return len(job_ids)
+
+
+async def run_forever(bot, deliver) -> None:
+    """Фоновая обработка отложенных чеков (задача создаётся в main)"""
+    while True:
+        try:
+            await process_due(bot, deliver)
+        except redis.RedisError as e:
+            logger.warning(f"Redis receipt queue unavailable: {e}")
+        except Exception as e:
+            logger.exception(f"Receipt queue error: {e}")
+        await asyncio.sleep(RECEIPT_QUEUE_POLL)
@@ -0,0 +1,107 @@
+# receipt_store.py
+import os
+import json
+import asyncio
+import hashlib
+import logging
+from urllib.parse import parse_qs
+import redis
+from dotenv import load_dotenv
+
+from handlers_common import r
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Срок хранения проверенного чека и отметки «уже сохранён», с
+RECEIPT_CACHE_TTL = int(os.getenv('RECEIPT_CACHE_TTL', str(180 * 24 * 3600)))
+
+# key -> общая проверка чека, которая сейчас выполняется
+_inflight: dict[str, asyncio.Task] = {}
+
+# Счётчики
+stats = {'cache_hits': 0, 'shared': 0, 'verified': 0, 'duplicates': 0}
+
+
+def receipt_key(qr_raw: str) -> str:
+    """
+    Ключ чека по полям QR: ФН, номер документа (i) и фискальный признак (fp)
+    однозначно задают чек. Если их нет — хеш всей строки.
+    """
+    fields = {k: v[0] for k, v in parse_qs(qr_raw.strip()).items()}
+    if all(fields.get(k) for k in ('fn', 'i', 'fp')):
+        return f"{fields['fn']}:{fields['i']}:{fields['fp']}"
+    return hashlib.sha256(qr_raw.strip().encode('utf-8')).hexdigest()
+
+
+def _get_cached(key: str) -> dict | None:
+    try:
+        raw = r.get(f"receipt:{key}")
+    except redis.RedisError as e:
+        logger.warning(f"Redis receipt cache unavailable: {e}")
+        return None
+    return json.loads(raw) if raw else None
+
+
+def _put_cached(key: str, result: dict) -> None:
+    try:
+        r.setex(f"receipt:{key}", RECEIPT_CACHE_TTL, json.dumps(result, ensure_ascii=False))
+    except redis.RedisError as e:
+        logger.warning(f"Redis receipt cache unavailable: {e}")
+
+
+async def get_or_verify(qr_raw: str, verify) -> tuple[dict, bool]:
+    """
+    Ответ проверки чека: из кэша, из уже идущей проверки того же чека
+    или новым вызовом verify(qr_raw). Успешный ответ (code == 1) кэшируется.
+
+    Возвращает:
+        tuple: (ответ API, True если ответ взят из кэша)
+    """
+    key = receipt_key(qr_raw)
+    cached = _get_cached(key)
+    if cached is not None:
+        stats['cache_hits'] += 1
+        return cached, True
+
+    task = _inflight.get(key)
+    if task is not None:
+        stats['shared'] += 1
+        return await asyncio.shield(task), False
+
+    async def run():
+        try:
+            result = await verify(qr_raw)
+            stats['verified'] += 1
+            if result.get('code') == 1:
+                _put_cached(key, result)
+            return result
+        finally:
+            _inflight.pop(key, None)
+
+    task = _inflight[key] = asyncio.create_task(run())
+    # shield: отмена одного ожидающего не отменяет проверку для остальных
+    return await asyncio.shield(task), False
+
+
+def mark_saved(user_id: int, qr_raw: str) -> bool:
+    """
+    Отмечает чек как сохранённый пользователем.
+    False — этот чек уже сохранялся, позиции вставлять не нужно.
+    """
+    try:
+        first = r.set(f"receipt:saved:{user_id}:{receipt_key(qr_raw)}", 1, nx=True, ex=RECEIPT_CACHE_TTL)
+    except redis.RedisError as e:
+        logger.warning(f"Redis receipt store unavailable: {e}")
+        return True
+    if not first:
+        stats['duplicates'] += 1
+    return bool(first)
+
+
+def unmark_saved(user_id: int, qr_raw: str) -> None:
+    """Снимает отметку, если сохранение в БД не удалось"""
+    try:
+        r.delete(f"receipt:saved:{user_id}:{receipt_key(qr_raw)}")
+    except redis.RedisError as e:
+        logger.warning(f"Redis receipt store unavailable: {e}")
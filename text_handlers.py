@@ -12,7 +12,7 @@ async def handle_new_expense_t(raw: str, message: Message):
     chat_id = message.chat.id
     username = message.from_user.username or ""
 
-    category, subcategory, price = parse_expense_t(raw)
+    category, subcategory, price = await parse_expense_t(raw, str(user_id))
 
     if not (category and subcategory and price):
         return await message.answer("❌ Парсер не смог извлечь данные. Проверь формат.")
@@ -0,0 +1,84 @@
+# transcribe_cache.py
+import os
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+import redis
+from dotenv import load_dotenv
+
+from handlers_common import r
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Размер in-memory LRU (записей) и TTL обоих уровней, с
+TRANSCRIBE_CACHE_SIZE = int(os.getenv('TRANSCRIBE_CACHE_SIZE', '1024'))
+TRANSCRIBE_CACHE_TTL = int(os.getenv('TRANSCRIBE_CACHE_TTL', str(7 * 24 * 3600)))
+# Второй уровень в Redis (общий для всех процессов бота)
+TRANSCRIBE_CACHE_REDIS = os.getenv('TRANSCRIBE_CACHE_REDIS', '1') == '1'
+
+# key -> (момент истечения, текст)
+_lru: "OrderedDict[str, tuple[float, str]]" = OrderedDict()
+
+# Счётчики попаданий и промахов
+stats = {'memory_hits': 0, 'redis_hits': 0, 'misses': 0}
+
+
+def file_key(file_unique_id: str) -> str:
+    """Ключ по file_unique_id: одинаков для пересланных и повторно отправленных голосовых"""
+    return f"transcribe:fuid:{file_unique_id}"
+
+
+def content_key(data: bytes) -> str:
+    """Запасной ключ по содержимому файла"""
+    return f"transcribe:sha256:{hashlib.sha256(data).hexdigest()}"
+
+
+def _remember(key: str, text: str) -> None:
+    _lru[key] = (time.monotonic() + TRANSCRIBE_CACHE_TTL, text)
+    _lru.move_to_end(key)
+    while len(_lru) > TRANSCRIBE_CACHE_SIZE:
+        _lru.popitem(last=False)
+
+
+def get(key: str) -> str | None:
+    """Ищет текст сначала в памяти, затем в Redis"""
+    entry = _lru.get(key)
+    if entry is not None:
+        expires_at, text = entry
+        if expires_at > time.monotonic():
+            _lru.move_to_end(key)
+            stats['memory_hits'] += 1
+            return text
+        del _lru[key]
+
+    if TRANSCRIBE_CACHE_REDIS:
+        try:
+            text = r.get(key)
+        except redis.RedisError as e:
+            logger.warning(f"Redis transcription cache unavailable: {e}")
+            text = None
+        if text is not None:
+            _remember(key, text)
+            stats['redis_hits'] += 1
+            return text
+
+    stats['misses'] += 1
+    return None
+
+
+def put(keys: list[str], text: str) -> None:
+    """Сохраняет текст под всеми переданными ключами на обоих уровнях"""
+    if not text:
+        return
+    for key in keys:
+        _remember(key, text)
+    if TRANSCRIBE_CACHE_REDIS:
+        try:
+            pipe = r.pipeline()
+            for key in keys:
+                pipe.setex(key, TRANSCRIBE_CACHE_TTL, text)
+            pipe.execute()
+        except redis.RedisError as e:
+            logger.warning(f"Redis transcription cache unavailable: {e}")
@@ -0,0 +1,195 @@
+# transcribe_pool.py
+import os
+import asyncio
+import logging
+import itertools
+import threading
+import numpy as np
+from typing import Callable
+from dotenv import load_dotenv
+
+from transcribe_v import transcribe_v
+from audio_decode import SAMPLE_RATE
+from audio_chunks import TRANSCRIBE_CHUNK_MIN, TRANSCRIBE_CHUNK_SECONDS, merge_bounds, split_on_silence, stitch
+from whisper_registry import WHISPER_MODELS
+from process_pool import BoundedPool, QueueFullError
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Количество процессов-воркеров (в каждом свой экземпляр моделей Whisper)
+TRANSCRIBE_WORKERS = int(os.getenv('TRANSCRIBE_WORKERS', str(max(1, (os.cpu_count() or 2) // 2))))
+# Максимум задач в работе и в очереди одновременно
+TRANSCRIBE_QUEUE_SIZE = int(os.getenv('TRANSCRIBE_QUEUE_SIZE', str(TRANSCRIBE_WORKERS * 4)))
+# Сколько секунд пользователь готов ждать распознавания
+TRANSCRIBE_TIMEOUT = float(os.getenv('TRANSCRIBE_TIMEOUT', '120'))
+
+
+_pool = BoundedPool('распознавания', TRANSCRIBE_QUEUE_SIZE)
+
+# Промежуточные сегменты из воркеров: (job_id, текст) через общую очередь
+_progress = None
+_listeners: dict[int, Callable[[str], None]] = {}
+_job_ids = itertools.count()
+
+# Очередь прогресса внутри процесса-воркера
+_worker_progress = None
+
+
+def _init_worker(model_names: list[str], progress) -> None:
+    """Инициализатор процесса: загружает модели один раз на всё время жизни воркера"""
+    global _worker_progress
+    _worker_progress = progress
+    import whisper_registry
+    whisper_registry.warm_up(model_names)
+
+
+def _run_job(job_id: int, audio: np.ndarray, whisper_model: str, language: str, stream: bool) -> str:
+    """Выполняется в воркере; при stream=True сегменты уходят в очередь прогресса"""
+    on_segment = (lambda text: _worker_progress.put((job_id, text))) if stream else None
+    return transcribe_v(audio, whisper_model, language, on_segment=on_segment)
+
+
+def _pump_progress(loop: asyncio.AbstractEventLoop, progress) -> None:
+    """Поток-переносчик: читает очередь прогресса и отдаёт сегменты в event loop"""
+    while True:
+        item = progress.get()
+        if item is None:
+            break
+        loop.call_soon_threadsafe(_dispatch_progress, *item)
+
+
+def _dispatch_progress(job_id: int, text: str) -> None:
+    listener = _listeners.get(job_id)
+    if listener:
+        listener(text)
+
+
+async def start(workers: int | None = None) -> None:
+    """
+    Запускает пул процессов и дожидается загрузки моделей в воркерах.
+    Вызывается из main.main до начала polling.
+    """
+    global _progress
+    if _pool.started:
+        return
+
+    workers = workers or TRANSCRIBE_WORKERS
+    _progress = _pool.ctx.Queue()
+    loop = asyncio.get_running_loop()
+    threading.Thread(target=_pump_progress, args=(loop, _progress), daemon=True).start()
+
+    try:
+        pids = await _pool.start(workers, _init_worker, (WHISPER_MODELS, _progress))
+    except BaseException:
+        shutdown()
+        raise
+    logger.info(f"Transcription pool ready: {workers} workers, pids={pids}")
+
+
+def shutdown() -> None:
+    """Останавливает пул, отменяя задачи, которые ещё не начались"""
+    global _progress
+    _pool.shutdown()
+    if _progress is not None:
+        _progress.put(None)
+        _progress = None
+
+
+def is_ready() -> bool:
+    return _pool.ready
+
+
+def queue_depth() -> int:
+    """Сколько задач сейчас в работе или в очереди"""
+    return _pool.pending
+
+
+async def transcribe(
+    audio: np.ndarray,
+    whisper_model: str = 'small',
+    language: str = 'ru',
+    timeout: float | None = None,
+    on_segment: Callable[[str], None] | None = None
+) -> str:
+    """
+    Отправляет распознавание в пул процессов и ждёт результат, не блокируя event loop.
+    audio — 16 кГц mono float32 из audio_decode.decode_audio.
+    on_segment вызывается в event loop с текстом каждого сегмента, который
+    воркер успел декодировать (если движок отдаёт сегменты по ходу работы).
+
+    Исключения:
+        QueueFullError: очередь заполнена, нужно попросить пользователя повторить позже
+        asyncio.TimeoutError: распознавание не уложилось в timeout; задача снимается
+            с очереди, если ещё не начата
+    """
+    job_id = next(_job_ids)
+    if on_segment:
+        _listeners[job_id] = on_segment
+    try:
+        return await _pool.submit(timeout or TRANSCRIBE_TIMEOUT, _run_job,
+                                  job_id, audio, whisper_model, language, on_segment is not None)
+    except asyncio.TimeoutError:
+        logger.warning(f"Transcription of {len(audio) / SAMPLE_RATE:.1f}s audio timed out")
+        raise
+    finally:
+        _listeners.pop(job_id, None)
+
+
+async def transcribe_chunked(
+    audio: np.ndarray,
+    whisper_model: str = 'small',
+    language: str = 'ru',
+    timeout: float | None = None,
+    on_partial: Callable[[str], None] | None = None
+) -> str:
+    """
+    То же, что transcribe, но длинное аудио (от TRANSCRIBE_CHUNK_MIN секунд) режется
+    по паузам на куски, которые распознаются параллельно в разных воркерах
+    и склеиваются по порядку. Кусков не больше, чем свободных воркеров и мест
+    в очереди; если свободно меньше двух, аудио идёт одной задачей.
+    Если один кусок упал — остальные отменяются.
+    on_partial получает весь распознанный на данный момент текст при каждом
+    новом сегменте или готовом куске.
+    """
+    duration = len(audio) / SAMPLE_RATE
+    slots = min(_pool.workers, _pool.queue_size - _pool.pending)
+    if duration < TRANSCRIBE_CHUNK_MIN or slots < 2:
+        bounds = [(0, len(audio), False)]
+    else:
+        # Куски длиннее, если воркеров мало: длинное голосовое не должно упираться в очередь
+        chunk_seconds = max(TRANSCRIBE_CHUNK_SECONDS, duration / slots)
+        bounds = merge_bounds(split_on_silence(audio, SAMPLE_RATE, chunk_seconds), slots)
+
+    # Текст каждого куска: список сегментов, пока кусок в работе, и итог после
+    parts: list[list[str]] = [[] for _ in bounds]
+    overlaps = [overlapped for _, _, overlapped in bounds]
+
+    def collector(i: int):
+        def on_segment(text: str) -> None:
+            parts[i].append(text)
+            on_partial(stitch([" ".join(p) for p in parts], overlaps))
+        return on_segment if on_partial else None
+
+    async def run(i: int, start: int, end: int) -> str:
+        text = await transcribe(audio[start:end], whisper_model, language, timeout, collector(i))
+        if on_partial:
+            parts[i] = [text]
+            on_partial(stitch([" ".join(p) for p in parts], overlaps))
+        return text
+
+    if len(bounds) == 1:
+        return await run(0, *bounds[0][:2])
+
+    logger.info(f"Transcribing {duration:.1f}s audio in {len(bounds)} chunks")
+    tasks = [
+        asyncio.create_task(run(i, start, end))
+        for i, (start, end, _) in enumerate(bounds)
+    ]
+    try:
+        texts = await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+    return stitch(texts, overlaps)
@@ -1,45 +1,38 @@
-import whisper
-import soundfile as sf
-import librosa
 import numpy as np
 import logging
+from typing import Callable
+import whisper_registry
+from asr_backends import get_backend
+from vad import trim_silence
+from audio_decode import SAMPLE_RATE
 
 logger = logging.getLogger(__name__)
 
-def transcribe_v(input_file: str,
+def transcribe_v(audio: np.ndarray,
                  whisper_model: str = 'small',
-                 language: str = 'ru') -> str:
-    # 1. Чтение и ресемплинг
-    data, sr = sf.read(input_file)
-    if sr != 16000:
-        data = librosa.resample(data, orig_sr=sr, target_sr=16000)
-        sr = 16000
-    if data.ndim > 1:
-        data = np.mean(data, axis=1)
+                 language: str = 'ru',
+                 backend: str | None = None,
+                 on_segment: Callable[[str], None] | None = None) -> str:
+    # 1. На входе уже 16 кГц mono float32 (см. audio_decode.decode_audio)
+    duration = len(audio) / SAMPLE_RATE
 
-    # 2. Логирование длительности и уровня
-    duration = len(data) / sr
-    max_amp = float(np.max(np.abs(data)))
-    logger.info(f"Audio duration: {duration:.2f}s, max amplitude: {max_amp:.3f}")
+    # 2. VAD: обрезаем тишину по краям и схлопываем длинные паузы
+    audio, speech_ratio = trim_silence(audio, SAMPLE_RATE)
 
-    # 3. Нормализация
-    if max_amp > 0:
-        data = data / max_amp
-
-    # 4. Приведение к float32
-    data = data.astype(np.float32)
-
-    # 5. Транскрипция с пониженными порогами
-    model = whisper.load_model(whisper_model)
-    result = model.transcribe(
-        data,
-        language=language,
-        fp16=False,
-        temperature=0,
-        no_speech_threshold=0.3,
-        logprob_threshold=-1.0
+    # 3. Логирование длительности и уровня
+    max_amp = float(max(audio.max(), -audio.min())) if len(audio) else 0.0
+    logger.info(
+        f"Audio duration: {duration:.2f}s, max amplitude: {max_amp:.3f}, "
+        f"speech ratio: {speech_ratio:.2f}, trimmed to {len(audio) / SAMPLE_RATE:.2f}s"
     )
 
-    transcription = result.get("text", "").strip()
-    logger.info(f"Whisper returned transcription: {transcription!r}")
+    # 4. Нормализация: одна копия во float32, без промежуточного float64
+    if max_amp > 0:
+        audio = audio * np.float32(1.0 / max_amp)
+
+    # 5. Транскрипция выбранным движком (ASR_BACKEND по умолчанию)
+    engine = get_backend(backend)
+    model = whisper_registry.get_model(whisper_model, engine.name)
+    transcription = engine.transcribe(model, audio, language, on_segment)
+    logger.info(f"{engine.name} returned transcription: {transcription!r}")
     return transcription
@@ -0,0 +1,108 @@
+# trigram_index.py
+import heapq
+from collections import defaultdict
+
+# Безударные гласные распознавание и пользователи путают чаще всего:
+# "малако" → "молоко", "симечки" → "семечки". Для поиска кандидатов гласные
+# сводятся к одной, а в расстоянии правки такая замена стоит половину.
+_REDUCE = str.maketrans('оеэёяюы', 'аиииауи')
+_CHEAP_SUBSTITUTION = 0.5
+
+# Сколько лучших по триграммам кандидатов пересчитывать расстоянием правки
+_MAX_CANDIDATES = 20
+
+
+def _reduce(text: str) -> str:
+    return text.translate(_REDUCE)
+
+
+def _trigrams(text: str) -> set[str]:
+    padded = f"  {_reduce(text)} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a: str, b: str, max_dist: float) -> float:
+    """
+    Расстояние Левенштейна, где замена похожих гласных стоит 0.5.
+    Если расстояние заведомо больше max_dist, возвращает max_dist + 1.
+    """
+    if abs(len(a) - len(b)) > max_dist:
+        return max_dist + 1
+    ra, rb = _reduce(a), _reduce(b)
+    prev = [float(j) for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        cur = [float(i)] + [0.0] * len(b)
+        for j in range(1, len(b) + 1):
+            if a[i - 1] == b[j - 1]:
+                sub = 0.0
+            elif ra[i - 1] == rb[j - 1]:
+                sub = _CHEAP_SUBSTITUTION
+            else:
+                sub = 1.0
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + sub)
+        if min(cur) > max_dist:
+            return max_dist + 1
+        prev = cur
+    return prev[-1]
+
+
+class TrigramIndex:
+    """
+    Нечёткий поиск по словарю названий: кандидаты — по общим триграммам
+    (с приведёнными гласными), окончательный выбор — по расстоянию правки.
+    """
+
+    def __init__(self, names=()):
+        self._postings: dict[str, set[str]] = defaultdict(set)
+        self._grams: dict[str, set[str]] = {}
+        for name in names:
+            self.add(name)
+
+    def __len__(self) -> int:
+        return len(self._grams)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._grams
+
+    def add(self, name: str) -> None:
+        if not name or name in self._grams:
+            return
+        grams = _trigrams(name)
+        self._grams[name] = grams
+        for g in grams:
+            self._postings[g].add(name)
+
+    def remove(self, name: str) -> None:
+        grams = self._grams.pop(name, None)
+        for g in grams or ():
+            self._postings[g].discard(name)
+            if not self._postings[g]:
+                del self._postings[g]
+
+    def match(self, query: str, min_confidence: float = 0.66) -> tuple[str | None, float]:
+        """
+        Ближайшее название и уверенность 0..1 (1 — точное совпадение);
+        (None, 0.0), если никто не набрал min_confidence.
+        """
+        if query in self._grams:
+            return query, 1.0
+        grams = _trigrams(query)
+        counts: dict[str, int] = defaultdict(int)
+        for g in grams:
+            for name in self._postings.get(g, ()):
+                counts[name] += 1
+        if not counts:
+            return None, 0.0
+
+        best, best_conf = None, 0.0
+        for name in heapq.nlargest(_MAX_CANDIDATES, counts, key=counts.__getitem__):
+            longest = max(len(name), len(query))
+            bound = (1 - max(best_conf, min_confidence)) * longest + 1e-9
+            # Одна правка меняет не больше трёх триграмм — нижняя оценка расстояния
+            if (max(len(grams), len(self._grams[name])) - counts[name]) / 3 > bound:
+                continue
+            dist = edit_distance(query, name, bound)
+            conf = 1 - dist / longest
+            if conf >= min_confidence and conf > best_conf:
+                best, best_conf = name, conf
+        return best, best_conf
@@ -0,0 +1,114 @@
+# vad.py
+import os
+import logging
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Детектор речи: energy (по умолчанию), webrtc (нужен пакет webrtcvad) или off
+VAD_MODE = os.getenv('VAD_MODE', 'energy')
+# Длина кадра анализа, мс (webrtcvad принимает только 10, 20 или 30)
+VAD_FRAME_MS = int(os.getenv('VAD_FRAME_MS', '30'))
+# Порог энергии кадра относительно самого громкого кадра, дБ
+VAD_THRESHOLD_DB = float(os.getenv('VAD_THRESHOLD_DB', '-35'))
+# Агрессивность webrtcvad: 0..3
+VAD_WEBRTC_AGGRESSIVENESS = int(os.getenv('VAD_WEBRTC_AGGRESSIVENESS', '2'))
+# Запас тишины вокруг каждого участка речи, с
+VAD_PAD = float(os.getenv('VAD_PAD', '0.15'))
+# Паузы длиннее этого значения схлопываются до него, с
+VAD_MAX_PAUSE = float(os.getenv('VAD_MAX_PAUSE', '0.3'))
+
+
+def _energy_mask(audio: np.ndarray, frame: int) -> np.ndarray:
+    """Кадр считается речью, если его RMS не ниже порога относительно пика"""
+    n = len(audio) // frame
+    frames = audio[:n * frame].reshape(n, frame)
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    peak = float(rms.max()) if n else 0.0
+    if peak <= 0:
+        return np.zeros(n, dtype=bool)
+    threshold = peak * 10 ** (VAD_THRESHOLD_DB / 20)
+    return rms >= threshold
+
+
+def _webrtc_mask(audio: np.ndarray, sr: int, frame: int) -> np.ndarray:
+    import webrtcvad
+
+    detector = webrtcvad.Vad(VAD_WEBRTC_AGGRESSIVENESS)
+    pcm = (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16).tobytes()
+    step = frame * 2  # 2 байта на отсчёт
+    n = len(audio) // frame
+    return np.fromiter(
+        (detector.is_speech(pcm[i * step:(i + 1) * step], sr) for i in range(n)),
+        dtype=bool,
+        count=n
+    )
+
+
+def speech_mask(audio: np.ndarray, sr: int, mode: str | None = None) -> np.ndarray:
+    """Возвращает по одному bool на кадр VAD_FRAME_MS: есть ли в кадре речь"""
+    mode = mode or VAD_MODE
+    frame = sr * VAD_FRAME_MS // 1000
+    if mode == 'webrtc':
+        try:
+            return _webrtc_mask(audio, sr, frame)
+        except ImportError:
+            logger.warning("webrtcvad is not installed, falling back to energy VAD")
+    return _energy_mask(audio, frame)
+
+
+def _mask_to_segments(mask: np.ndarray, length: int, sr: int) -> list[tuple[int, int]]:
+    if not mask.any():
+        return []
+
+    frame = sr * VAD_FRAME_MS // 1000
+    pad = int(VAD_PAD * sr)
+    # Переходы тишина↔речь
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], mask.astype(np.int8), [0]))))
+    segments = []
+    for start, end in zip(edges[::2], edges[1::2]):
+        s = max(0, int(start) * frame - pad)
+        e = min(length, int(end) * frame + pad)
+        if segments and s <= segments[-1][1]:
+            segments[-1] = (segments[-1][0], e)
+        else:
+            segments.append((s, e))
+    return segments
+
+
+def speech_segments(audio: np.ndarray, sr: int, mode: str | None = None) -> list[tuple[int, int]]:
+    """
+    Находит участки речи и возвращает их границы в отсчётах.
+    Каждый участок расширен на VAD_PAD, пересекающиеся участки объединены.
+    """
+    return _mask_to_segments(speech_mask(audio, sr, mode), len(audio), sr)
+
+
+def trim_silence(audio: np.ndarray, sr: int, mode: str | None = None) -> tuple[np.ndarray, float]:
+    """
+    Обрезает тишину в начале и конце и схлопывает длинные паузы до VAD_MAX_PAUSE.
+
+    Возвращает:
+        tuple: (аудио только с речью, доля речи в исходном аудио)
+        Если речь не найдена или VAD выключен — исходное аудио без изменений.
+    """
+    mode = mode or VAD_MODE
+    if mode == 'off' or not len(audio):
+        return audio, 1.0
+
+    mask = speech_mask(audio, sr, mode)
+    segments = _mask_to_segments(mask, len(audio), sr)
+    if not segments:
+        return audio, 0.0
+
+    max_pause = int(VAD_MAX_PAUSE * sr)
+    parts = [audio[segments[0][0]:segments[0][1]]]
+    for (_, prev_end), (start, end) in zip(segments, segments[1:]):
+        # Оставляем от паузы не больше max_pause
+        parts.append(audio[prev_end:min(start, prev_end + max_pause)])
+        parts.append(audio[start:end])
+
+    trimmed = np.concatenate(parts)
+    return trimmed, float(mask.mean())
@@ -1,41 +1,103 @@
 # voice_handlers.py
 import os
 import asyncio
+from io import BytesIO
 from aiogram import Bot
 from aiogram.types import Message
-from transcribe_v import transcribe_v
+import transcribe_pool
+import transcribe_cache
+import whisper_router
+from functools import partial
+from transcribe_pool import QueueFullError
+from audio_decode import SAMPLE_RATE, decode_audio, check_voice_limits, AudioTooLongError
 from handlers_common import process_user_input, show_parser_result
 from parse_expense import parse_expense_v
 from db_handler import save_expense
 
-async def show_processing_animation(chat_id: int, bot: Bot):
-    """Анимация с постепенным добавлением точек"""
-    base_text = "⏳ Распознаю голос"
-    message = await bot.send_message(chat_id, base_text)
-    
-    # Создаем асинхронную задачу для анимации
-    animation_task = asyncio.create_task(animate_dots(message, base_text))
-    
-    return message, animation_task
+# Не чаще одной правки статуса за столько секунд (лимиты Telegram на edit_text)
+VOICE_STATUS_MIN_INTERVAL = float(os.getenv('VOICE_STATUS_MIN_INTERVAL', '1.5'))
+# Telegram не принимает сообщения длиннее 4096 символов
+_STATUS_MAX_CHARS = 3500
 
-async def animate_dots(message: Message, base_text: str):
-    """Обновляет сообщение, добавляя точки каждую секунду"""
-    try:
-        for i in range(1, 10):  # Максимум 9 точек
-            dots = "." * i
-            await message.edit_text(f"{base_text}{dots}")
-            await asyncio.sleep(1)
-    except Exception as e:
-        # Игнорируем ошибки редактирования (например, если сообщение удалено)
-        pass
 
-async def handle_new_expense_v(raw: str, message: Message):
-    """Обработка новой записи для голосовых сообщений"""
+class LiveStatus:
+    """
+    Статусное сообщение с промежуточным текстом распознавания.
+    Правки не чаще VOICE_STATUS_MIN_INTERVAL: если текст меняется быстрее,
+    в Telegram уходит только последняя версия.
+    """
+
+    def __init__(self, message: Message, base_text: str):
+        self.message = message
+        self.base_text = base_text
+        self._shown = base_text
+        self._latest = base_text
+        self._last_edit = 0.0
+        self._flush_task: asyncio.Task | None = None
+
+    @classmethod
+    async def send(cls, chat_id: int, bot: Bot, base_text: str = "⏳ Распознаю голос…"):
+        message = await bot.send_message(chat_id, base_text)
+        status = cls(message, base_text)
+        status._last_edit = asyncio.get_running_loop().time()
+        return status
+
+    def update(self, partial: str) -> None:
+        """Запоминает новый промежуточный текст и планирует правку сообщения"""
+        if len(partial) > _STATUS_MAX_CHARS:
+            partial = "…" + partial[-_STATUS_MAX_CHARS:]
+        self._latest = f"{self.base_text}\n\n«{partial}»" if partial else self.base_text
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush())
+
+    async def _flush(self) -> None:
+        loop = asyncio.get_running_loop()
+        delay = self._last_edit + VOICE_STATUS_MIN_INTERVAL - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        text = self._latest
+        if text == self._shown:
+            return
+        try:
+            await self.message.edit_text(text)
+            self._shown = text
+        except Exception:
+            # Игнорируем ошибки редактирования (например, если сообщение удалено)
+            pass
+        self._last_edit = loop.time()
+        # Пока ждали ответа Telegram, мог прийти более свежий текст
+        if self._latest != self._shown:
+            self._flush_task = asyncio.create_task(self._flush())
+
+    async def close(self) -> None:
+        """Отменяет отложенные правки и удаляет статус"""
+        if self._flush_task:
+            self._flush_task.cancel()
+        try:
+            await self.message.delete()
+        except Exception:
+            pass
+
+async def handle_new_expense_v(raw: str, message: Message, retranscribe=None, confirm=None):
+    """
+    Обработка новой записи для голосовых сообщений.
+    retranscribe — корутина-функция, повторно распознающая голос моделью крупнее;
+    вызывается, если результат дешёвой модели не разобрался.
+    confirm — вызывается, если результат дешёвой модели разобрался (его можно кэшировать).
+    """
     user_id = message.from_user.id
     chat_id = message.chat.id
     username = message.from_user.username or ""
 
-    category, subcategory, price = parse_expense_v(raw)
+    category, subcategory, price = await parse_expense_v(raw, str(user_id))
+
+    if category and subcategory and price:
+        if confirm:
+            confirm()
+    elif retranscribe:
+        raw = await retranscribe()
+        if raw:
+            category, subcategory, price = await parse_expense_v(raw, str(user_id))
 
     if not (category and subcategory and price):
         return await message.answer("❌ Парсер не смог извлечь данные.")
@@ -50,40 +112,94 @@ async def handle_new_expense_v(raw: str, message: Message):
 
 async def handle_voice_message(message: Message):
     bot = message.bot 
-    # Показываем анимированный индикатор обработки
-    status_msg, animation_task = await show_processing_animation(message.chat.id, bot)
-    
-    file = await bot.get_file(message.voice.file_id)
-    local_path = f"voice_{message.voice.file_id}.ogg"
+    voice = message.voice
+
+    # Слишком длинные сообщения отсекаем до скачивания
+    try:
+        check_voice_limits(voice.duration, voice.file_size)
+    except AudioTooLongError as e:
+        return await message.answer(f"❌ Голосовое слишком длинное: {e}")
+
+    # Пересланные и повторно отправленные голосовые берём из кэша — без скачивания и модели
+    file_key = transcribe_cache.file_key(voice.file_unique_id)
+    raw = transcribe_cache.get(file_key)
+    if raw is not None:
+        return await process_user_input(
+            raw_text=raw,
+            message=message,
+            handle_new_expense_func=handle_new_expense_v
+        )
+
+    # Статус с промежуточным текстом распознавания
+    status = await LiveStatus.send(message.chat.id, bot)
     
     try:
-        # Скачиваем файл
-        await bot.download_file(file.file_path, destination=local_path)
-        
-        # Транскрибация
-        raw = transcribe_v(input_file=local_path, 
-                                    whisper_model="small", 
-                                    language="ru")
+        # Скачиваем файл в память и декодируем в 16 кГц mono float32
+        file = await bot.get_file(voice.file_id)
+        buffer = BytesIO()
+        await bot.download_file(file.file_path, buffer)
+        data = buffer.getvalue()
+
+        # Тот же файл мог прийти под другим file_unique_id — проверяем по содержимому
+        content_key = transcribe_cache.content_key(data)
+        raw = transcribe_cache.get(content_key)
+        handle_new_expense = handle_new_expense_v
+        cache_now = True
+        if raw is None:
+            audio = await decode_audio(data)
+
+            # Модель по длительности и загрузке пула
+            decision = whisper_router.route(len(audio) / SAMPLE_RATE, transcribe_pool.queue_depth())
+            whisper_router.record("route", decision)
+
+            # Транскрибация в пуле процессов, event loop остаётся свободным
+            raw = await transcribe_pool.transcribe_chunked(audio=audio,
+                                                           whisper_model=decision['model'],
+                                                           language="ru",
+                                                           on_partial=status.update)
+
+            if decision['escalate_to']:
+                async def retranscribe():
+                    whisper_router.record("escalate", decision, cheap_text=raw)
+                    try:
+                        text = await transcribe_pool.transcribe_chunked(audio=audio,
+                                                                        whisper_model=decision['escalate_to'],
+                                                                        language="ru")
+                    except (QueueFullError, asyncio.TimeoutError):
+                        return None
+                    transcribe_cache.put([file_key, content_key], text)
+                    return text
+
+                # Текст дешёвой модели кэшируется, только если он разобрался: иначе
+                # пересланная копия брала бы его из кэша и не доходила до модели крупнее
+                cache_now = False
+                handle_new_expense = partial(
+                    handle_new_expense_v,
+                    retranscribe=retranscribe,
+                    confirm=lambda: transcribe_cache.put([file_key, content_key], raw)
+                )
+        if cache_now:
+            transcribe_cache.put([file_key, content_key], raw)
         
-        # Останавливаем анимацию и удаляем индикатор
-        animation_task.cancel()
-        await status_msg.delete()
+        # Убираем статус
+        await status.close()
         
         # Обработка результата
         await process_user_input(
             raw_text=raw,
             message=message,
-            handle_new_expense_func=handle_new_expense_v
+            handle_new_expense_func=handle_new_expense
         )
         
+    except QueueFullError:
+        await status.close()
+        await message.answer("⏳ Очередь распознавания переполнена, попробуйте чуть позже.")
+
+    except asyncio.TimeoutError:
+        await status.close()
+        await message.answer("⌛ Распознавание заняло слишком много времени, попробуйте ещё раз.")
+
     except Exception as e:
-        # Останавливаем анимацию и удаляем индикатор в случае ошибки
-        if 'animation_task' in locals():
-            animation_task.cancel()
-        if 'status_msg' in locals():
-            await status_msg.delete()
+        # Убираем статус в случае ошибки
+        await status.close()
         await message.answer(f"❌ Ошибка распознавания: {e}")
-        
-    finally:
-        if os.path.exists(local_path):
-            os.remove(local_path)
\ No newline at end of file
@@ -0,0 +1,89 @@
+# whisper_registry.py
+import os
+import logging
+import threading
+from collections import OrderedDict
+from dotenv import load_dotenv
+from asr_backends import get_backend
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Модели, которые загружаются при старте бота (через запятую: "tiny,base,small")
+WHISPER_MODELS = [m.strip() for m in os.getenv('WHISPER_MODELS', 'base,small').split(',') if m.strip()]
+# Бюджет памяти под веса всех загруженных моделей, МБ
+WHISPER_MEMORY_BUDGET_MB = int(os.getenv('WHISPER_MEMORY_BUDGET_MB', '4096'))
+
+# Примерный размер весов в fp32, МБ — нужен для вытеснения до загрузки
+_MODEL_SIZE_MB = {
+    'tiny': 150,
+    'base': 290,
+    'small': 970,
+    'medium': 3050,
+    'large': 6200,
+    'turbo': 3200,
+}
+
+# "движок:модель" -> (model, размер в МБ); порядок = порядок использования (LRU в начале)
+_models: "OrderedDict[str, tuple[object, float]]" = OrderedDict()
+_lock = threading.Lock()
+_ready = False
+
+
+def estimate_size_mb(name: str) -> float:
+    """Оценка размера модели до загрузки"""
+    base = name.split('.')[0].split('-')[0]
+    return _MODEL_SIZE_MB.get(base, _MODEL_SIZE_MB['large'])
+
+
+def _used_mb() -> float:
+    return sum(size for _, size in _models.values())
+
+
+def _evict_for(size_mb: float) -> None:
+    """Вытесняет давно не использованные модели, пока новая не влезет в бюджет"""
+    while _models and _used_mb() + size_mb > WHISPER_MEMORY_BUDGET_MB:
+        key, (_, size) = _models.popitem(last=False)
+        logger.info(f"ASR model {key!r} evicted ({size:.0f} MB)")
+
+
+def get_model(name: str, backend: str | None = None):
+    """
+    Возвращает загруженную модель Whisper выбранного движка (см. asr_backends),
+    загружая её при первом обращении.
+    Один и тот же экземпляр переиспользуется всеми вызовами в процессе.
+    """
+    engine = get_backend(backend)
+    key = f"{engine.name}:{name}"
+    with _lock:
+        if key in _models:
+            _models.move_to_end(key)
+            return _models[key][0]
+
+        estimate = estimate_size_mb(name) * engine.size_factor
+        _evict_for(estimate)
+        logger.info(f"Loading ASR model {key!r}…")
+        model = engine.load(name)
+        size = engine.model_size_mb(model) or estimate
+        _models[key] = (model, size)
+        logger.info(f"ASR model {key!r} loaded ({size:.0f} MB, total {_used_mb():.0f} MB)")
+        return model
+
+
+def warm_up(names: list[str] | None = None, backend: str | None = None) -> None:
+    """Загружает все настроенные модели заранее (вызывается при старте бота)"""
+    global _ready
+    for name in names or WHISPER_MODELS:
+        get_model(name, backend)
+    _ready = True
+
+
+def is_ready() -> bool:
+    """True, если прогрев завершён и модели в памяти"""
+    return _ready
+
+
+def loaded_models() -> list[str]:
+    """Список моделей в памяти в порядке от давно использованной к последней"""
+    with _lock:
+        return list(_models)
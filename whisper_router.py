@@ -0,0 +1,76 @@
+# whisper_router.py
+import os
+import json
+import logging
+from datetime import datetime
+from dotenv import load_dotenv
+
+from whisper_registry import WHISPER_MODELS, estimate_size_mb
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Правила выбора модели по длительности: "до_секунд:модель" через запятую, "*" — всё остальное
+WHISPER_ROUTES = os.getenv('WHISPER_ROUTES', '8:base,*:small')
+# С какой глубины очереди модель понижается на ступень
+WHISPER_LOAD_DEPTH = int(os.getenv('WHISPER_LOAD_DEPTH', '4'))
+# Куда пишутся решения маршрутизатора (JSON Lines) для последующей настройки правил
+WHISPER_ROUTING_LOG = os.getenv('WHISPER_ROUTING_LOG', 'logs/whisper_routing.jsonl')
+
+# Модели от дешёвой к дорогой: по ним понижаемся под нагрузкой и эскалируем при ошибке
+LADDER = sorted(WHISPER_MODELS, key=estimate_size_mb)
+
+
+def _parse_routes(spec: str) -> list[tuple[float, str]]:
+    routes = []
+    for rule in spec.split(','):
+        limit, _, model = rule.strip().partition(':')
+        routes.append((float('inf') if limit == '*' else float(limit), model.strip()))
+    return sorted(routes)
+
+
+ROUTES = _parse_routes(WHISPER_ROUTES)
+
+
+def _step(model: str, delta: int) -> str | None:
+    """Соседняя модель в LADDER: delta=-1 — дешевле, +1 — дороже"""
+    if model not in LADDER:
+        return None
+    i = LADDER.index(model) + delta
+    return LADDER[i] if 0 <= i < len(LADDER) else None
+
+
+def route(duration: float, queue_depth: int) -> dict:
+    """
+    Выбирает модель по длительности аудио и глубине очереди распознавания.
+
+    Возвращает dict: model, escalate_to (модель для повтора, если результат
+    не разобрался, или None), duration, queue_depth, reason.
+    """
+    model = next((m for limit, m in ROUTES if duration <= limit), ROUTES[-1][1])
+    reason = "duration"
+
+    if queue_depth >= WHISPER_LOAD_DEPTH:
+        cheaper = _step(model, -1)
+        if cheaper:
+            model = cheaper
+            reason = "load"
+
+    return {
+        'model': model,
+        'escalate_to': _step(model, +1),
+        'duration': round(duration, 2),
+        'queue_depth': queue_depth,
+        'reason': reason,
+    }
+
+
+def record(event: str, decision: dict, **extra) -> None:
+    """Записывает решение маршрутизатора и его исход в WHISPER_ROUTING_LOG"""
+    entry = {'ts': datetime.now().isoformat(timespec='seconds'), 'event': event, **decision, **extra}
+    logger.info(f"Whisper routing: {entry}")
+    try:
+        with open(WHISPER_ROUTING_LOG, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    except OSError as e:
+        logger.warning(f"Cannot write routing log: {e}")